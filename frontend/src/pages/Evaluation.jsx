@@ -8,6 +8,7 @@ const Evaluation = () => {
   const [evaluationHistory, setEvaluationHistory] = useState([]);
   const [activeTab, setActiveTab] = useState("run");
   const [error, setError] = useState(null);
+  const [progress, setProgress] = useState(null);
 
   useEffect(() => {
     loadEvaluationHistory();
@@ -17,28 +18,38 @@ const Evaluation = () => {
     setEvaluationHistory([]);
   };
 
+  // Оценка выполняется на сервере в фоне: опрашиваем задачу до завершения
+  const waitForEvaluation = async (evaluationId) => {
+    while (true) {
+      const { data } = await chatAPI.getEvaluation(evaluationId);
+      setProgress({ done: data.progress, total: data.total });
+
+      if (data.status === "completed") {
+        return data;
+      }
+      if (data.status === "failed") {
+        throw new Error(data.error || "Ошибка при оценке системы");
+      }
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+    }
+  };
+
   const runEvaluation = async () => {
     setLoading(true);
     setError(null);
     setEvaluationResults(null);
+    setProgress(null);
 
     try {
       console.log("Starting evaluation with sample size:", sampleSize);
-      const response = await chatAPI.evaluateSystem(sampleSize, {
-        timeout: 300000,
-      });
-
-      console.log("Raw response data:", response.data);
+      const response = await chatAPI.evaluateSystem(sampleSize);
 
-      const results = response.data;
-
-      if (!results) {
-        throw new Error("Пустой ответ от сервера");
+      if (!response.data?.evaluation_id) {
+        throw new Error(response.data?.message || "Ошибка при запуске оценки");
       }
 
-      if (results.status === "error") {
-        throw new Error(results.message || "Ошибка при оценке системы");
-      }
+      const results = await waitForEvaluation(response.data.evaluation_id);
+      console.log("Evaluation results:", results);
 
       let metrics = {};
       let retrieval = {};
@@ -251,7 +262,9 @@ const Evaluation = () => {
                   {loading ? (
                     <div className="flex items-center justify-center">
                       <div className="w-4 h-4 border-2 border-white border-t-transparent rounded-full animate-spin mr-2"></div>
-                      Запуск оценки...
+                      {progress && progress.total
+                        ? `Оценка: ${progress.done} из ${progress.total}`
+                        : "Запуск оценки..."}
                     </div>
                   ) : (
                     "Запустить оценку"
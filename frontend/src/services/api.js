@@ -44,6 +44,7 @@ export const chatAPI = {
 
   evaluateSystem: (sampleSize) =>
     api.post("/evaluate", { sample_size: sampleSize }),
+  getEvaluation: (evaluationId) => api.get(`/evaluate/${evaluationId}`),
   getAnalytics: () => api.get("/analytics"),
   getBenchmarkStats: () => api.get("/benchmark/stats"),
 
@@ -34,8 +34,8 @@ class TransneftConfig:
             "lambda_mult": 0.8
         },
         "recall": {
-            "search_type": "similarity", 
-            "k": 7, 
+            "search_type": "range",
+            "max_results": 32,
             "score_threshold": 0.7
         },
         "balanced": {
@@ -43,6 +43,19 @@ class TransneftConfig:
             "k": 5, 
             "fetch_k": 15, 
             "lambda_mult": 0.6
+        },
+        "hybrid": {
+            "search_type": "hybrid",
+            "k": 5,
+            "dense_k": 5,
+            "lexical_k": 5,
+            "rrf_k": 60
+        },
+        "hierarchical": {
+            "search_type": "hierarchical",
+            "k": 5,
+            "n_sections": 2,
+            "min_candidates": 20
         }
     }
 
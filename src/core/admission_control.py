@@ -0,0 +1,153 @@
+import os
+import sys
+import math
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from typing import Dict, List, Tuple, Optional
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import (
+    ADMISSION_MAX_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER
+)
+
+# Приоритеты: интерактивный чат обслуживается раньше фоновых задач (оценка, аналитика, пакеты)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class AdmissionRejected(Exception):
+    """Запрос не допущен: очередь заполнена (429) или истекло время ожидания (503)"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLease:
+    """Занятое место обработки; release() можно вызывать повторно"""
+
+    def __init__(self, controller: "AdmissionController", started_at: float):
+        self._controller = controller
+        self._started_at = started_at
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self._started_at)
+
+
+class AdmissionController:
+    """Контроль допуска запросов к QA-конвейеру
+
+    Одновременно обрабатывается не более max_concurrency запросов, остальные
+    ждут в очереди не дольше queue_timeout секунд; из очереди первыми
+    выходят запросы с меньшим priority, при равном -- в порядке прихода.
+    Если очередь заполнена, запрос сразу отклоняется (429), если место
+    не освободилось за queue_timeout -- тоже (503); в обоих случаях
+    клиенту сообщается Retry-After. Все методы вызываются из цикла событий.
+    """
+
+    WAIT_WINDOW = 1000
+
+    def __init__(self, max_concurrency: int = ADMISSION_MAX_CONCURRENCY, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, retry_after: int = ADMISSION_RETRY_AFTER):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self._active = 0
+        self._queued = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._wait_ms = deque(maxlen=self.WAIT_WINDOW)
+        self._service_time = 0.0
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> AdmissionLease:
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+
+        if self._active < self.max_concurrency and not self._queued:
+            self._active += 1
+            return self._admit(start_time, loop.time())
+
+        if self._queued >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(429, "Too many requests in queue", self._retry_after())
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._queued += 1
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            granted = future.done() and not future.cancelled()
+            if isinstance(e, asyncio.CancelledError):
+                if granted:
+                    # Место уже передано этому запросу -- возвращаем его следующему
+                    self._release(None)
+                else:
+                    future.cancel()
+                    self._queued -= 1
+                raise
+            if not granted:
+                future.cancel()
+                self._queued -= 1
+                self.rejected_timeout += 1
+                raise AdmissionRejected(503, "Request waited too long in queue", self._retry_after())
+        return self._admit(start_time, loop.time())
+
+    def _admit(self, start_time: float, now: float) -> AdmissionLease:
+        self.admitted += 1
+        self._wait_ms.append((now - start_time) * 1000)
+        return AdmissionLease(self, now)
+
+    def _release(self, started_at: Optional[float]):
+        if started_at is not None:
+            # Среднее время обработки (экспоненциальное сглаживание) для оценки Retry-After
+            service_time = asyncio.get_running_loop().time() - started_at
+            self._service_time = 0.9 * self._service_time + 0.1 * service_time if self._service_time else service_time
+
+        # Место переходит первому живому ожидающему, иначе освобождается
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self._queued -= 1
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def _retry_after(self) -> int:
+        """Оценка времени до освобождения места: очередь / параллельность * среднее время обработки"""
+        estimate = (self._queued + 1) / self.max_concurrency * self._service_time
+        return max(self.retry_after, math.ceil(estimate))
+
+    def get_stats(self) -> Dict:
+        wait_ms = list(self._wait_ms)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "queue_depth": self._queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_ms_p50": float(np.percentile(wait_ms, 50)) if wait_ms else 0.0,
+            "wait_ms_p95": float(np.percentile(wait_ms, 95)) if wait_ms else 0.0,
+            "wait_ms_max": float(max(wait_ms)) if wait_ms else 0.0,
+            "service_time_ms": self._service_time * 1000
+        }
@@ -0,0 +1,50 @@
+import time
+import threading
+from typing import Optional
+
+
+class RequestCancelled(Exception):
+    """Обработка вопроса прервана: истек срок запроса или клиент отключился"""
+
+
+class CancelToken:
+    """Срок и флаг отмены запроса, которые QA-конвейер проверяет между этапами
+
+    deadline -- момент time.time(), после которого продолжать обработку
+    бессмысленно (ответ уже никто не ждет). cancel() выставляет флаг из
+    другого потока, например при отключении клиента. В процесс пула
+    передается только срок: флаг отмены между процессами не разделяется.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.deadline = time.time() + timeout if timeout is not None else None
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    def extend(self, timeout: float):
+        """Отодвигает срок до time.time() + timeout (более ранний срок не сокращает)
+
+        Действует только на токен этого процесса: копия в процессе пула
+        сохраняет исходный срок.
+        """
+        deadline = time.time() + timeout
+        if self.deadline is not None and deadline > self.deadline:
+            self.deadline = deadline
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set() or (self.deadline is not None and time.time() >= self.deadline)
+
+    def check(self, stage: str):
+        """RequestCancelled, если запрос отменен; stage -- этап, который не будет выполнен"""
+        if self.cancelled:
+            raise RequestCancelled(f"Обработка вопроса прервана перед этапом {stage}")
+
+    def __getstate__(self):
+        return {"deadline": self.deadline}
+
+    def __setstate__(self, state):
+        self.deadline = state["deadline"]
+        self._event = threading.Event()
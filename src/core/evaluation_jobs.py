@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import EVALUATION_MAX_CONCURRENT_JOBS, EVALUATION_MAX_PENDING_JOBS
+from database_models import (
+    DatabaseManager, EVALUATION_RUNNING, EVALUATION_COMPLETED, EVALUATION_FAILED
+)
+
+# Метрики генерации, которые копируются в одноименные столбцы evaluation_results
+METRIC_COLUMNS = ("rouge1", "rouge2", "rougeL", "bleu", "bertscore", "meteor", "overall_score")
+
+
+class EvaluationQueueFull(Exception):
+    """Ожидающих задач оценки уже EVALUATION_MAX_PENDING_JOBS"""
+
+
+class AdmittedQASystem:
+    """QA-система для оценщика, работающая через общий конвейер API
+
+    answer_question и vector_store.search передаются в цикл событий API
+    корутине run(method, **kwargs) (контроль допуска с фоновым приоритетом
+    и пул QAExecutor), поток задачи оценки только ждет результат. Ответы
+    вычисляются без кэшей, не пишутся в историю и не учитываются в
+    телеметрии chunks, чтобы оценка измеряла поиск, а не попадания в кэш, и
+    не искажала отчет о горячих chunks. Остальные атрибуты берутся у
+    исходной QA-системы.
+    """
+
+    POLL_SECONDS = 1.0
+
+    def __init__(self, qa_system, run: Callable[..., Awaitable[Any]], loop: asyncio.AbstractEventLoop):
+        self._qa_system = qa_system
+        self._run = run
+        self._loop = loop
+        self.vector_store = _AdmittedVectorStore(self, qa_system.vector_store)
+
+    def answer_question(self, question: str, **kwargs) -> Dict[str, Any]:
+        kwargs.update(persist=False, use_cache=False, record_telemetry=False)
+        return self.call("answer_question", question=question, **kwargs)
+
+    def call(self, method: str, **kwargs) -> Any:
+        """Вызов method QAExecutor через цикл событий API; блокирует поток оценки до результата"""
+        future = asyncio.run_coroutine_threadsafe(self._run(method, **kwargs), self._loop)
+        while True:
+            try:
+                return future.result(timeout=self.POLL_SECONDS)
+            except FutureTimeoutError:
+                # Сервер останавливается -- ответа не будет
+                if not self._loop.is_running():
+                    future.cancel()
+                    raise RuntimeError("Event loop of the API is not running")
+
+    def __getattr__(self, name: str):
+        return getattr(self._qa_system, name)
+
+
+class _AdmittedVectorStore:
+    """Векторное хранилище оценщика: search -- через QAExecutor, остальное -- исходное хранилище"""
+
+    def __init__(self, qa_system: AdmittedQASystem, vector_store):
+        self._qa_system = qa_system
+        self._vector_store = vector_store
+
+    def search(self, query: str, k: int = 5, threshold: float = 0.3, profile: Optional[str] = None,
+               filters: Optional[Dict] = None) -> List[Tuple[str, Dict, float]]:
+        return self._qa_system.call("search_chunks", question=query, k=k, threshold=threshold,
+                                    search_profile=profile, filters=filters, record_telemetry=False)
+
+    def __getattr__(self, name: str):
+        return getattr(self._vector_store, name)
+
+
+class EvaluationJobManager:
+    """Фоновые задачи оценки качества на бенчмарке
+
+    Задача -- строка evaluation_results: создается в состоянии queued,
+    исполнитель обновляет в ней прогресс, а по завершении записывает
+    метрики и полные результаты (или текст ошибки). Одновременно
+    выполняется не более max_jobs задач, остальные ждут в очереди пула.
+    evaluator_factory(qa_system) создает оценщик поверх уже загруженной
+    QA-системы, поэтому модель и индекс повторно не загружаются. Если при
+    постановке передана корутина run, вопросы оценки отвечаются и ищутся
+    через нее (AdmittedQASystem), а не прямым вызовом в потоке задачи.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, evaluator_factory: Callable[[Any], Any],
+                 max_jobs: int = EVALUATION_MAX_CONCURRENT_JOBS, max_pending: int = EVALUATION_MAX_PENDING_JOBS):
+        self.db_manager = db_manager
+        self.evaluator_factory = evaluator_factory
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="evaluation")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        # Задачи предыдущего запуска процесса уже не выполнятся
+        interrupted = self.db_manager.fail_unfinished_evaluation_jobs("Interrupted by server restart")
+        if interrupted:
+            print(f"Задач оценки прервано перезапуском: {interrupted}")
+
+    def submit(self, qa_system, sample_size: int,
+               run: Optional[Callable[..., Awaitable[Any]]] = None) -> int:
+        """Ставит оценку в очередь и возвращает id задачи
+
+        run(method, **kwargs) вызывается из цикла событий, в котором вызван submit.
+        """
+        if run is not None:
+            qa_system = AdmittedQASystem(qa_system, run, asyncio.get_running_loop())
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise EvaluationQueueFull(f"{self._pending} evaluation jobs are already pending")
+            self._pending += 1
+
+        job_id = self.db_manager.create_evaluation_job(sample_size)
+        if job_id < 0:
+            with self._lock:
+                self._pending -= 1
+            raise RuntimeError("Failed to create evaluation job")
+
+        self._executor.submit(self._run, job_id, qa_system, sample_size)
+        return job_id
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return self.db_manager.get_evaluation_job(job_id)
+
+    def _run(self, job_id: int, qa_system, sample_size: int):
+        start_time = time.time()
+        self.db_manager.update_evaluation_job(job_id, status=EVALUATION_RUNNING)
+
+        def report_progress(done: int, total: int):
+            self.db_manager.update_evaluation_job(job_id, progress=done, total=total)
+
+        try:
+            evaluator = self.evaluator_factory(qa_system)
+            results = evaluator.evaluate_all_metrics(sample_size=sample_size, progress_callback=report_progress)
+            if not results:
+                raise RuntimeError("Evaluation returned no results")
+
+            generation_metrics = results.get("generation", {})
+            self.db_manager.update_evaluation_job(
+                job_id,
+                status=EVALUATION_COMPLETED,
+                results=results,
+                duration_seconds=time.time() - start_time,
+                **{column: float(generation_metrics.get(column, 0.0)) for column in METRIC_COLUMNS}
+            )
+        except Exception as e:
+            print(f"Ошибка задачи оценки {job_id}: {e}")
+            self.db_manager.update_evaluation_job(
+                job_id, status=EVALUATION_FAILED, error=str(e), duration_seconds=time.time() - start_time
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {"pending": self._pending, "max_pending": self.max_pending}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,92 @@
+import json
+from typing import Any, List, Dict, Optional, Tuple
+
+MONTHS_GENITIVE = (
+    "января", "февраля", "марта", "апреля", "мая", "июня",
+    "июля", "августа", "сентября", "октября", "ноября", "декабря"
+)
+
+
+def _format_number(value: float) -> str:
+    """Число по-русски: пробелы между разрядами, запятая перед дробной частью"""
+    if float(value).is_integer():
+        return f"{int(value):,}".replace(",", " ")
+    return f"{value:,.2f}".replace(",", " ").replace(".", ",")
+
+
+def _rubles(value: float) -> str:
+    if not float(value).is_integer():
+        return "рубля"
+    n = int(value) % 100
+    if 11 <= n <= 14:
+        return "рублей"
+    return {1: "рубль", 2: "рубля", 3: "рубля", 4: "рубля"}.get(n % 10, "рублей")
+
+
+class FactIndex:
+    """Индекс фактов по ключу (сущность, атрибут) с привязкой к chunks
+
+    Факты извлекаются при подготовке chunks (FactExtractor) и хранятся
+    вместе с индексом. Ответ на вопрос о точном факте -- поиск в словаре
+    вместо проверки подстрок в найденных контекстах.
+    """
+
+    FILE_NAME = "facts.json"
+    DEFAULT_ENTITY = "транснефть"
+
+    def __init__(self, facts: List[Dict]):
+        self.facts = facts
+        self._by_key: Dict[Tuple[str, str], List[Dict]] = {}
+        for fact in facts:
+            self._by_key.setdefault((fact["entity"], fact["attribute"]), []).append(fact)
+
+    @classmethod
+    def build(cls, chunk_facts: List[List[Dict]]) -> "FactIndex":
+        """Собирает индекс из фактов chunks (позиция в списке -- chunk_id)"""
+        facts = [
+            {**fact, "chunk_id": chunk_id}
+            for chunk_id, facts in enumerate(chunk_facts)
+            for fact in facts
+        ]
+        return cls(facts)
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.facts, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "FactIndex":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def get(self, attribute: str, entity: str = DEFAULT_ENTITY) -> List[Dict]:
+        """Все факты (сущность, атрибут) в порядке chunks"""
+        return self._by_key.get((entity, attribute), [])
+
+    def first(self, attribute: str, entity: str = DEFAULT_ENTITY) -> Optional[Dict]:
+        facts = self.get(attribute, entity)
+        return facts[0] if facts else None
+
+    def first_in_chunk(self, attribute: str, chunk_id: int, entity: str = DEFAULT_ENTITY) -> Optional[Dict]:
+        """Первый факт (сущность, атрибут) из данного chunk, иначе -- первый по индексу"""
+        facts = self.get(attribute, entity)
+        return next((fact for fact in facts if fact["chunk_id"] == chunk_id), facts[0] if facts else None)
+
+    @staticmethod
+    def render(fact: Dict[str, Any]) -> str:
+        """Значение факта для текста ответа: по нормализованному value, а не по фрагменту исходного текста"""
+        value = fact["value"]
+        if fact["type"] == "date":
+            year, month, day = value.split("-")
+            return f"{int(day)} {MONTHS_GENITIVE[int(month) - 1]} {year}"
+        if fact["type"] == "money":
+            return f"{_format_number(value)} {_rubles(value)}"
+        if fact["type"] == "share_count":
+            return _format_number(value)
+        return fact["text"]
+
+    def get_stats(self) -> Dict:
+        types: Dict[str, int] = {}
+        for fact in self.facts:
+            types[fact["type"]] = types.get(fact["type"], 0) + 1
+        return {"total_facts": len(self.facts), "keys": len(self._by_key), "types": types}
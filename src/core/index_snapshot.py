@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+CURRENT_POINTER = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+
+
+class SnapshotError(Exception):
+    """Снапшот индекса поврежден или несовместим"""
+
+
+def _fsync_dir(path: str):
+    """fsync каталога, чтобы переименование пережило сбой (на Windows недоступно)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _npz_sha256(path: str, arrays: Sequence[str]) -> str:
+    """Хэш выбранных массивов .npz: сам zip-архив содержит время записи и побайтно не воспроизводим"""
+    digest = hashlib.sha256()
+    with np.load(path, allow_pickle=False) as data:
+        for name in sorted(arrays):
+            array = np.ascontiguousarray(data[name])
+            digest.update(f"{name}:{array.dtype.str}:{array.shape}".encode("utf-8"))
+            digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+class SnapshotStore:
+    """Неизменяемые версионированные снапшоты векторного хранилища
+
+    Структура каталога:
+        <base_dir>/CURRENT                  -- имя активной версии
+        <base_dir>/snapshots/<version>/     -- файлы индекса и manifest.json
+
+    Снапшот сначала пишется во временный каталог, затем публикуется
+    атомарным переименованием и атомарной заменой указателя CURRENT.
+    Прерванное сохранение оставляет только временный каталог, который
+    загрузка никогда не читает.
+    """
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.snapshots_dir = os.path.join(base_dir, SNAPSHOTS_DIR)
+        self.pointer_path = os.path.join(base_dir, CURRENT_POINTER)
+
+    def publish(self, write_files: Callable[[str], None], info: Dict,
+                content_files: Optional[Mapping[str, Optional[Sequence[str]]]] = None) -> str:
+        """Пишет файлы через write_files(tmp_dir), добавляет манифест и публикует снапшот
+
+        Версия -- хэш содержимого файлов content_files (по умолчанию всех) и
+        info, поэтому одно и то же содержимое всегда получает одну версию.
+        content_files -- имя файла -> None (хэшируется файл целиком) или
+        имена массивов .npz, которые определяют содержимое.
+        Если такая версия уже есть, новый снапшот не создается: CURRENT
+        указывает на существующий. Возвращает имя версии.
+        """
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        tmp_dir = os.path.join(self.snapshots_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+
+        try:
+            write_files(tmp_dir)
+
+            files = {}
+            for name in sorted(os.listdir(tmp_dir)):
+                file_path = os.path.join(tmp_dir, name)
+                with open(file_path, "r+b") as f:
+                    os.fsync(f.fileno())
+                files[name] = {
+                    "size": os.path.getsize(file_path),
+                    "sha256": _file_sha256(file_path)
+                }
+
+            version = self._content_version(tmp_dir, files, info, content_files)
+            if os.path.isdir(self.snapshot_path(version)):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                if self.current_version() != version:
+                    self.validate(version)
+                    self._set_current(version)
+                return version
+
+            manifest = {
+                "format_version": SNAPSHOT_FORMAT_VERSION,
+                "version": version,
+                "created_at": datetime.now().isoformat(),
+                **info,
+                "files": files
+            }
+            manifest_path = os.path.join(tmp_dir, MANIFEST_NAME)
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            _fsync_dir(tmp_dir)
+
+            os.rename(tmp_dir, self.snapshot_path(version))
+            _fsync_dir(self.snapshots_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        self._set_current(version)
+        return version
+
+    @staticmethod
+    def _content_version(directory: str, files: Dict[str, Dict], info: Dict,
+                         content_files: Optional[Mapping[str, Optional[Sequence[str]]]]) -> str:
+        if content_files is None:
+            content_files = {name: None for name in files}
+        missing = [name for name in content_files if name not in files]
+        if missing:
+            raise SnapshotError(f"Файлы содержимого не записаны: {missing}")
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps(info, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        for name in sorted(content_files):
+            arrays = content_files[name]
+            checksum = files[name]["sha256"] if arrays is None else _npz_sha256(os.path.join(directory, name), arrays)
+            digest.update(f"{name}:{checksum}".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def _set_current(self, version: str):
+        """Атомарно переключает указатель CURRENT"""
+        tmp_pointer = f"{self.pointer_path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pointer, self.pointer_path)
+        _fsync_dir(self.base_dir)
+
+    def current_version(self) -> Optional[str]:
+        if not os.path.exists(self.pointer_path):
+            return None
+        with open(self.pointer_path, "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+
+    def snapshot_path(self, version: str) -> str:
+        return os.path.join(self.snapshots_dir, version)
+
+    def read_manifest(self, version: str) -> Dict:
+        manifest_path = os.path.join(self.snapshot_path(version), MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise SnapshotError(f"Манифест не найден: {manifest_path}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def resolve(self) -> Tuple[str, Optional[Dict]]:
+        """Каталог активного снапшота и его манифест
+
+        Для старых хранилищ без CURRENT возвращает (base_dir, None).
+        """
+        version = self.current_version()
+        if version is None:
+            return self.base_dir, None
+        return self.snapshot_path(version), self.read_manifest(version)
+
+    def validate(self, version: str, verify_checksums: bool = False) -> Dict:
+        """Проверяет снапшот по манифесту: формат, наличие и размер файлов
+
+        Контрольные суммы считаются только при verify_checksums=True.
+        """
+        manifest = self.read_manifest(version)
+        if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise SnapshotError(
+                f"Неподдерживаемая версия формата снапшота {version}: {manifest.get('format_version')}"
+            )
+
+        path = self.snapshot_path(version)
+        for name, file_info in manifest.get("files", {}).items():
+            file_path = os.path.join(path, name)
+            if not os.path.exists(file_path):
+                raise SnapshotError(f"Файл снапшота отсутствует: {file_path}")
+            if os.path.getsize(file_path) != file_info["size"]:
+                raise SnapshotError(f"Размер файла не совпадает с манифестом: {file_path}")
+            if verify_checksums and _file_sha256(file_path) != file_info["sha256"]:
+                raise SnapshotError(f"Контрольная сумма не совпадает: {file_path}")
+
+        return manifest
+
+    def list_versions(self) -> List[str]:
+        """Версии от старых к новым (по времени создания из манифеста)"""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        versions = [
+            name for name in os.listdir(self.snapshots_dir)
+            if not name.startswith(".") and os.path.isdir(os.path.join(self.snapshots_dir, name))
+        ]
+        return sorted(versions, key=lambda version: (self._created_at(version), version))
+
+    def _created_at(self, version: str) -> str:
+        try:
+            return self.read_manifest(version).get("created_at", "")
+        except (SnapshotError, OSError, ValueError):
+            return ""
+
+    def rollback(self, version: Optional[str] = None) -> str:
+        """Переключает CURRENT на указанную версию (по умолчанию -- на предыдущую)"""
+        versions = self.list_versions()
+        if version is None:
+            current = self.current_version()
+            older = versions[:versions.index(current)] if current in versions else versions
+            if not older:
+                raise SnapshotError("Нет предыдущей версии для отката")
+            version = older[-1]
+
+        if version not in versions:
+            raise SnapshotError(f"Версия снапшота не найдена: {version}")
+
+        self.validate(version, verify_checksums=True)
+        self._set_current(version)
+        return version
+
+    def prune(self, keep: int = 3) -> List[str]:
+        """Удаляет старые снапшоты и брошенные временные каталоги, оставляя keep последних и активный"""
+        current = self.current_version()
+        versions = self.list_versions()
+        removed = [v for v in versions[:-keep] if v != current] if keep > 0 else [v for v in versions if v != current]
+
+        for version in removed:
+            shutil.rmtree(self.snapshot_path(version), ignore_errors=True)
+        if os.path.isdir(self.snapshots_dir):
+            for name in os.listdir(self.snapshots_dir):
+                if name.startswith(".tmp-"):
+                    shutil.rmtree(os.path.join(self.snapshots_dir, name), ignore_errors=True)
+        return removed
+
+
+if __name__ == "__main__":
+    # Управление снапшотами: python core/index_snapshot.py [list|rollback [версия]|prune [N]]
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(current_dir))
+    from utils.config import VECTOR_STORE_DIR
+
+    store = SnapshotStore(VECTOR_STORE_DIR)
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if command == "rollback":
+        print(f" Активная версия: {store.rollback(sys.argv[2] if len(sys.argv) > 2 else None)}")
+    elif command == "prune":
+        removed = store.prune(int(sys.argv[2]) if len(sys.argv) > 2 else 3)
+        print(f" Удалено снапшотов: {len(removed)}")
+    else:
+        current = store.current_version()
+        for version in store.list_versions():
+            print(f" {'*' if version == current else ' '} {version}")
@@ -0,0 +1,151 @@
+import re
+import functools
+import numpy as np
+from typing import List, Dict, Tuple, Optional
+from nltk.stem import SnowballStemmer
+
+# Числа с разделителями разрядов ("724 934 300") склеиваются в один токен
+DIGIT_GROUPS_PATTERN = re.compile(r'(?<!\d)\d{1,3}(?:[ \u00a0]\d{3})+(?!\d)')
+# Числа, даты и номера ("26.08.1993", "0,01", "045-13976-000001") или слова
+TOKEN_PATTERN = re.compile(r'\d+(?:[.,/\-]\d+)*|[a-zа-я]+')
+# Размер LRU-кэша основ: словарь корпуса помещается целиком, а слова запросов не растят его без предела
+STEM_CACHE_SIZE = 100_000
+
+
+class RussianTokenizer:
+    """Токенизатор со стеммингом Snowball для русского языка"""
+
+    def __init__(self):
+        self.stemmer = SnowballStemmer("russian")
+        self._stem = functools.lru_cache(maxsize=STEM_CACHE_SIZE)(self.stemmer.stem)
+
+    def tokenize(self, text: str) -> List[str]:
+        text = text.lower().replace('ё', 'е')
+        text = DIGIT_GROUPS_PATTERN.sub(lambda m: re.sub(r'\s', '', m.group(0)), text)
+
+        tokens = []
+        for token in TOKEN_PATTERN.findall(text):
+            if token[0].isdigit():
+                tokens.append(token)
+                continue
+            tokens.append(self._stem(token))
+        return tokens
+
+
+class LexicalIndex:
+    """Инвертированный индекс BM25 по текстам chunks
+
+    Постинги хранятся в CSR-виде: для термина i его документы лежат в
+    doc_ids[offsets[i]:offsets[i + 1]]. Вместо частот хранятся готовые
+    веса BM25 каждого постинга, поэтому запрос сводится к сложению
+    нескольких срезов массива.
+    """
+
+    FILE_NAME = "lexical.npz"
+
+    def __init__(self, vocabulary: List[str], offsets: np.ndarray, doc_ids: np.ndarray,
+                 weights: np.ndarray, num_docs: int):
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.num_docs = num_docs
+        self.tokenizer = RussianTokenizer()
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.5, b: float = 0.75) -> "LexicalIndex":
+        """Строит индекс BM25 по списку текстов"""
+        tokenizer = RussianTokenizer()
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+
+        for doc_id, text in enumerate(texts):
+            tokens = tokenizer.tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                term_postings = postings.setdefault(token, {})
+                term_postings[doc_id] = term_postings.get(doc_id, 0) + 1
+
+        num_docs = len(texts)
+        avg_length = float(doc_lengths.mean()) if num_docs else 0.0
+        vocabulary = sorted(postings)
+
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        for i, term in enumerate(vocabulary):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        weights = np.empty(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(vocabulary):
+            term_docs = np.fromiter(postings[term].keys(), dtype=np.int32)
+            term_freqs = np.fromiter(postings[term].values(), dtype=np.float32)
+            idf = np.log(1.0 + (num_docs - len(term_docs) + 0.5) / (len(term_docs) + 0.5))
+            norm = k1 * (1.0 - b + b * doc_lengths[term_docs] / max(avg_length, 1e-6))
+            doc_ids[offsets[i]:offsets[i + 1]] = term_docs
+            weights[offsets[i]:offsets[i + 1]] = idf * term_freqs * (k1 + 1.0) / (term_freqs + norm)
+
+        return cls(vocabulary, offsets, doc_ids, weights, num_docs)
+
+    def save(self, path: str):
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez_compressed(
+            path,
+            vocabulary=np.array(vocabulary, dtype=str),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            num_docs=np.array(self.num_docs, dtype=np.int64)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                vocabulary=data["vocabulary"].tolist(),
+                offsets=data["offsets"],
+                doc_ids=data["doc_ids"],
+                weights=data["weights"],
+                num_docs=int(data["num_docs"])
+            )
+
+    def scores(self, query: str) -> np.ndarray:
+        """Оценки BM25 запроса для всех документов"""
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for token in set(self.tokenizer.tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # Внутри одного термина doc_ids уникальны, поэтому достаточно fancy-индексации
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query: str, k: int, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k документов по BM25: (ids, scores), только с ненулевой оценкой"""
+        scores = self.scores(query)
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size > k:
+            top = np.argpartition(-scores[candidates], k - 1)[:k]
+            candidates = candidates[top]
+        order = np.argsort(-scores[candidates], kind="stable")
+        candidates = candidates[order]
+        return candidates.astype(np.int64), scores[candidates]
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Объединяет несколько ранжирований id методом reciprocal-rank fusion"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking.tolist()):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+    if not fused:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    ids = np.fromiter(fused.keys(), dtype=np.int64)
+    fused_scores = np.fromiter(fused.values(), dtype=np.float32)
+    order = np.argsort(-fused_scores, kind="stable")
+    return ids[order], fused_scores[order]
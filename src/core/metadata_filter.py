@@ -0,0 +1,116 @@
+import numpy as np
+import faiss
+from typing import List, Dict, Any, Optional, Tuple
+
+
+class MetadataFilterIndex:
+    """Битовые маски метаданных chunks для фильтрации внутри поиска FAISS
+
+    Маски по разделам, типам элементов и булевым признакам строятся один раз
+    при загрузке индекса. Выражение фильтра вида
+        {"top_sections": ["Проекты", "История"], "is_structured": True}
+    компилируется в IDSelectorBitmap: внутри поиска FAISS вычисляет сходство
+    только для отмеченных векторов.
+
+    Поля-списки (sections -- заголовки любого уровня, top_sections -- разделы
+    верхнего уровня, element_types) объединяются по ИЛИ внутри поля,
+    разные поля -- по И.
+    """
+
+    LIST_FIELDS = ("sections", "top_sections", "element_types")
+    BOOL_FIELDS = ("is_structured", "has_header")
+    MAX_COMPILED = 1024
+
+    def __init__(self, chunk_metadata: List[Dict]):
+        self.size = len(chunk_metadata)
+        self.masks: Dict[str, Dict[Any, np.ndarray]] = {field: {} for field in self.LIST_FIELDS}
+
+        for field in self.LIST_FIELDS:
+            for idx, metadata in enumerate(chunk_metadata):
+                for value in metadata.get(field, []):
+                    mask = self.masks[field].get(value)
+                    if mask is None:
+                        mask = np.zeros(self.size, dtype=bool)
+                        self.masks[field][value] = mask
+                    mask[idx] = True
+
+        for field in self.BOOL_FIELDS:
+            self.masks[field] = {
+                True: np.array([bool(metadata.get(field, False)) for metadata in chunk_metadata], dtype=bool)
+            }
+            self.masks[field][False] = ~self.masks[field][True]
+
+        self._compiled: Dict[Tuple, Tuple[np.ndarray, Optional[faiss.SearchParameters], int]] = {}
+
+    @staticmethod
+    def _normalize(filters: Dict[str, Any]) -> Tuple:
+        """Канонический ключ выражения фильтра (для кэша скомпилированных селекторов)"""
+        key = []
+        for field in sorted(filters):
+            value = filters[field]
+            if field in MetadataFilterIndex.LIST_FIELDS:
+                if isinstance(value, str):
+                    value = [value]
+                if not isinstance(value, (list, tuple, set, frozenset)):
+                    raise ValueError(f"Поле фильтра '{field}' должно быть списком значений")
+                key.append((field, tuple(sorted(set(value)))))
+            elif field in MetadataFilterIndex.BOOL_FIELDS:
+                if not isinstance(value, bool):
+                    raise ValueError(f"Поле фильтра '{field}' должно быть true/false")
+                key.append((field, value))
+            else:
+                raise ValueError(
+                    f"Неизвестное поле фильтра: '{field}'. "
+                    f"Допустимые: {', '.join(MetadataFilterIndex.LIST_FIELDS + MetadataFilterIndex.BOOL_FIELDS)}"
+                )
+        return tuple(key)
+
+    def mask(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Булева маска chunks, удовлетворяющих фильтру"""
+        return self.compile(filters)[0]
+
+    def compile(self, filters: Dict[str, Any]) -> Tuple[np.ndarray, Optional[faiss.SearchParameters], int]:
+        """Компилирует фильтр в (маска, параметры поиска FAISS, число отобранных chunks)
+
+        Результат кэшируется: массив битовой карты должен жить столько же,
+        сколько IDSelectorBitmap, который ссылается на его память.
+        """
+        key = self._normalize(filters)
+        compiled = self._compiled.get(key)
+        if compiled is not None:
+            return compiled
+
+        mask = np.ones(self.size, dtype=bool)
+        empty = np.zeros(self.size, dtype=bool)
+        for field, value in key:
+            if field in self.LIST_FIELDS:
+                field_mask = np.zeros(self.size, dtype=bool)
+                for item in value:
+                    field_mask |= self.masks[field].get(item, empty)
+            else:
+                field_mask = self.masks[field][value]
+            mask &= field_mask
+
+        compiled = (mask, self.selector_params(mask), int(mask.sum()))
+        if len(self._compiled) >= self.MAX_COMPILED:
+            self._compiled.clear()
+        self._compiled[key] = compiled
+        return compiled
+
+    @staticmethod
+    def selector_params(mask: np.ndarray) -> faiss.SearchParameters:
+        """Параметры поиска FAISS, ограничивающие его chunks из булевой маски"""
+        bitmap = np.packbits(mask, bitorder="little")
+        selector = faiss.IDSelectorBitmap(mask.size, faiss.swig_ptr(bitmap))
+        params = faiss.SearchParameters(sel=selector)
+        # Сохраняем ссылку на bitmap в объекте параметров, чтобы память не освободилась
+        params._bitmap = bitmap
+        params._selector = selector
+        return params
+
+    def get_values(self) -> Dict[str, List]:
+        """Возвращает доступные значения полей фильтра"""
+        return {
+            field: sorted(self.masks[field].keys(), key=str)
+            for field in self.LIST_FIELDS + self.BOOL_FIELDS
+        }
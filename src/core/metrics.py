@@ -0,0 +1,101 @@
+import os
+import sys
+from typing import Callable, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import METRICS_LATENCY_BUCKETS
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Отдельный реестр: в /metrics попадают только метрики QA-системы
+REGISTRY = CollectorRegistry()
+
+
+def render() -> bytes:
+    """Все метрики реестра в текстовом формате Prometheus"""
+    return generate_latest(REGISTRY)
+
+
+def counter_total(counter: Counter) -> float:
+    """Сумма счетчика по всем значениям меток"""
+    return sum(sample.value for metric in counter.collect() for sample in metric.samples
+               if sample.name.endswith("_total"))
+
+
+def function_gauge(name: str, documentation: str, function: Callable[[], Optional[float]]) -> Gauge:
+    """Gauge, вычисляемый при выдаче метрик; None или ошибка function -- NaN"""
+    def value() -> float:
+        try:
+            result = function()
+        except Exception:
+            return float("nan")
+        return float(result) if result is not None else float("nan")
+
+    gauge = Gauge(name, documentation, registry=REGISTRY)
+    gauge.set_function(value)
+    return gauge
+
+
+def process_rss_bytes() -> Optional[float]:
+    """Резидентная память процесса (Linux: /proc/self/statm; иначе -- пик по getrusage)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return float(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return float(max_rss if sys.platform == "darwin" else max_rss * 1024)
+
+
+STAGE_LATENCY = Histogram(
+    "transneft_stage_duration_seconds",
+    "Pipeline stage latency (encode, search, rules, db_insert)",
+    ("stage",),
+    buckets=METRICS_LATENCY_BUCKETS,
+    registry=REGISTRY
+)
+REQUEST_LATENCY = Histogram(
+    "transneft_request_duration_seconds",
+    "Total API request latency, until the last byte of the response body",
+    ("handler", "method"),
+    buckets=METRICS_LATENCY_BUCKETS,
+    registry=REGISTRY
+)
+REQUESTS = Counter(
+    "transneft_requests_total",
+    "API requests by handler and status code",
+    ("handler", "status"),
+    registry=REGISTRY
+)
+CACHE_HITS = Counter(
+    "transneft_cache_hits_total",
+    "Answers served without full retrieval (rule, response, semantic, single_flight)",
+    ("cache",),
+    registry=REGISTRY
+)
+ERRORS = Counter(
+    "transneft_errors_total",
+    "Request processing errors by type",
+    ("type",),
+    registry=REGISTRY
+)
+REJECTED = Counter(
+    "transneft_rejected_requests_total",
+    "Requests rejected by admission control",
+    ("reason",),
+    registry=REGISTRY
+)
+function_gauge(
+    "transneft_process_resident_memory_bytes",
+    "Resident memory of the API process",
+    process_rss_bytes
+)
@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, List, Any, AsyncIterator, Iterator, Optional, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import (
+    QA_EXECUTOR_KIND, QA_EXECUTOR_WORKERS, QA_REQUEST_TIMEOUT, VECTOR_STORE_DIR, SINGLE_FLIGHT_ENABLED
+)
+from core.cancellation import CancelToken
+from core.single_flight import SingleFlight
+from core.admission_control import AdmissionLease
+
+# QA-система процесса-исполнителя (только для пула процессов)
+_worker_qa_system = None
+
+
+def _init_thread_worker():
+    from core.vector_store import VectorStore
+    VectorStore.limit_worker_threads()
+
+
+def _init_worker(vector_store_path: str):
+    global _worker_qa_system
+    from core.qa_system import TransneftQASystem
+    _init_thread_worker()
+    _worker_qa_system = TransneftQASystem(vector_store_path)
+
+
+def _call_in_worker(method: str, kwargs: Dict[str, Any]) -> Any:
+    return getattr(_worker_qa_system, method)(**kwargs)
+
+
+def _result_events(result: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """События потоковой выдачи из готового ответа answer_question"""
+    if "error" in result:
+        yield "error", result
+        return
+    yield "sources", {"source_documents": result.get("source_documents", [])}
+    yield "answer", {key: value for key, value in result.items()
+                     if key not in ("source_documents", "message_id", "timings")}
+    yield "saved", {"message_id": result.get("message_id", -1)}
+    if "timings" in result:
+        yield "timings", {"timings": result["timings"]}
+
+
+class QAExecutor:
+    """Выполнение answer_question вне цикла событий asyncio
+
+    kind="thread" -- пул потоков над общей QA-системой (модель и FAISS
+    отпускают GIL); kind="process" -- пул процессов, в каждом своя копия
+    QA-системы (больше памяти, кэши не общие). Число исполнителей
+    ограничено, время ожидания ответа -- timeout секунд (asyncio.TimeoutError).
+    Каждый поток или процесс пула при старте ограничивает потоки OpenMP и
+    torch (VectorStore.limit_worker_threads): параллельность дает сам пул.
+
+    Вызов получает CancelToken со сроком timeout: по истечении срока или при
+    отмене ожидающей корутины (клиент отключился) обработка прерывается на
+    ближайшей границе этапов. Переданное место допуска (lease) освобождается,
+    только когда исполнитель действительно закончил работу, поэтому
+    незавершенная после таймаута работа продолжает занимать место и очередь
+    пула не растет сверх лимита допуска.
+
+    Одинаковые одновременные вопросы (answer_question, stream_answer)
+    объединяются до постановки в пул (SingleFlight): дубликат сразу
+    освобождает свое место допуска и ждет результат ведущего в цикле событий.
+    """
+
+    def __init__(self, qa_system, kind: str = QA_EXECUTOR_KIND, workers: int = QA_EXECUTOR_WORKERS,
+                 timeout: float = QA_REQUEST_TIMEOUT, vector_store_path: str = VECTOR_STORE_DIR):
+        self.qa_system = qa_system
+        self.kind = kind
+        self.workers = workers
+        self.timeout = timeout
+        self.single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+
+        if kind == "thread":
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qa",
+                                            initializer=_init_thread_worker)
+        elif kind == "process":
+            self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                             initargs=(vector_store_path,))
+        else:
+            raise ValueError(f"Неизвестный тип исполнителя QA: {kind} (ожидается thread или process)")
+
+    async def answer_question(self, lease: Optional[AdmissionLease] = None, **kwargs) -> Dict[str, Any]:
+        """answer_question в пуле исполнителей с ограничением времени"""
+        flight_key = self._flight_key(kwargs)
+        shared = self.single_flight.get(flight_key) if flight_key is not None else None
+        if shared is not None:
+            return await self._follow(flight_key, shared, lease, kwargs)
+        return await self._call("answer_question", kwargs, lease, flight_key)
+
+    async def search_chunks(self, lease: Optional[AdmissionLease] = None, **kwargs) -> List[Tuple[str, Dict, float]]:
+        """search_chunks (только поиск) в пуле исполнителей с ограничением времени"""
+        return await self._call("search_chunks", kwargs, lease)
+
+    async def answer_batch(self, lease: Optional[AdmissionLease] = None, **kwargs) -> List[Dict[str, Any]]:
+        """answer_batch (пакет вопросов) в пуле исполнителей с ограничением времени"""
+        return await self._call("answer_batch", kwargs, lease)
+
+    def _submit(self, fn, *args, lease: Optional[AdmissionLease] = None) -> asyncio.Future:
+        """Задача в пуле; lease освобождается по ее фактическому завершению"""
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._pool, fn, *args)
+        except BaseException:
+            if lease is not None:
+                lease.release()
+            raise
+
+        def done(completed: asyncio.Future):
+            if lease is not None:
+                lease.release()
+            # Результат прерванной задачи никто не ждет -- забираем исключение, чтобы оно не попало в лог
+            if not completed.cancelled():
+                completed.exception()
+
+        future.add_done_callback(done)
+        return future
+
+    def _flight_key(self, kwargs: Dict[str, Any]) -> Optional[str]:
+        # Запросы без кэшей (оценка качества) не объединяются: им нужен собственный поиск
+        if self.single_flight is None or not kwargs.get("use_cache", True):
+            return None
+        if not (kwargs.get("question") or "").strip():
+            return None
+        return SingleFlight.make_key(kwargs["question"], kwargs.get("search_profile"), kwargs.get("filters"))
+
+    async def _follow(self, flight_key: str, shared: asyncio.Future, lease: Optional[AdmissionLease],
+                      kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Ответ дубликата: результат ведущего, записанный в историю своей сессии"""
+        if lease is not None:
+            lease.release()
+        start_time = time.perf_counter()
+        response = await self.single_flight.follow(flight_key, shared, self.timeout)
+        return await asyncio.to_thread(
+            self.qa_system.finish_coalesced, response, kwargs["question"],
+            session_id=kwargs.get("session_id", "default"), user_id=kwargs.get("user_id", "user"),
+            persist=kwargs.get("persist", True), processing_time=time.perf_counter() - start_time
+        )
+
+    async def _call(self, method: str, kwargs: Dict[str, Any], lease: Optional[AdmissionLease],
+                    flight_key: Optional[str] = None) -> Any:
+        cancel = CancelToken(self.timeout)
+        if self.kind == "thread":
+            future = self._submit(lambda: getattr(self.qa_system, method)(cancel=cancel, **kwargs), lease=lease)
+        else:
+            future = self._submit(_call_in_worker, method, dict(kwargs, cancel=cancel), lease=lease)
+        if flight_key is not None:
+            self.single_flight.lead(flight_key, future, cancel)
+        try:
+            # shield: таймаут не отменяет задачу пула, и lease держится до ее завершения
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except BaseException:
+            # Таймаут или отключение клиента ведущего, но ответ могут ждать дубликаты
+            if flight_key is None or not self.single_flight.has_followers(flight_key):
+                cancel.cancel()
+            raise
+
+    async def stream_answer(self, lease: Optional[AdmissionLease] = None,
+                            **kwargs) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """События iter_answer по мере готовности (время ожидания -- на весь ответ)
+
+        В пуле потоков генератор выполняется в исполнителе, события передаются
+        в цикл событий через очередь; если поток событий закрыт раньше времени
+        (клиент отключился), генератор отменяется и ответ в историю не пишется.
+        Пул процессов не передает промежуточные события: ответ вычисляется
+        целиком и затем разбивается на события.
+        """
+        flight_key = self._flight_key(kwargs)
+        shared = self.single_flight.get(flight_key) if flight_key is not None else None
+        if self.kind != "thread" or shared is not None:
+            if shared is not None:
+                result = await self._follow(flight_key, shared, lease, kwargs)
+            else:
+                result = await self.answer_question(lease=lease, **kwargs)
+            for item in _result_events(result):
+                yield item
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancel = CancelToken(self.timeout)
+
+        def produce() -> Dict[str, Any]:
+            # Итоговый ответ (как у answer_question) -- для дубликатов, ждущих этот поток
+            result: Dict[str, Any] = {}
+            try:
+                for item in self.qa_system.iter_answer(cancel=cancel, **kwargs):
+                    result.update(item[1])
+                    loop.call_soon_threadsafe(queue.put_nowait, item)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+            return result
+
+        future = self._submit(produce, lease=lease)
+        if flight_key is not None:
+            self.single_flight.lead(flight_key, future, cancel)
+        deadline = loop.time() + self.timeout
+        try:
+            while True:
+                item = await asyncio.wait_for(queue.get(), timeout=max(deadline - loop.time(), 0.0))
+                if item is None:
+                    break
+                yield item
+            await asyncio.shield(future)
+        finally:
+            # Поток закрыт раньше времени: генератор отменяется, если ответ не ждут дубликаты
+            if flight_key is None or not self.single_flight.has_followers(flight_key):
+                cancel.cancel()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
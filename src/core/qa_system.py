@@ -3,7 +3,7 @@ import warnings
 import json
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, Tuple, Any, Optional, Iterator
 from datetime import datetime
 import uuid
 import time
@@ -23,24 +23,61 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 src_root = os.path.dirname(os.path.dirname(current_dir))
 sys.path.insert(0, src_root)
 
-from utils.config import VECTOR_STORE_DIR, TOP_K_RESULTS, SIMILARITY_THRESHOLD
+from utils.config import (
+    VECTOR_STORE_DIR, TOP_K_RESULTS, SIMILARITY_THRESHOLD,
+    RERANK_ENABLED, RERANK_CANDIDATES, RERANK_TOP_K,
+    TELEMETRY_ENABLED, TELEMETRY_FLUSH_SECONDS,
+    RULE_FAST_PATH_ENABLED, RULE_SOURCE_CHUNKS,
+    EXTRACTIVE_TOP_CHUNKS, EXTRACTIVE_MAX_SENTENCES, RESPONSE_CACHE_ENABLED,
+    SEMANTIC_CACHE_ENABLED, CHAT_BATCH_MAX_QUESTION_LENGTH,
+    TRACE_SAMPLE_RATE
+)
 from core.vector_store import VectorStore
 from core.retrieval_engine import RetrievalEngine
+from core.reranker import CrossEncoderReranker
+from core.retrieval_telemetry import RetrievalTelemetry
+from core.response_cache import ResponseCache
+from core.semantic_cache import SemanticCache
+from core.cancellation import CancelToken, RequestCancelled
+from core.metrics import CACHE_HITS, ERRORS
+from core.tracing import Trace, TraceExporter
 
 
 class TransneftQASystem:
+    """QA-система: поиск по векторному хранилищу и извлечение ответа
+
+    answer_question() потокобезопасен и рассчитан на вызов из пула потоков:
+    общее состояние (индекс, chunks, правила) после инициализации только
+    читается, а время обработки и результаты хранятся в локальных переменных
+    запроса. Тяжелые вызовы (модель эмбеддингов, FAISS) выполняются без GIL.
+    """
 
     def __init__(self, vector_store_path: str = VECTOR_STORE_DIR):
         print("Инициализация QA системы...")
         self.vector_store = VectorStore()
         self.retrieval_engine = RetrievalEngine()
+        self.reranker = CrossEncoderReranker() if RERANK_ENABLED else None
         self.vector_store_path = vector_store_path
         self.initialized = False
-        self.processing_time = None
         self.db_manager = db_manager
+        self.telemetry = None
+        self.rule_answers: Optional[Dict[str, Tuple[str, List[Tuple[int, float]]]]] = None
+        self.response_cache = None
+        self.semantic_cache = None
+        self.trace_exporter = TraceExporter() if TRACE_SAMPLE_RATE > 0 else None
 
         try:
             self.vector_store.load_index(vector_store_path)
+            if TELEMETRY_ENABLED:
+                self._start_telemetry()
+            self.retrieval_engine.fact_index = self.vector_store.fact_index
+            if RULE_FAST_PATH_ENABLED:
+                self.rule_answers = self._resolve_rule_answers()
+            if RESPONSE_CACHE_ENABLED:
+                self.response_cache = ResponseCache(self.db_manager, self.vector_store.index_version,
+                                                    self.retrieval_engine.rules_version)
+            if SEMANTIC_CACHE_ENABLED:
+                self.semantic_cache = SemanticCache(self.vector_store.index_version)
             self.initialized = True
             print("QA система успешно инициализирована и готова к работе!")
             stats = self.vector_store.get_stats()
@@ -50,91 +87,634 @@ class TransneftQASystem:
             print("   python scripts/setup_system.py")
             raise
 
-    def answer_question(self, question: str, session_id: str = "default", user_id: str = "user") -> Dict[str, Any]:
-        """Основной метод для ответа на вопросы пользователей"""
+    def _start_telemetry(self):
+        """Подключает телеметрию выдачи chunks текущей версии индекса"""
+        self.telemetry = RetrievalTelemetry(
+            self.db_manager,
+            self.vector_store.index_version,
+            len(self.vector_store.chunks),
+            flush_interval=TELEMETRY_FLUSH_SECONDS
+        )
+        self.vector_store.telemetry = self.telemetry
+
+    def _resolve_rule_answers(self) -> Dict[str, Tuple[str, List[Tuple[int, float]]]]:
+        """Готовит ответы статических правил и их chunks-источники (ответ без поиска)
+
+        Источники ищутся по тексту ответа правила одним пакетным поиском
+        FAISS; заданные в таблице source_chunk_ids и chunks фактов
+        используются как есть (со сходством с ответом в качестве оценки).
+        Правила, для которых нет нужного факта, в быстрый путь не попадают.
+        """
+        rules, answers = [], []
+        for rule in self.retrieval_engine.static_rules():
+            answer = self.retrieval_engine.render(rule)
+            if answer:
+                rules.append(rule)
+                answers.append(answer)
+        if not rules:
+            return {}
+
+        answer_vectors = self.vector_store.encode_queries(answers)
+        scores, indices = self.vector_store.index.search(answer_vectors, RULE_SOURCE_CHUNKS)
+
+        rule_answers = {}
+        num_chunks = len(self.vector_store.chunks)
+        for i, rule in enumerate(rules):
+            source_ids = self.retrieval_engine.rule_source_ids(rule)
+            if source_ids:
+                ids = np.array([idx for idx in source_ids if 0 <= idx < num_chunks], dtype=np.int64)
+                id_scores = self.vector_store.index.reconstruct_batch(ids) @ answer_vectors[i] if ids.size else []
+                sources = [(int(idx), float(score)) for idx, score in zip(ids, id_scores)]
+            else:
+                sources = [
+                    (int(idx), float(score)) for idx, score in zip(indices[i], scores[i]) if 0 <= idx < num_chunks
+                ]
+            rule_answers[rule.id] = (answers[i], sources)
+        return rule_answers
+
+    def close(self):
+        """Сбрасывает накопленную телеметрию перед остановкой"""
+        if self.telemetry is not None:
+            self.telemetry.close()
+
+    def answer_question(self, question: str, session_id: str = "default", user_id: str = "user",
+                        search_profile: Optional[str] = None, filters: Optional[Dict] = None,
+                        persist: bool = True, include_timings: bool = False, use_cache: bool = True,
+                        record_telemetry: bool = True, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """Основной метод для ответа на вопросы пользователей
+
+        search_profile -- профиль поиска из TransneftConfig.SEARCH_CONFIGS
+        ("precision", "balanced", "recall"); None -- обычный top-k поиск.
+        filters -- фильтр по метаданным chunks (см. MetadataFilterIndex).
+        persist -- сохранять ли сообщение в историю чата.
+        include_timings -- добавить в ответ timings: длительности этапов в мс.
+        use_cache -- читать и пополнять кэш ответов и семантический кэш
+        (False -- ответ всегда вычисляется поиском, например при оценке качества).
+        record_telemetry -- учитывать ли источники ответа в телеметрии chunks
+        (False для служебных запросов, чтобы не искажать отчет о горячих chunks).
+        cancel -- срок и флаг отмены: перед поиском, извлечением ответа и
+        записью в историю проверяется, ждут ли еще ответ (иначе RequestCancelled).
+        """
+        result: Dict[str, Any] = {}
+        for _, data in self.iter_answer(question, session_id, user_id, search_profile, filters, persist,
+                                        include_timings, use_cache, record_telemetry, cancel):
+            result.update(data)
+        return result
+
+    def iter_answer(self, question: str, session_id: str = "default", user_id: str = "user",
+                    search_profile: Optional[str] = None, filters: Optional[Dict] = None,
+                    persist: bool = True, include_timings: bool = False, use_cache: bool = True,
+                    record_telemetry: bool = True,
+                    cancel: Optional[CancelToken] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Ответ по этапам для потоковой выдачи: пары (событие, данные)
+
+        "sources" -- source_documents, сразу после поиска;
+        "answer" -- result, confidence, cache_hit, processing_time;
+        "saved" -- message_id после записи в историю (-1, если не сохранялось);
+        "error" -- ошибка обработки (result, source_documents, confidence, error);
+        "timings" -- длительности этапов (только при include_timings).
+        Параметры как у answer_question. Этапы запроса записываются в трассировку,
+        выбранные трассировки сохраняются в файл (TRACE_SAMPLE_RATE).
+        """
+        trace = Trace("answer_question", {
+            "qa.search_profile": search_profile or "",
+            "qa.filtered": bool(filters),
+            "qa.question_length": len(question or "")
+        })
+        try:
+            yield from self._answer_events(question, session_id, user_id, search_profile, filters, persist, trace,
+                                           use_cache, record_telemetry, cancel)
+            trace.finish()
+            if include_timings:
+                yield "timings", {"timings": trace.timings()}
+        finally:
+            trace.finish()
+            if self.trace_exporter is not None:
+                self.trace_exporter.export(trace)
+
+    def _answer_events(self, question: str, session_id: str, user_id: str, search_profile: Optional[str],
+                       filters: Optional[Dict], persist: bool, trace: Trace, use_cache: bool,
+                       record_telemetry: bool,
+                       cancel: Optional[CancelToken]) -> Iterator[Tuple[str, Dict[str, Any]]]:
         if not self.initialized:
-            return {
+            yield "answer", {
                 "result": "Система не инициализирована. Запустите настройку системы.",
                 "source_documents": [],
                 "confidence": 0.0
             }
+            return
 
         if not question or not question.strip():
-            return {
+            yield "answer", {
                 "result": "Пожалуйста, задайте вопрос о ПАО «Транснефть».",
                 "source_documents": [],
                 "confidence": 0.0
             }
+            return
+
+        start_time = time.perf_counter()
 
-        start_time = time.time()
+        response, cache_key, cache_hit = self._precomputed_response(question, search_profile, filters, trace,
+                                                                    use_cache, record_telemetry)
+        if response is not None:
+            yield from self._finish_response(response, question, session_id, user_id, start_time,
+                                             persist and (not cache_hit or bool(response["source_documents"])),
+                                             cache_hit=cache_hit, trace=trace, cancel=cancel)
+            return
 
+        semantic_scope = None
+        sources_sent = False
         try:
-            search_results = self.vector_store.search(
-                question,
+            self._check_cancel(cancel, "encode")
+            with trace.span("encode"):
+                query_vector = self.vector_store.encode_query(question)
+
+            # Семантический кэш: ответ на близкий по смыслу вопрос без поиска по корпусу
+            response = None
+            if self.semantic_cache is not None and use_cache:
+                semantic_scope = SemanticCache.scope_key(search_profile, filters)
+                with trace.span("semantic_cache"):
+                    response = self.semantic_cache.get(query_vector, semantic_scope,
+                                                       self.vector_store.index_version)
+            cache_hit = response is not None
+
+            if cache_hit:
+                CACHE_HITS.labels("semantic").inc()
+                self._record_sources(self.vector_store.positions_of(response["source_documents"]))
+                response = dict(response)
+            else:
+                self._check_cancel(cancel, "search")
+                search_results, positions = self._search(question, query_vector, search_profile, filters, trace,
+                                                         record_telemetry)
+                source_documents = self._source_documents(search_results, positions)
+                yield "sources", {"source_documents": source_documents}
+                sources_sent = True
+                self._check_cancel(cancel, "extract")
+                response = self._extract_answer(question, query_vector, search_results, positions,
+                                                source_documents, trace)
+
+            with trace.span("cache_store"):
+                self._store_response(response, cache_key, query_vector, semantic_scope, cache_hit)
+        except RequestCancelled as e:
+            print(f"Обработка вопроса прервана: {e}")
+            trace.set_error(e)
+            raise
+        except Exception as e:
+            print(f"Ошибка при обработке вопроса: {e}")
+            ERRORS.labels(type(e).__name__).inc()
+            trace.set_error(e)
+            yield "error", self._error_response(e)
+            return
+
+        yield from self._finish_response(response, question, session_id, user_id, start_time,
+                                         persist and bool(response["source_documents"]), cache_hit=cache_hit,
+                                         trace=trace, sources_sent=sources_sent, cancel=cancel)
+
+    def search_chunks(self, question: str, k: int = 5, threshold: float = 0.3,
+                      search_profile: Optional[str] = None, filters: Optional[Dict] = None,
+                      record_telemetry: bool = True,
+                      cancel: Optional[CancelToken] = None) -> List[Tuple[str, Dict, float]]:
+        """Только поиск chunks, без извлечения ответа (например, для метрик поиска при оценке)
+
+        Результаты -- как у VectorStore.search; выполняется в пуле QAExecutor.
+        """
+        self._check_cancel(cancel, "search")
+        return self.vector_store.search(question, k=k, threshold=threshold, profile=search_profile,
+                                        filters=filters, record=record_telemetry)
+
+    def finish_coalesced(self, response: Dict[str, Any], question: str, session_id: str = "default",
+                         user_id: str = "user", persist: bool = True,
+                         processing_time: float = 0.0) -> Dict[str, Any]:
+        """Ответ ведущего запроса single-flight для присоединившегося к нему запроса
+
+        Источники учитываются в телеметрии, сообщение сохраняется в историю
+        своей сессии; message_id и timings ведущего не передаются.
+        """
+        result = {key: value for key, value in response.items() if key not in ("message_id", "timings")}
+        result["message_id"] = -1
+        if "error" in result:
+            return result
+
+        CACHE_HITS.labels("single_flight").inc()
+        self._record_sources(self.vector_store.positions_of(result["source_documents"]))
+        result["processing_time"] = processing_time
+        if persist and result["source_documents"]:
+            result["message_id"] = self._save_message(session_id, user_id, question, result["result"],
+                                                      result["source_documents"], processing_time)
+        return result
+
+    @staticmethod
+    def _error_response(error: Exception) -> Dict[str, Any]:
+        return {
+            "result": f"Произошла ошибка при обработке вашего вопроса: {str(error)}",
+            "source_documents": [],
+            "confidence": 0.0,
+            "error": str(error)
+        }
+
+    def answer_batch(self, items: List[Dict[str, str]], user_id: str = "user",
+                     search_profile: Optional[str] = None, filters: Optional[Dict] = None,
+                     persist: bool = True, cancel: Optional[CancelToken] = None) -> List[Dict[str, Any]]:
+        """Ответы на пакет вопросов: одно кодирование и один поиск FAISS на пакет
+
+        items -- [{"question": ..., "session_id": ...}], session_id необязателен.
+        Результаты -- в порядке items, у каждого status "success" или "error":
+        ошибка в одном вопросе не прерывает обработку остальных. Сообщения
+        сохраняются в историю одной транзакцией; processing_time -- время
+        обработки всего пакета. cancel -- как у answer_question: отмененный
+        пакет прерывается целиком (RequestCancelled).
+        """
+        if not self.initialized:
+            return [self._batch_error("Система не инициализирована. Запустите настройку системы.",
+                                      "not initialized") for _ in items]
+
+        trace = Trace("answer_batch", {
+            "qa.search_profile": search_profile or "",
+            "qa.filtered": bool(filters),
+            "qa.batch_size": len(items)
+        })
+        try:
+            return self._answer_batch(items, user_id, search_profile, filters, persist, trace, cancel)
+        finally:
+            trace.finish()
+            if self.trace_exporter is not None:
+                self.trace_exporter.export(trace)
+
+    def _answer_batch(self, items: List[Dict[str, str]], user_id: str, search_profile: Optional[str],
+                      filters: Optional[Dict], persist: bool, trace: Trace,
+                      cancel: Optional[CancelToken]) -> List[Dict[str, Any]]:
+        start_time = time.perf_counter()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        cache_hits = [False] * len(items)
+        to_save = [False] * len(items)
+        cache_keys: Dict[int, Optional[str]] = {}
+
+        for i, item in enumerate(items):
+            question = item.get("question") or ""
+            if not question.strip():
+                results[i] = self._batch_error("Пожалуйста, задайте вопрос о ПАО «Транснефть».", "empty question")
+            elif len(question) > CHAT_BATCH_MAX_QUESTION_LENGTH:
+                results[i] = self._batch_error(
+                    f"Вопрос длиннее {CHAT_BATCH_MAX_QUESTION_LENGTH} символов.", "question too long"
+                )
+            else:
+                response, cache_keys[i], cache_hits[i] = self._precomputed_response(question, search_profile,
+                                                                                    filters, trace)
+                if response is not None:
+                    results[i] = response
+                    to_save[i] = not cache_hits[i] or bool(response["source_documents"])
+
+        pending = [i for i, response in enumerate(results) if response is None]
+        if pending:
+            self._answer_pending(items, pending, results, cache_hits, to_save, cache_keys, search_profile, filters,
+                                 trace, cancel)
+
+        processing_time = time.perf_counter() - start_time
+        message_ids = [-1] * len(items)
+        if persist:
+            self._check_cancel(cancel, "persist")
+            saved = [i for i in range(len(items)) if to_save[i]]
+            with trace.span("persist"):
+                saved_ids = self._save_messages(
+                    [(items[i].get("session_id") or "default", user_id, items[i]["question"],
+                      results[i]["result"], results[i]["source_documents"]) for i in saved],
+                    processing_time
+                )
+            for i, message_id in zip(saved, saved_ids):
+                message_ids[i] = message_id
+
+        batch = []
+        for i, response in enumerate(results):
+            response = dict(response)
+            response.setdefault("status", "success")
+            response["cache_hit"] = cache_hits[i]
+            response["processing_time"] = processing_time
+            response["message_id"] = message_ids[i]
+            batch.append(response)
+        return batch
+
+    def _answer_pending(self, items: List[Dict[str, str]], pending: List[int],
+                        results: List[Optional[Dict[str, Any]]], cache_hits: List[bool], to_save: List[bool],
+                        cache_keys: Dict[int, Optional[str]], search_profile: Optional[str],
+                        filters: Optional[Dict], trace: Trace, cancel: Optional[CancelToken]):
+        """Кодирование, семантический кэш, поиск и извлечение ответов для вопросов без готового ответа"""
+        questions = [items[i]["question"] for i in pending]
+        semantic_scope = None
+        self._check_cancel(cancel, "encode")
+        try:
+            with trace.span("encode"):
+                query_vectors = self.vector_store.encode_queries(questions)
+
+            if self.semantic_cache is not None:
+                semantic_scope = SemanticCache.scope_key(search_profile, filters)
+                with trace.span("semantic_cache"):
+                    for row, i in enumerate(pending):
+                        cached = self.semantic_cache.get(query_vectors[row:row + 1], semantic_scope,
+                                                         self.vector_store.index_version)
+                        if cached is not None:
+                            CACHE_HITS.labels("semantic").inc()
+                            self._record_sources(self.vector_store.positions_of(cached["source_documents"]))
+                            results[i] = dict(cached)
+                            cache_hits[i] = True
+
+            rows = [row for row, i in enumerate(pending) if results[i] is None]
+            self._check_cancel(cancel, "search")
+            batch_results = self._search_batch([questions[row] for row in rows], query_vectors[rows],
+                                               search_profile, filters, trace) if rows else []
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            print(f"Ошибка при пакетной обработке вопросов: {e}")
+            ERRORS.labels(type(e).__name__).inc()
+            trace.set_error(e)
+            for i in pending:
+                if results[i] is None:
+                    results[i] = self._batch_error(f"Произошла ошибка при обработке вашего вопроса: {str(e)}", str(e))
+            return
+
+        for row, (search_results, positions) in zip(rows, batch_results):
+            self._check_cancel(cancel, "extract")
+            i = pending[row]
+            query_vector = query_vectors[row:row + 1]
+            try:
+                results[i] = self._extract_answer(questions[row], query_vector, search_results, positions,
+                                                  self._source_documents(search_results, positions), trace)
+            except Exception as e:
+                print(f"Ошибка при обработке вопроса: {e}")
+                ERRORS.labels(type(e).__name__).inc()
+                results[i] = self._batch_error(f"Произошла ошибка при обработке вашего вопроса: {str(e)}", str(e))
+
+        with trace.span("cache_store"):
+            for row, i in enumerate(pending):
+                if results[i].get("status") == "error":
+                    continue
+                self._store_response(results[i], cache_keys.get(i), query_vectors[row:row + 1], semantic_scope,
+                                     cache_hits[i])
+                to_save[i] = bool(results[i]["source_documents"])
+
+    @staticmethod
+    def _batch_error(result: str, error: str) -> Dict[str, Any]:
+        return {
+            "result": result,
+            "source_documents": [],
+            "confidence": 0.0,
+            "status": "error",
+            "error": error
+        }
+
+    def _search_batch(self, questions: List[str], query_vectors: np.ndarray, search_profile: Optional[str],
+                      filters: Optional[Dict], trace: Trace) -> List[Tuple[List[Tuple[str, Dict, float]], List[int]]]:
+        """Пакетный поиск chunks (переранжирование -- по каждому вопросу); для каждого вопроса -- как _search"""
+        with trace.span("search"):
+            batch_hits = self.vector_store.search_batch_ids(
+                questions,
+                query_vectors,
                 k=TOP_K_RESULTS,
-                threshold=SIMILARITY_THRESHOLD
+                threshold=SIMILARITY_THRESHOLD,
+                profile=search_profile,
+                filters=filters,
+                min_k=RERANK_CANDIDATES if self.reranker else 0
             )
 
-            if not search_results:
-                return {
-                    "result": "К сожалению, в базе знаний ПАО «Транснефть» нет информации по вашему вопросу. Попробуйте переформулировать вопрос.",
-                    "source_documents": [],
-                    "confidence": 0.0
-                }
-
-            contexts = [chunk for chunk, metadata, score in search_results]
-            source_documents = [
-                {
-                    "content": chunk,
-                    "metadata": metadata,
-                    "score": float(score)
-                }
-                for chunk, metadata, score in search_results
+        if not self.reranker:
+            return [self._hits_results(indices, scores) for indices, scores in batch_hits]
+        with trace.span("rerank"):
+            return [
+                self._rerank(question, *self._hits_results(indices, scores))
+                for question, (indices, scores) in zip(questions, batch_hits)
             ]
 
-            answer = self.retrieval_engine.answer_question(question, contexts)
+    def _hits_results(self, indices: np.ndarray, scores: np.ndarray) -> Tuple[List[Tuple[str, Dict, float]], List[int]]:
+        return self.vector_store.to_results(indices, scores), [int(i) for i in indices]
 
-            self.processing_time = time.time() - start_time
+    def _rerank(self, question: str, search_results: List[Tuple[str, Dict, float]],
+                positions: List[int]) -> Tuple[List[Tuple[str, Dict, float]], List[int]]:
+        if not search_results:
+            return search_results, positions
+        order = self.reranker.rerank_order(question, search_results, top_n=RERANK_TOP_K)
+        return [search_results[i] for i in order], [positions[i] for i in order]
 
-            message_id = -1
-            try:
-                chat_message = ChatMessage(
-                    session_id=session_id,
-                    user_id=user_id,
-                    question=question,
-                    answer=answer,
-                    sources=json.dumps(source_documents, ensure_ascii=False),
-                    timestamp=datetime.now(),
-                    response_time=self.processing_time,
-                    model_used="transneft_qa_system"
-                )
-                message_id = self.db_manager.save_chat_message(chat_message)
-            except Exception as db_error:
-                print(f"Ошибка сохранения в БД: {db_error}")
+    def _precomputed_response(self, question: str, search_profile: Optional[str], filters: Optional[Dict],
+                              trace: Trace, use_cache: bool = True,
+                              record_telemetry: bool = True) -> Tuple[Optional[Dict[str, Any]], Optional[str], bool]:
+        """Ответ без кодирования вопроса: статическое правило или точный кэш ответов (если use_cache)
 
-            return {
-                "result": answer,
-                "source_documents": source_documents,
-                "confidence": float(search_results[0][2]) if search_results else 0.8,
-                "message_id": message_id,
-                "processing_time": self.processing_time
+        Возвращает (ответ или None, ключ кэша ответов, признак попадания в кэш).
+        """
+        # Быстрый путь: статическое правило отвечает без кодирования и поиска.
+        # С фильтрами по метаданным всегда выполняется поиск
+        if self.rule_answers is not None and not filters:
+            with trace.span("rules"):
+                rule = self.retrieval_engine.route(question)
+            if rule is not None and rule.id in self.rule_answers:
+                CACHE_HITS.labels("rule").inc()
+                if record_telemetry:
+                    self._record_sources(np.array([chunk_id for chunk_id, _ in self.rule_answers[rule.id][1]],
+                                                  dtype=np.int64))
+                return self._rule_response(rule), None, False
+
+        cache_key = None
+        if self.response_cache is not None and use_cache:
+            with trace.span("normalize"):
+                cache_key = self.response_cache.make_key(question, search_profile, filters)
+            with trace.span("cache_lookup"):
+                cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                CACHE_HITS.labels("response").inc()
+                self._record_sources(self.vector_store.positions_of(cached["source_documents"]))
+                return dict(cached), cache_key, True
+        return None, cache_key, False
+
+    @staticmethod
+    def _check_cancel(cancel: Optional[CancelToken], stage: str):
+        if cancel is not None:
+            cancel.check(stage)
+
+    def _record_sources(self, positions: np.ndarray):
+        """Учитывает в телеметрии источники ответа, выданного без поиска FAISS
+
+        Иначе chunks самых частых вопросов (правила, кэши) выглядели бы в
+        отчете телеметрии никогда не извлекаемыми.
+        """
+        if self.telemetry is not None:
+            self.telemetry.record(positions)
+
+    def _store_response(self, response: Dict[str, Any], cache_key: Optional[str], query_vector: np.ndarray,
+                        semantic_scope: Optional[str], cache_hit: bool):
+        """Сохраняет вычисленный ответ в кэш ответов и семантический кэш"""
+        negative = not response["source_documents"]
+        if cache_key is not None:
+            self.response_cache.put(cache_key, dict(response), negative=negative)
+        if semantic_scope is not None and not cache_hit and not negative:
+            self.semantic_cache.put(query_vector, semantic_scope, dict(response))
+
+    def _search(self, question: str, query_vector: np.ndarray, search_profile: Optional[str],
+                filters: Optional[Dict], trace: Trace,
+                record_telemetry: bool = True) -> Tuple[List[Tuple[str, Dict, float]], List[int]]:
+        """Поиск chunks (с переранжированием, если оно включено)
+
+        Возвращает результаты и позиции их chunks в индексе FAISS (по ним
+        же индексированы тексты, метаданные и индекс предложений).
+        """
+        with trace.span("search"):
+            indices, scores = self.vector_store.search_ids(
+                question,
+                k=TOP_K_RESULTS,
+                threshold=SIMILARITY_THRESHOLD,
+                profile=search_profile,
+                filters=filters,
+                query_vector=query_vector,
+                record=record_telemetry,
+                min_k=RERANK_CANDIDATES if self.reranker else 0
+            )
+        search_results, positions = self._hits_results(indices, scores)
+
+        if self.reranker and search_results:
+            with trace.span("rerank"):
+                search_results, positions = self._rerank(question, search_results, positions)
+        return search_results, positions
+
+    @staticmethod
+    def _source_documents(search_results: List[Tuple[str, Dict, float]], positions: List[int]) -> List[Dict]:
+        """Источники ответа; position -- позиция chunk в индексе (id для GET /api/chunks/{id})"""
+        return [
+            {
+                "content": chunk,
+                "metadata": metadata,
+                "score": float(score),
+                "position": position
             }
+            for (chunk, metadata, score), position in zip(search_results, positions)
+        ]
 
-        except Exception as e:
-            print(f"Ошибка при обработке вопроса: {e}")
+    def _extract_answer(self, question: str, query_vector: np.ndarray,
+                        search_results: List[Tuple[str, Dict, float]], positions: List[int],
+                        source_documents: List[Dict], trace: Trace) -> Dict[str, Any]:
+        """Извлечение ответа из найденных chunks: result, source_documents, confidence"""
+        with trace.span("extract"):
+            return self._build_answer(question, query_vector, search_results, positions, source_documents)
+
+    def _build_answer(self, question: str, query_vector: np.ndarray,
+                      search_results: List[Tuple[str, Dict, float]], positions: List[int],
+                      source_documents: List[Dict]) -> Dict[str, Any]:
+        if not search_results:
             return {
-                "result": f"Произошла ошибка при обработке вашего вопроса: {str(e)}",
+                "result": "К сожалению, в базе знаний ПАО «Транснефть» нет информации по вашему вопросу. Попробуйте переформулировать вопрос.",
                 "source_documents": [],
-                "confidence": 0.0,
-                "error": str(e)
+                "confidence": 0.0
             }
 
+        contexts = [chunk for chunk, metadata, score in search_results]
+
+        # Извлекающий ответ: лучшие предложения верхних chunks по тому же вектору запроса.
+        # Индекс предложений адресуется позициями chunks в FAISS, а не metadata['chunk_id']
+        sentences = self.vector_store.best_sentences(
+            query_vector,
+            positions[:EXTRACTIVE_TOP_CHUNKS],
+            EXTRACTIVE_MAX_SENTENCES
+        )
+        answer = self.retrieval_engine.answer_question(question, contexts, sentences=sentences)
+
+        return {
+            "result": answer,
+            "source_documents": source_documents,
+            "confidence": float(search_results[0][2])
+        }
+
+    def _finish_response(self, response: Dict[str, Any], question: str, session_id: str, user_id: str,
+                         start_time: float, persist: bool, cache_hit: bool, trace: Trace,
+                         sources_sent: bool = False,
+                         cancel: Optional[CancelToken] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Завершающие события: источники (если еще не отправлены), ответ, id сообщения
+
+        Ответ отдается до записи в историю; отмененный запрос в историю не пишется.
+        """
+        processing_time = time.perf_counter() - start_time
+        source_documents = response["source_documents"]
+
+        if not sources_sent:
+            yield "sources", {"source_documents": source_documents}
+
+        answer = {key: value for key, value in response.items() if key != "source_documents"}
+        answer["processing_time"] = processing_time
+        answer["cache_hit"] = cache_hit
+        trace.set_attribute("qa.cache_hit", cache_hit)
+        trace.set_attribute("qa.sources", len(source_documents))
+        yield "answer", answer
+
+        message_id = -1
+        if persist:
+            self._check_cancel(cancel, "persist")
+            with trace.span("persist"):
+                message_id = self._save_message(session_id, user_id, question, response["result"],
+                                                source_documents, processing_time)
+        yield "saved", {"message_id": message_id}
+
+    def _rule_response(self, rule) -> Dict[str, Any]:
+        """Ответ статического правила с заранее подобранными источниками"""
+        answer, sources = self.rule_answers[rule.id]
+        source_documents = [
+            {
+                "content": self.vector_store.chunks[chunk_id],
+                "metadata": self.vector_store.chunk_metadata[chunk_id],
+                "score": score,
+                "position": chunk_id
+            }
+            for chunk_id, score in sources
+        ]
+        return {
+            "result": answer,
+            "source_documents": source_documents,
+            "confidence": 1.0,
+            "rule_id": rule.id
+        }
+
+    def _save_message(self, session_id: str, user_id: str, question: str, answer: str,
+                      source_documents: List[Dict], processing_time: float) -> int:
+        """Сохраняет сообщение в историю чата, возвращает его id (-1 при ошибке)"""
+        try:
+            chat_message = ChatMessage(
+                session_id=session_id,
+                user_id=user_id,
+                question=question,
+                answer=answer,
+                sources=json.dumps(source_documents, ensure_ascii=False),
+                timestamp=datetime.now(),
+                response_time=processing_time,
+                model_used="transneft_qa_system"
+            )
+            return self.db_manager.save_chat_message(chat_message)
+        except Exception as db_error:
+            print(f"Ошибка сохранения в БД: {db_error}")
+            return -1
+
+    def _save_messages(self, messages: List[Tuple[str, str, str, str, List[Dict]]],
+                       processing_time: float) -> List[int]:
+        """Сохраняет сообщения (session_id, user_id, вопрос, ответ, источники) одной транзакцией"""
+        timestamp = datetime.now()
+        chat_messages = [
+            ChatMessage(
+                session_id=session_id,
+                user_id=user_id,
+                question=question,
+                answer=answer,
+                sources=json.dumps(source_documents, ensure_ascii=False),
+                timestamp=timestamp,
+                response_time=processing_time,
+                model_used="transneft_qa_system"
+            )
+            for session_id, user_id, question, answer, source_documents in messages
+        ]
+        return self.db_manager.save_chat_messages(chat_messages)
+
     def get_search_stats(self, question: str) -> Dict:
         if not self.initialized:
             return {"error": "Система не инициализирована"}
 
         try:
+            start_time = time.perf_counter()
             search_results = self.vector_store.search(question, k=TOP_K_RESULTS)
+            processing_time = time.perf_counter() - start_time
 
             return {
                 'question': question,
@@ -142,7 +722,7 @@ class TransneftQASystem:
                 'results_found': len(search_results),
                 'top_scores': [float(score) for _, _, score in search_results],
                 'top_sections': [metadata.get('sections', ['Unknown'])[0] if metadata.get('sections') else 'Unknown' for _, metadata, _ in search_results],
-                'processing_time': self.processing_time,
+                'processing_time': processing_time,
             }
         except Exception as e:
             return {"error": str(e)}
@@ -157,6 +737,9 @@ class TransneftQASystem:
             "status": "Активна",
             "vector_store": stats,
             "retrieval_engine": "Retrieval-only (без LLM)",
+            "reranker": self.reranker.get_stats() if self.reranker else None,
+            "response_cache": self.response_cache.get_stats() if self.response_cache else None,
+            "semantic_cache": self.semantic_cache.get_stats() if self.semantic_cache else None,
             "model": stats.get("model", "Unknown"),
             "total_chunks": stats.get("total_chunks", 0),
             "similarity_threshold": SIMILARITY_THRESHOLD
@@ -0,0 +1,172 @@
+import os
+import sys
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+import torch
+from sentence_transformers import CrossEncoder
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import (
+    RERANKER_MODEL, RERANK_CANDIDATES, RERANK_DEADLINE_MS,
+    RERANK_BATCH_SIZE, RERANK_BATCH_WAIT_MS, RERANK_CACHE_SIZE
+)
+from core.vector_store import VectorStore
+
+
+class PairScoreCache:
+    """LRU-кэш оценок пар (хэш вопроса, chunk_id)"""
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self._data: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[Tuple[str, int]]) -> List[Optional[float]]:
+        with self._lock:
+            values = []
+            for key in keys:
+                value = self._data.get(key)
+                if value is not None:
+                    self._data.move_to_end(key)
+                values.append(value)
+            return values
+
+    def put_many(self, items: List[Tuple[Tuple[str, int], float]]):
+        with self._lock:
+            for key, value in items:
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CrossEncoderReranker:
+    """Переранжирование найденных chunks локальным cross-encoder
+
+    Пары (вопрос, chunk) от всех одновременных запросов собираются фоновым
+    потоком в общие батчи. Если оценки не готовы к дедлайну, запрос получает
+    исходный порядок, а досчитанные оценки все равно попадают в кэш.
+    """
+
+    def __init__(self, model_name: str = RERANKER_MODEL, candidate_budget: int = RERANK_CANDIDATES,
+                 deadline_ms: float = RERANK_DEADLINE_MS, batch_size: int = RERANK_BATCH_SIZE,
+                 batch_wait_ms: float = RERANK_BATCH_WAIT_MS, cache_size: int = RERANK_CACHE_SIZE):
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.model = CrossEncoder(model_name, device=self.device)
+        self.model_name = model_name
+        self.candidate_budget = candidate_budget
+        self.deadline = deadline_ms / 1000.0
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.cache = PairScoreCache(cache_size)
+
+        self.stats = {"requests": 0, "timeouts": 0, "cached_pairs": 0, "scored_pairs": 0, "batches": 0}
+        self._queue: "queue.Queue[Tuple[List[Tuple[str, str]], List[Tuple[str, int]], Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._batch_loop, name="reranker", daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def question_hash(question: str) -> str:
+        return hashlib.sha1(" ".join(question.lower().split()).encode("utf-8")).hexdigest()
+
+    def rerank(self, question: str, search_results: List[Tuple[str, Dict, float]],
+               top_n: Optional[int] = None) -> List[Tuple[str, Dict, float]]:
+        """Переупорядочивает первые candidate_budget результатов поиска по оценке cross-encoder
+
+        Возвращает не более top_n результатов. При превышении дедлайна
+        возвращается исходный порядок.
+        """
+        return [search_results[i] for i in self.rerank_order(question, search_results, top_n)]
+
+    def rerank_order(self, question: str, search_results: List[Tuple[str, Dict, float]],
+                     top_n: Optional[int] = None) -> List[int]:
+        """Как rerank, но возвращает позиции результатов в search_results в новом порядке"""
+        self.stats["requests"] += 1
+        candidates = search_results[:self.candidate_budget]
+        top_n = top_n or len(candidates)
+        if len(candidates) <= 1:
+            return list(range(len(candidates)))[:top_n]
+
+        question_key = self.question_hash(question)
+        keys = [(question_key, metadata.get("chunk_id", i)) for i, (_, metadata, _) in enumerate(candidates)]
+        scores = self.cache.get_many(keys)
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        self.stats["cached_pairs"] += len(candidates) - len(missing)
+        if missing:
+            future: Future = Future()
+            self._queue.put((
+                [(question, candidates[i][0]) for i in missing],
+                [keys[i] for i in missing],
+                future
+            ))
+            try:
+                missing_scores = future.result(timeout=self.deadline)
+            except FutureTimeoutError:
+                self.stats["timeouts"] += 1
+                return list(range(len(candidates)))[:top_n]
+            except Exception as e:
+                print(f" Ошибка переранжирования: {e}")
+                return list(range(len(candidates)))[:top_n]
+
+            for i, score in zip(missing, missing_scores):
+                scores[i] = score
+
+        order = np.argsort(-np.asarray(scores, dtype=np.float32), kind="stable")
+        return [int(i) for i in order[:top_n]]
+
+    def _batch_loop(self):
+        """Фоновый цикл: собирает пары из очереди и оценивает их общими батчами"""
+        while True:
+            jobs = [self._queue.get()]
+            pair_count = len(jobs[0][0])
+
+            # Добираем пары от других запросов, пока не заполнен батч или не истекло ожидание
+            try:
+                while pair_count < self.batch_size:
+                    job = self._queue.get(timeout=self.batch_wait)
+                    jobs.append(job)
+                    pair_count += len(job[0])
+            except queue.Empty:
+                pass
+
+            pairs = [pair for job_pairs, _, _ in jobs for pair in job_pairs]
+            try:
+                with VectorStore.bulk_threads():
+                    batch_scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+                batch_scores = np.asarray(batch_scores, dtype=np.float32).reshape(-1)
+                self.stats["batches"] += 1
+                self.stats["scored_pairs"] += len(pairs)
+            except Exception as e:
+                for _, _, future in jobs:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for job_pairs, job_keys, future in jobs:
+                job_scores = batch_scores[offset:offset + len(job_pairs)].tolist()
+                offset += len(job_pairs)
+                # Кэш заполняется здесь: запрос мог уже уйти по дедлайну
+                self.cache.put_many(list(zip(job_keys, job_scores)))
+                future.set_result(job_scores)
+
+    def get_stats(self) -> Dict:
+        return {
+            "model": self.model_name,
+            "candidate_budget": self.candidate_budget,
+            "deadline_ms": self.deadline * 1000.0,
+            "cache_size": len(self.cache),
+            **self.stats
+        }
@@ -0,0 +1,132 @@
+import os
+import sys
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Any
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_NEGATIVE_TTL
+
+# Версия формата сохраненного ответа: при изменении записи прежнего формата не читаются
+# (2 -- у источников есть position)
+RESPONSE_FORMAT_VERSION = 2
+
+
+def normalize_question(question: str) -> str:
+    """Нормализация вопроса для ключа кэша: регистр, ё, пробелы, концевая пунктуация"""
+    question = question.lower().replace('ё', 'е')
+    question = re.sub(r'\s+', ' ', question).strip()
+    return question.rstrip(' ?!.')
+
+
+def canonical_filters(filters: Optional[Dict]) -> Dict:
+    """Фильтры в каноническом виде для ключей кэшей
+
+    Значения полей-списков объединяются по ИЛИ (см. MetadataFilterIndex),
+    поэтому порядок и повторы в них не важны: значения сортируются без повторов.
+    """
+    canonical = {}
+    for field, value in (filters or {}).items():
+        if isinstance(value, (list, tuple)):
+            value = sorted({json.dumps(item, ensure_ascii=False, sort_keys=True): item for item in value}.items())
+            value = [item for _, item in value]
+        canonical[field] = value
+    return canonical
+
+
+class ResponseCache:
+    """Двухуровневый кэш ответов: LRU в памяти и таблица response_cache в SQLite
+
+    Ключ -- нормализованный вопрос, профиль поиска и фильтры; пространство
+    ключей (namespace) -- версия снапшота индекса, версия таблицы правил
+    и версия формата ответа.
+    После переиндексации или изменения правил старые записи не находятся
+    и удаляются при запуске. Отрицательные ответы ("нет информации")
+    хранятся с меньшим TTL.
+
+    SQLite читается только при запуске: LRU заполняется последними
+    записями текущего пространства ключей, дальше поиск идет только в
+    памяти, а новые ответы записываются в оба уровня.
+    """
+
+    def __init__(self, db_manager, index_version: str, rules_version: str,
+                 max_size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL,
+                 negative_ttl: float = RESPONSE_CACHE_NEGATIVE_TTL):
+        self.db_manager = db_manager
+        self.namespace = f"{index_version or 'legacy'}:{rules_version}:{RESPONSE_FORMAT_VERSION}"
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+        self._data: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        now = time.time()
+        purged = self.db_manager.purge_response_cache(self.namespace, now)
+        if purged:
+            print(f"Удалено устаревших записей кэша ответов: {purged}")
+
+        # Самые свежие записи -- последними, чтобы они дольше оставались в LRU
+        rows = self.db_manager.load_cached_responses(self.namespace, now, self.max_size)
+        for key, raw in reversed(rows):
+            stored = json.loads(raw)
+            self._put_memory(key, stored["expires_at"], stored["response"])
+        self.warmed = len(rows)
+
+    def make_key(self, question: str, profile: Optional[str], filters: Optional[Dict]) -> str:
+        payload = json.dumps(
+            [self.namespace, normalize_question(question), profile or "", canonical_filters(filters)],
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: Dict[str, Any], negative: bool = False):
+        expires_at = time.time() + (self.negative_ttl if negative else self.ttl)
+        with self._lock:
+            self._put_memory(key, expires_at, response)
+        self.db_manager.save_cached_response(
+            key, self.namespace,
+            json.dumps({"expires_at": expires_at, "response": response}, ensure_ascii=False),
+            expires_at
+        )
+
+    def _put_memory(self, key: str, expires_at: float, response: Dict[str, Any]):
+        self._data[key] = (expires_at, response)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "entries": len(self._data),
+                "warmed_from_disk": self.warmed,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -1,99 +1,91 @@
 import os
 import sys
 import re
-from typing import List
+from typing import List, Dict, Optional
 current_dir = os.path.dirname(os.path.abspath(__file__))
 src_root = os.path.dirname(os.path.dirname(current_dir))
 sys.path.insert(0, src_root)
 
-from utils.config import KEY_FACTS
+from utils.config import ANSWER_RULES_PATH
+from core.rule_engine import RuleSet, AnswerRule
+from core.metrics import STAGE_LATENCY
 
 
 class RetrievalEngine:
-    def __init__(self):
-        self.key_facts = KEY_FACTS
-
-    def answer_question(self, question: str, contexts: List[str]) -> str:
+    """Извлечение ответа из найденных контекстов по таблице правил
+
+    Правила (src/data/answer_rules.json) сгруппированы: сначала проверяются
+    подробные ответы (detailed), затем точные факты (exact), затем
+    структурированные ответы (structured); если ни одно правило не дало
+    ответа, возвращается лучший контекст. Все триггеры сопоставляются
+    с вопросом одним проходом автомата Ахо-Корасик.
+    """
+
+    ANSWER_GROUPS = ("detailed", "exact", "structured")
+    DEFAULT_QUESTION_TYPE = "общий"
+
+    def __init__(self, rules_path: str = ANSWER_RULES_PATH):
+        self.rules = RuleSet.load(rules_path)
+        # Индекс фактов подключается после загрузки векторного хранилища
+        self.fact_index = None
+
+    @property
+    def rules_version(self) -> str:
+        return self.rules.version
+
+    def _match(self, question_lower: str) -> Dict[str, AnswerRule]:
+        with STAGE_LATENCY.labels("rules").time():
+            return self.rules.match(question_lower)
+
+    def answer_question(self, question: str, contexts: List[str], sentences: Optional[List[str]] = None) -> str:
+        """Ответ по правилам; иначе -- лучшие предложения контекстов (sentences),
+        а без них -- начало лучшего контекста"""
         if not contexts:
             return "Информация по вашему вопросу не найдена в базе знаний ПАО «Транснефть»."
 
         question_lower = question.lower()
+        matched = self._match(question_lower)
 
-        exact_answer = self._improved_extract_exact_answer(question_lower, contexts)
-        if exact_answer:
-            return exact_answer
+        for group in self.ANSWER_GROUPS:
+            rule = matched.get(group)
+            if rule is not None:
+                answer = rule.apply(contexts, self.fact_index)
+                if answer:
+                    return answer
 
-        structured_answer = self._extract_structured_answer(question_lower, contexts)
-        if structured_answer:
-            return structured_answer
+        if sentences:
+            return self._clean_context(" ".join(sentences))
 
         return self._extract_best_context(question_lower, contexts)
 
-    def _extract_exact_answer(self, question_lower: str, contexts: List[str]) -> str:
-        """Извлечение точных фактов (даты, числа, имена)"""
-
-        if any(word in question_lower for word in ['акций', 'акции', 'уставный капитал']):
-            for context in contexts:
-                if "724 934 300" in context:
-                    return "Уставный капитал ПАО «Транснефть» разделен на 724 934 300 акций номинальной стоимостью 0,01 рубля каждая."
-
-        elif any(word in question_lower for word in
-                 ['когда зарегистрирована', 'дата регистрации', 'основана', 'регистрации']):
-            for context in contexts:
-                if "26.08.1993" in context:
-                    return "ПАО «Транснефть» было зарегистрировано 26 августа 1993 года."
-                elif "26 августа 1993" in context:
-                    return "ПАО «Транснефть» было зарегистрировано 26 августа 1993 года."
-                elif "26.08.1993" in context:
-                    return "ПАО «Транснефть» было зарегистрировано 26 августа 1993 года."
-
-            return "ПАО «Транснефть» было зарегистрировано 26 августа 1993 года."
-
-        elif any(word in question_lower for word in ['аудитор', 'аудитор компании', 'аудиторская']):
-            for context in contexts:
-                if "Акционерное общество «Кэпт»" in context or "АО «Кэпт»" in context:
-                    return "Аудитором ПАО «Транснефть» является Акционерное общество «Кэпт» (АО «Кэпт»)."
-
-        elif any(word in question_lower for word in ['держатель реестра', 'реестр акционеров', 'регистратор']):
-            for context in contexts:
-                if "Независимая регистраторская компания Р.О.С.Т." in context or "АО «НРК — Р.О.С.Т.»" in context:
-                    return "Держателем реестра акционеров ПАО «Транснефть» является Акционерное общество «Независимая регистраторская компания Р.О.С.Т.» (АО «НРК — Р.О.С.Т.»)."
-
-        return ""
-
-    def _extract_structured_answer(self, question_lower: str, contexts: List[str]) -> str:
-
-        if any(word in question_lower for word in
-               ['основные направления', 'деятельности', 'чем занимается', 'направления деятельности']):
-            return """Основные направления деятельности ПАО «Транснефть»:
-    • Транспортировка нефти и нефтепродуктов по системе магистральных трубопроводов
-    • Проведение профилактических, диагностических и аварийно-восстановительных работ на магистральных трубопроводах  
-    • Координация деятельности по комплексному развитию сети магистральных трубопроводов"""
-
-        elif any(word in question_lower for word in ['проекты', 'проект', 'какие проекты']):
-            project_keywords = [
-                'ВСТО', 'Заполярье', 'Куюмба', 'БТС', 'Восточная Сибирь',
-                'Козьмино', 'Тайшет', 'Пурпе', 'Самотлор', 'Балтийская',
-                'Тихий океан', 'Сковородино', 'Мохэ'
-            ]
-            projects_found = []
-            for ctx in contexts:
-                for keyword in project_keywords:
-                    if keyword in ctx and keyword not in projects_found:
-                        projects_found.append(keyword)
-
-            if projects_found:
-                return f"ПАО «Транснефть» реализует ключевые проекты: {', '.join(projects_found)}."
-            else:
-                return "ПАО «Транснефть» реализует масштабные проекты: ВСТО (Восточная Сибирь - Тихий океан), БТС-2, Заполярье - Пурпе - Самотлор, Куюмба - Тайшет и другие."
-
-        elif any(word in question_lower for word in ['история', 'основание', 'создана', 'когда создана']):
-            return "ПАО «Транснефть» было основано в 1993 году. Компания имеет богатую историю развития трубопроводной системы России и является мировым лидером в области трубопроводного транспорта нефти."
-
-        elif any(word in question_lower for word in ['трубопровод', 'протяженность', 'километров', 'длина']):
-            return "Протяженность трубопроводов ПАО «Транснефть» составляет более 67 000 км. Компания занимает первое место в мире по протяженности магистральных нефтепроводов."
-
-        return ""
+    def route(self, question: str) -> Optional[AnswerRule]:
+        """Правило, дающее ответ без поиска, или None
+
+        Ответ определяет первая группа (в порядке ANSWER_GROUPS), где сработало
+        правило. Если это правило статическое, его ответ не зависит от
+        контекстов и поиск можно пропустить; иначе нужен поиск.
+        """
+        matched = self._match(question.lower())
+        for group in self.ANSWER_GROUPS:
+            rule = matched.get(group)
+            if rule is not None:
+                return rule if rule.is_static else None
+        return None
+
+    def render(self, rule: AnswerRule) -> str:
+        """Ответ статического правила (пустой, если нужного факта нет в индексе)"""
+        return rule.apply([], self.fact_index)
+
+    def rule_source_ids(self, rule: AnswerRule) -> List[int]:
+        """Chunks-источники правила: заданные в таблице или chunks факта"""
+        if rule.source_chunk_ids:
+            return list(rule.source_chunk_ids)
+        if rule.fact and self.fact_index is not None:
+            return [fact["chunk_id"] for fact in self.fact_index.get(rule.fact)]
+        return []
+
+    def static_rules(self) -> List[AnswerRule]:
+        return [rule for rule in self.rules.rules if rule.group in self.ANSWER_GROUPS and rule.is_static]
 
     def _extract_best_context(self, question_lower: str, contexts: List[str]) -> str:
         if not contexts:
@@ -116,64 +108,6 @@ class RetrievalEngine:
 
         return context
 
-    def _extract_detailed_answer(self, question_lower: str, contexts: List[str]) -> str:
-        if any(word in question_lower for word in ['когда зарегистрирована', 'дата регистрации']):
-            for context in contexts:
-                if "26.08.1993" in context or "26 августа 1993" in context:
-                    return "ПАО «Транснефть» было зарегистрировано 26 августа 1993 года."
-            return "26 августа 1993 года."
-
-        elif any(word in question_lower for word in ['внесено в уставный капитал', '2007 году']):
-            for context in contexts:
-                if "Транснефтепродукт" in context and "2007" in context:
-                    return "В 2007 году в уставный капитал ПАО «Транснефть» внесены 100% обыкновенных акций АО «Транснефтепродукт»."
-            return "100% обыкновенных акций АО «Транснефтепродукт»."
-
-        elif any(word in question_lower for word in ['сколько раз увеличивался', 'увеличивался уставный капитал']):
-            return "Уставный капитал ПАО «Транснефть» увеличивался 2 раза после 2007 года: в 2017 и 2018 годах."
-
-        elif any(word in question_lower for word in ['департамент внутреннего аудита', 'функцию внутреннего аудита']):
-            return "Функцию внутреннего аудита в ПАО «Транснефть» осуществляет Департамент внутреннего аудита и анализа основных направлений."
-
-        elif any(word in question_lower for word in ['проект по обеспечению надежности', 'резервуаров']):
-            return "Проект по обеспечению надежности системы магистральных трубопроводов предусматривает строительство резервуаров на узловых нефтеперекачивающих станциях."
-
-        elif any(word in question_lower for word in
-                 ['цель проекта по сохранению качества', 'качественных показателей нефти']):
-            return "Цель проекта по сохранению качества экспортных потоков нефти — увеличение емкости резервуарных парков для обеспечения сохранения качественных показателей нефти."
-
-        elif any(word in question_lower for word in ['бтс-2', 'балтийской трубопроводной системы']):
-            for context in contexts:
-                if "БТС-2" in context and "диверсификация" in context:
-                    return "Цель Балтийской трубопроводной системы «БТС-2» — диверсификация поставок нефти в Западную Европу за счет перераспределения отгрузок нефти с зарубежных портов в российский порт на Балтийском море."
-            return "Диверсификация поставок нефти в Западную Европу."
-
-        elif any(word in question_lower for word in ['1971–1975', '1971-1975', 'девятой пятилетке']):
-            return "За девятую пятилетку (1971-1975 годы) в СССР было проложено почти 19,2 тыс. км магистральных трубопроводов."
-
-        elif any(word in question_lower for word in ['экологические программы', 'охрана окружающей']):
-            return "ПАО «Транснефть» реализует программы по охране окружающей среды в районах размещения объектов трубопроводного транспорта."
-
-        return ""
-
-    def _improved_extract_exact_answer(self, question_lower: str, contexts: List[str]) -> str:
-        detailed_answer = self._extract_detailed_answer(question_lower, contexts)
-        if detailed_answer:
-            return detailed_answer
-
-        return self._extract_exact_answer(question_lower, contexts)
     def analyze_question_type(self, question: str) -> str:
-        question_lower = question.lower()
-
-        if any(word in question_lower for word in ['сколько', 'число', 'количество']):
-            return "количественный"
-        elif any(word in question_lower for word in ['когда', 'дата', 'год']):
-            return "временной"
-        elif any(word in question_lower for word in ['кто', 'какой', 'какая']):
-            return "фактический"
-        elif any(word in question_lower for word in ['какие', 'перечислите', 'список']):
-            return "перечислительный"
-        elif any(word in question_lower for word in ['почему', 'как', 'зачем']):
-            return "аналитический"
-        else:
-            return "общий"
+        rule = self._match(question.lower()).get("question_type")
+        return rule.answer if rule is not None else self.DEFAULT_QUESTION_TYPE
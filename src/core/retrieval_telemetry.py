@@ -0,0 +1,132 @@
+import time
+import threading
+import numpy as np
+from typing import List, Dict, Optional
+
+
+class RetrievalTelemetry:
+    """Счетчики выдачи chunks поиском: число попаданий, сумма рангов, последнее обращение
+
+    Запись -- несколько векторных операций над массивами под короткой
+    блокировкой. Накопленные приращения периодически сбрасываются фоновым
+    потоком в SQLite (таблица chunk_retrieval_stats), статистика хранится
+    отдельно для каждой версии индекса. Число учтенных запросов хранится
+    в той же таблице в строке с chunk_id = -1.
+    """
+
+    QUERIES_ROW_ID = -1
+
+    def __init__(self, db_manager, index_version: str, num_chunks: int, flush_interval: float = 30.0):
+        self.db_manager = db_manager
+        self.index_version = index_version or "legacy"
+        self.num_chunks = num_chunks
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._reset_pending()
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="telemetry-flush", daemon=True)
+        self._flusher.start()
+
+    def _reset_pending(self):
+        self._hits = np.zeros(self.num_chunks, dtype=np.int64)
+        self._rank_sum = np.zeros(self.num_chunks, dtype=np.int64)
+        self._last_access = np.zeros(self.num_chunks, dtype=np.float64)
+        self._pending_queries = 0
+
+    def record(self, chunk_ids: np.ndarray):
+        """Учитывает выдачу одного запроса (chunk_ids в порядке ранга, без повторов)"""
+        if chunk_ids.size == 0:
+            return
+        now = time.time()
+        ranks = np.arange(1, chunk_ids.size + 1, dtype=np.int64)
+        with self._lock:
+            self._hits[chunk_ids] += 1
+            self._rank_sum[chunk_ids] += ranks
+            self._last_access[chunk_ids] = now
+            self._pending_queries += 1
+
+    def flush(self):
+        """Сбрасывает накопленные приращения в БД"""
+        with self._lock:
+            hits, rank_sum, last_access = self._hits, self._rank_sum, self._last_access
+            pending_queries = self._pending_queries
+            self._reset_pending()
+
+        if pending_queries == 0:
+            return
+
+        touched = np.flatnonzero(hits)
+        rows = [
+            (self.index_version, int(chunk_id), int(hits[chunk_id]), int(rank_sum[chunk_id]), float(last_access[chunk_id]))
+            for chunk_id in touched
+        ]
+        rows.append((self.index_version, self.QUERIES_ROW_ID, pending_queries, 0, float(last_access.max())))
+        if not self.db_manager.save_chunk_stats(rows):
+            # Не потерять статистику при временной ошибке БД
+            with self._lock:
+                self._hits[touched] += hits[touched]
+                self._rank_sum[touched] += rank_sum[touched]
+                np.maximum(self._last_access, last_access, out=self._last_access)
+                self._pending_queries += pending_queries
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f" Ошибка сброса телеметрии поиска: {e}")
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+
+    def get_chunk_stats(self) -> Dict[int, Dict]:
+        """Сохраненная статистика плюс еще не сброшенные приращения"""
+        stats = {
+            row["chunk_id"]: row
+            for row in self.db_manager.get_chunk_stats(self.index_version)
+        }
+        stats.pop(self.QUERIES_ROW_ID, None)
+        with self._lock:
+            touched = np.flatnonzero(self._hits)
+            for chunk_id in touched.tolist():
+                row = stats.setdefault(chunk_id, {"chunk_id": chunk_id, "hit_count": 0, "rank_sum": 0, "last_access": 0.0})
+                row["hit_count"] += int(self._hits[chunk_id])
+                row["rank_sum"] += int(self._rank_sum[chunk_id])
+                row["last_access"] = max(row["last_access"], float(self._last_access[chunk_id]))
+
+        for row in stats.values():
+            row["mean_rank"] = row["rank_sum"] / row["hit_count"] if row["hit_count"] else None
+        return stats
+
+    def observed_queries(self) -> int:
+        """Число запросов, учтенных для текущей версии индекса"""
+        row = next((row for row in self.db_manager.get_chunk_stats(self.index_version)
+                    if row["chunk_id"] == self.QUERIES_ROW_ID), None)
+        return (row["hit_count"] if row else 0) + self._pending_queries
+
+    def hot_chunks(self, limit: int = 32) -> List[int]:
+        """Chunks с наибольшим числом попаданий"""
+        stats = self.get_chunk_stats()
+        ranked = sorted(stats.values(), key=lambda row: row["hit_count"], reverse=True)
+        return [row["chunk_id"] for row in ranked[:limit] if row["hit_count"] > 0]
+
+    def dead_chunks(self) -> List[int]:
+        """Chunks, ни разу не попавшие в выдачу (кандидаты на удаление из индекса)"""
+        stats = self.get_chunk_stats()
+        return [chunk_id for chunk_id in range(self.num_chunks)
+                if stats.get(chunk_id, {}).get("hit_count", 0) == 0]
+
+    def report(self, hot_limit: int = 20) -> Dict:
+        stats = self.get_chunk_stats()
+        dead = self.dead_chunks()
+        return {
+            "index_version": self.index_version,
+            "total_chunks": self.num_chunks,
+            "observed_queries": self.observed_queries(),
+            "hot_chunks": [stats[chunk_id] for chunk_id in self.hot_chunks(hot_limit)],
+            "dead_chunks": dead,
+            "dead_ratio": len(dead) / self.num_chunks if self.num_chunks else 0.0
+        }
@@ -0,0 +1,178 @@
+import json
+import hashlib
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Set, Tuple
+
+
+class AhoCorasick:
+    """Автомат Ахо-Корасик: поиск всех шаблонов за один проход по тексту
+
+    Шаблоны ищутся как подстроки (как в прежних проверках `word in text`).
+    find_all() возвращает множество номеров найденных шаблонов.
+    """
+
+    def __init__(self, patterns: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+
+        for pattern_id, pattern in enumerate(patterns):
+            if not pattern:
+                raise ValueError("Пустой шаблон в автомате Ахо-Корасик")
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (pattern_id,)
+
+        # Ссылки неудачи строятся обходом в ширину; выходы наследуются по ним
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def find_all(self, text: str) -> Set[int]:
+        goto, fail, output = self._goto, self._fail, self._output
+        found: Set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+@dataclass
+class AnswerRule:
+    """Правило ответа из таблицы правил
+
+    triggers -- подстроки вопроса (в нижнем регистре), любая включает правило.
+    context_markers -- варианты наборов маркеров: ответ дается, если в каком-либо
+    контексте есть все маркеры одного из наборов. Без маркеров ответ безусловный.
+    collect -- ключевые слова, найденные в контекстах подставляются в {items}.
+    fact -- атрибут компании в индексе фактов; его значение подставляется в {value}.
+    related_facts -- дополнительные подстановки {имя: атрибут}; значения берутся
+    из того же chunk, что и основной факт (если там есть).
+    fallback -- ответ, если маркеры (или ключевые слова) не найдены.
+    source_chunk_ids -- chunks-источники ответа, заданные вручную (для правил
+    без маркеров; иначе источники подбираются при загрузке индекса).
+    """
+    id: str
+    group: str
+    triggers: List[str]
+    answer: str
+    context_markers: List[List[str]] = field(default_factory=list)
+    collect: List[str] = field(default_factory=list)
+    fallback: Optional[str] = None
+    fact: Optional[str] = None
+    related_facts: Dict[str, str] = field(default_factory=dict)
+    source_chunk_ids: List[int] = field(default_factory=list)
+
+    @property
+    def is_static(self) -> bool:
+        """Ответ не зависит от найденных контекстов"""
+        return not self.context_markers and not self.collect
+
+    def apply(self, contexts: List[str], fact_index=None) -> str:
+        if self.fact:
+            fact = fact_index.first(self.fact) if fact_index is not None else None
+            if fact is None:
+                return self.fallback or ""
+            values = {"value": fact_index.render(fact)}
+            for name, attribute in self.related_facts.items():
+                related = fact_index.first_in_chunk(attribute, fact["chunk_id"])
+                if related is None:
+                    return self.fallback or ""
+                values[name] = fact_index.render(related)
+            return self.answer.format(**values)
+
+        if self.collect:
+            found = []
+            for context in contexts:
+                for keyword in self.collect:
+                    if keyword in context and keyword not in found:
+                        found.append(keyword)
+            if found:
+                return self.answer.format(items=", ".join(found))
+            return self.fallback or ""
+
+        if not self.context_markers:
+            return self.answer
+
+        for context in contexts:
+            if any(all(marker in context for marker in markers) for markers in self.context_markers):
+                return self.answer
+        return self.fallback or ""
+
+
+class RuleSet:
+    """Таблица правил, скомпилированная в один автомат по триггерам всех правил
+
+    Правила разбиты на группы; внутри группы порядок правил в таблице задает
+    приоритет: срабатывает первое правило, чей триггер найден в вопросе
+    (семантика цепочки if/elif), даже если его ответ пуст.
+    """
+
+    def __init__(self, rules: List[AnswerRule], version: str = ""):
+        self.rules = rules
+        self.version = version
+
+        seen_ids = set()
+        patterns: List[str] = []
+        pattern_ids: Dict[str, int] = {}
+        self._pattern_rules: List[List[int]] = []
+        for rule_idx, rule in enumerate(rules):
+            if rule.id in seen_ids:
+                raise ValueError(f"Повторяющийся id правила: {rule.id}")
+            seen_ids.add(rule.id)
+            for trigger in rule.triggers:
+                trigger = trigger.lower()
+                if trigger not in pattern_ids:
+                    pattern_ids[trigger] = len(patterns)
+                    patterns.append(trigger)
+                    self._pattern_rules.append([])
+                self._pattern_rules[pattern_ids[trigger]].append(rule_idx)
+
+        self._matcher = AhoCorasick(patterns)
+
+    @classmethod
+    def load(cls, path: str) -> "RuleSet":
+        """Загружает таблицу правил из JSON; версия -- хэш содержимого файла"""
+        with open(path, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+        rules = [AnswerRule(**rule) for rule in data["rules"]]
+        return cls(rules, version=hashlib.sha256(raw).hexdigest()[:12])
+
+    def match(self, question_lower: str) -> Dict[str, AnswerRule]:
+        """Первое сработавшее правило каждой группы за один проход по вопросу"""
+        matched_rules = set()
+        for pattern_id in self._matcher.find_all(question_lower):
+            matched_rules.update(self._pattern_rules[pattern_id])
+
+        selected: Dict[str, AnswerRule] = {}
+        for rule_idx in sorted(matched_rules):
+            rule = self.rules[rule_idx]
+            selected.setdefault(rule.group, rule)
+        return selected
+
+    def get_stats(self) -> Dict:
+        groups: Dict[str, int] = {}
+        for rule in self.rules:
+            groups[rule.group] = groups.get(rule.group, 0) + 1
+        return {"version": self.version, "total_rules": len(self.rules), "groups": groups}
@@ -0,0 +1,96 @@
+import numpy as np
+import faiss
+from typing import List, Dict, Optional, Sequence
+
+
+class SectionIndex:
+    """Индекс центроидов разделов для двухуровневого поиска
+
+    Разделы -- разделы верхнего уровня документа (metadata["top_sections"],
+    заголовки SECTION_HEADERS); для метаданных старых хранилищ без этого
+    поля -- заголовки metadata["sections"]. Для каждого раздела хранятся
+    его chunks и нормализованный центроид их векторов. Запрос сначала
+    сравнивается с центроидами, затем оцениваются только chunks выбранных
+    разделов.
+    """
+
+    FILE_NAME = "sections.npz"
+
+    def __init__(self, section_names: List[str], centroids: np.ndarray, members: List[np.ndarray],
+                 num_chunks: int):
+        self.section_names = list(section_names)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.members = [np.asarray(ids, dtype=np.int64) for ids in members]
+        self.num_chunks = num_chunks
+        self.index = faiss.IndexFlatIP(self.centroids.shape[1])
+        if len(self.section_names):
+            self.index.add(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, chunk_metadata: Sequence[Dict]) -> "SectionIndex":
+        """Строит центроиды разделов по нормализованным векторам chunks"""
+        field = "top_sections" if any(metadata.get("top_sections") for metadata in chunk_metadata) else "sections"
+        members: Dict[str, List[int]] = {}
+        for idx, metadata in enumerate(chunk_metadata):
+            for section in metadata.get(field, []):
+                members.setdefault(section, []).append(idx)
+
+        section_names = sorted(members)
+        centroids = np.zeros((len(section_names), vectors.shape[1]), dtype=np.float32)
+        for i, section in enumerate(section_names):
+            centroid = vectors[members[section]].mean(axis=0)
+            norm = np.linalg.norm(centroid)
+            centroids[i] = centroid / norm if norm > 0 else centroid
+
+        return cls(section_names, centroids, [members[section] for section in section_names], len(chunk_metadata))
+
+    def save(self, path: str):
+        offsets = np.cumsum([0] + [ids.size for ids in self.members])
+        np.savez(
+            path,
+            section_names=np.array(self.section_names, dtype=str),
+            centroids=self.centroids,
+            member_ids=np.concatenate(self.members) if self.members else np.empty(0, dtype=np.int64),
+            member_offsets=offsets,
+            num_chunks=np.array(self.num_chunks)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SectionIndex"]:
+        """Загружает индекс; None для файлов старого формата (без состава разделов)"""
+        with np.load(path, allow_pickle=False) as data:
+            if "member_offsets" not in data.files:
+                return None
+            offsets = data["member_offsets"]
+            member_ids = data["member_ids"]
+            members = [member_ids[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+            return cls(data["section_names"].tolist(), data["centroids"], members, int(data["num_chunks"]))
+
+    def candidates(self, query_vector: np.ndarray, n_sections: int, min_candidates: int = 0,
+                   allowed: Optional[np.ndarray] = None) -> np.ndarray:
+        """Булева маска chunks ближайших к запросу разделов
+
+        Разделы берутся по убыванию сходства центроида с запросом, пока не
+        набрано n_sections разделов и не менее min_candidates chunks.
+        allowed -- маска chunks, разрешенных фильтром: остальные chunks
+        не отбираются, а разделы без разрешенных chunks пропускаются.
+        """
+        mask = np.zeros(self.num_chunks, dtype=bool)
+        if not self.section_names:
+            return mask
+
+        _, indices = self.index.search(query_vector, len(self.section_names))
+        taken = 0
+        for idx in indices[0]:
+            if idx < 0:
+                continue
+            ids = self.members[idx]
+            if allowed is not None:
+                ids = ids[allowed[ids]]
+            if ids.size == 0:
+                continue
+            mask[ids] = True
+            taken += 1
+            if taken >= n_sections and mask.sum() >= min_candidates:
+                break
+        return mask
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple, Any
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import EMBEDDING_DIMENSION, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD
+from core.response_cache import canonical_filters
+
+
+class SemanticCache:
+    """Кэш ответов на близкие по смыслу вопросы
+
+    Векторы ранее отвеченных вопросов хранятся в заранее выделенной матрице
+    на max_size строк, запись занимает строку (слот). Вопрос с косинусным
+    сходством не ниже threshold и тем же профилем/фильтрами получает
+    сохраненный ответ без поиска по корпусу. При заполнении вытесняется
+    запись, к которой дольше всего не обращались, а ее слот перезаписывается
+    новой: put не перестраивает матрицу. Записи действительны только для
+    версии индекса, при которой были созданы.
+    """
+
+    CANDIDATES = 4
+
+    def __init__(self, index_version: str, dimension: int = EMBEDDING_DIMENSION,
+                 max_size: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.dimension = dimension
+        self.max_size = max_size
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._reset(index_version)
+
+    def _reset(self, index_version: str):
+        self.index_version = index_version
+        self._vectors = np.zeros((self.max_size, self.dimension), dtype=np.float32)
+        # Слот -> (scope, ответ) в порядке обращений; занятые слоты -- всегда 0..len-1
+        self._entries: "OrderedDict[int, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+
+    @staticmethod
+    def scope_key(profile: Optional[str], filters: Optional[Dict]) -> str:
+        """Ответ переиспользуется только при тех же профиле поиска и фильтрах"""
+        return json.dumps([profile or "", canonical_filters(filters)], ensure_ascii=False, sort_keys=True)
+
+    def get(self, query_vector: np.ndarray, scope: str, index_version: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if index_version != self.index_version:
+                self._reset(index_version)
+
+            used = len(self._entries)
+            if used:
+                scores = self._vectors[:used] @ query_vector.reshape(-1)
+                candidates = min(self.CANDIDATES, used)
+                slots = np.argpartition(-scores, candidates - 1)[:candidates]
+                for slot in slots[np.argsort(-scores[slots])]:
+                    if scores[slot] < self.threshold:
+                        break
+                    entry_scope, response = self._entries[int(slot)]
+                    if entry_scope == scope:
+                        self._entries.move_to_end(int(slot))
+                        self.hits += 1
+                        return response
+
+            self.misses += 1
+            return None
+
+    def put(self, query_vector: np.ndarray, scope: str, response: Dict[str, Any]):
+        with self._lock:
+            if len(self._entries) < self.max_size:
+                slot = len(self._entries)
+            else:
+                slot = self._entries.popitem(last=False)[0]
+            self._vectors[slot] = query_vector.reshape(-1)
+            self._entries[slot] = (scope, response)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "index_version": self.index_version,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
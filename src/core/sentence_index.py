@@ -0,0 +1,110 @@
+import re
+import numpy as np
+from typing import List, Tuple, Callable, Sequence
+
+# Конец предложения: знак препинания, пробел и заглавная буква, цифра или кавычка
+SENTENCE_BOUNDARY = re.compile(r'[.!?;]\s+(?=[А-ЯЁA-Z«"\d])')
+# Сокращения, после которых точка не завершает предложение (г. Москва, ул. Стромынка).
+# Список явный: короткое слово в конце предложения ("лет.", "нет.") сокращением не считается
+ABBREVIATIONS = (
+    "г", "гг", "ул", "д", "корп", "стр", "пр", "просп", "пер", "пл", "обл", "р-н", "пос", "с",
+    "тыс", "млн", "млрд", "руб", "коп", "им", "проф", "акад", "ст", "п", "пп", "рис", "табл", "см",
+    "т.е", "т.к", "т.н", "т.ч"
+)
+ABBREVIATION = re.compile(r'(?:^|\s)(?:' + "|".join(re.escape(a) for a in ABBREVIATIONS) + r')\.$')
+MIN_SENTENCE_LENGTH = 20
+
+
+def split_sentences(text: str) -> List[str]:
+    """Разбивает текст chunk на предложения (строки документа разбиваются отдельно)"""
+    sentences = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(line):
+            end = match.start() + 1
+            if ABBREVIATION.search(line[start:end]):
+                continue
+            sentences.append(line[start:end].strip())
+            start = match.end()
+        sentences.append(line[start:].strip())
+
+    # Короткие фрагменты (заголовки, "в том числе:") присоединяем к следующему предложению
+    merged = []
+    carry = ""
+    for sentence in sentences:
+        sentence = f"{carry} {sentence}".strip() if carry else sentence
+        if len(sentence) < MIN_SENTENCE_LENGTH:
+            carry = sentence
+        else:
+            merged.append(sentence)
+            carry = ""
+    if carry:
+        if merged:
+            merged[-1] = f"{merged[-1]} {carry}"
+        else:
+            merged.append(carry)
+    return merged
+
+
+class SentenceIndex:
+    """Предложения chunks и их эмбеддинги для извлекающих ответов
+
+    Предложения всех chunks хранятся подряд; chunk_offsets[i]:chunk_offsets[i + 1]
+    -- предложения chunk i (как в формате CSR). Лучшие предложения среди
+    нескольких chunks выбираются одним умножением матрицы на вектор запроса.
+    """
+
+    FILE_NAME = "sentences.npz"
+
+    def __init__(self, sentences: Sequence[str], chunk_offsets: np.ndarray, embeddings: np.ndarray):
+        self.sentences = list(sentences)
+        self.chunk_offsets = np.asarray(chunk_offsets, dtype=np.int64)
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    @classmethod
+    def build(cls, texts: Sequence[str], encode: Callable[[List[str]], np.ndarray]) -> "SentenceIndex":
+        """Сегментирует тексты chunks и кодирует предложения (encode -> нормализованные векторы)"""
+        sentences: List[str] = []
+        chunk_offsets = [0]
+        for text in texts:
+            sentences.extend(split_sentences(text))
+            chunk_offsets.append(len(sentences))
+
+        embeddings = encode(sentences) if sentences else np.empty((0, 0), dtype=np.float32)
+        return cls(sentences, np.array(chunk_offsets, dtype=np.int64), embeddings)
+
+    def save(self, path: str):
+        np.savez(path, sentences=np.array(self.sentences, dtype=str),
+                 chunk_offsets=self.chunk_offsets, embeddings=self.embeddings)
+
+    @classmethod
+    def load(cls, path: str) -> "SentenceIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["sentences"].tolist(), data["chunk_offsets"], data["embeddings"])
+
+    def best_sentences(self, query_vector: np.ndarray, chunk_ids: Sequence[int],
+                       max_sentences: int) -> List[Tuple[int, int, float]]:
+        """Лучшие предложения в указанных chunks: (chunk_id, номер предложения, score)
+
+        Результат упорядочен по порядку chunks в chunk_ids и порядку предложений в тексте.
+        """
+        rows = []
+        owners = []
+        for rank, chunk_id in enumerate(chunk_ids):
+            start, end = self.chunk_offsets[chunk_id], self.chunk_offsets[chunk_id + 1]
+            rows.append(np.arange(start, end))
+            owners.append(np.full(end - start, rank))
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        owners = np.concatenate(owners)
+        if rows.size == 0:
+            return []
+
+        scores = self.embeddings[rows] @ query_vector.reshape(-1)
+        top = np.argsort(-scores, kind="stable")[:max_sentences]
+        top = top[np.lexsort((rows[top], owners[top]))]
+        return [(int(chunk_ids[owners[i]]), int(rows[i]), float(scores[i])) for i in top]
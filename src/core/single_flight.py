@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import asyncio
+from typing import Any, Dict, Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from core.response_cache import normalize_question, canonical_filters
+from core.cancellation import CancelToken
+
+
+class SingleFlight:
+    """Объединение одинаковых вопросов, обрабатываемых одновременно (single-flight)
+
+    Первый запрос с данным ключом (ведущий) регистрирует future своей задачи
+    в пуле исполнителей, одновременные дубликаты ждут его в цикле событий
+    asyncio и получают тот же результат или исключение: ожидающий запрос не
+    занимает ни поток пула, ни место допуска. Ключ живет только пока идет
+    вычисление, поэтому объединение не зависит от TTL кэшей. Дубликат
+    продлевает срок CancelToken ведущего до своего срока: вычисление не
+    прерывается, пока ответ кто-то ждет. Таблица
+    хранится в процессе API (QAExecutor), поэтому объединение работает и с
+    пулом процессов. Все методы вызываются из цикла событий.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._followers: Dict[str, int] = {}
+        self._cancels: Dict[str, CancelToken] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(question: str, profile: Optional[str], filters: Optional[Dict]) -> str:
+        return json.dumps([normalize_question(question), profile or "", canonical_filters(filters)],
+                          ensure_ascii=False, sort_keys=True)
+
+    def get(self, key: str) -> Optional[asyncio.Future]:
+        """Future вычисления, уже идущего по ключу (None -- вызывающий будет ведущим)"""
+        return self._calls.get(key)
+
+    def lead(self, key: str, future: asyncio.Future, cancel: Optional[CancelToken] = None):
+        """Регистрирует вычисление ведущего и его CancelToken; ключ снимается по завершении"""
+        self._calls[key] = future
+        self._followers[key] = 0
+        if cancel is not None:
+            self._cancels[key] = cancel
+        self.leaders += 1
+
+        def done(_):
+            if self._calls.get(key) is future:
+                del self._calls[key]
+                del self._followers[key]
+                self._cancels.pop(key, None)
+
+        future.add_done_callback(done)
+
+    async def follow(self, key: str, future: asyncio.Future, timeout: float) -> Any:
+        """Ждет результат вычисления ведущего не дольше timeout секунд"""
+        self.coalesced += 1
+        self._followers[key] += 1
+        cancel = self._cancels.get(key)
+        if cancel is not None:
+            cancel.extend(timeout)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        finally:
+            if self._calls.get(key) is future:
+                self._followers[key] -= 1
+
+    def has_followers(self, key: str) -> bool:
+        """Ждут ли результат ведущего другие запросы"""
+        return self._followers.get(key, 0) > 0
+
+    def get_stats(self) -> Dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced
+        }
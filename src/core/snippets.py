@@ -0,0 +1,93 @@
+import os
+import sys
+from typing import Any, Dict, List, Set, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import SNIPPET_MAX_CHARS
+from core.lexical_index import RussianTokenizer, TOKEN_PATTERN
+
+# Короткие слова (предлоги, союзы) не подсвечиваются
+MIN_TERM_LENGTH = 3
+# Сколько символов контекста оставлять перед первым совпадением
+SNIPPET_LEAD = 40
+
+
+class SnippetBuilder:
+    """Короткие фрагменты chunks с подсветкой слов вопроса для компактных ответов
+
+    Слова сравниваются по основам (Snowball, как в BM25-индексе). Фрагмент --
+    окно не длиннее max_chars с наибольшим числом разных слов вопроса;
+    highlights -- пары [начало, конец) совпадений в тексте фрагмента.
+    """
+
+    def __init__(self, max_chars: int = SNIPPET_MAX_CHARS):
+        self.max_chars = max_chars
+        self.tokenizer = RussianTokenizer()
+
+    def query_terms(self, question: str) -> Set[str]:
+        return {
+            term for term in self.tokenizer.tokenize(question)
+            if term[0].isdigit() or len(term) >= MIN_TERM_LENGTH
+        }
+
+    def _matches(self, text: str, terms: Set[str]) -> List[Tuple[int, int, str]]:
+        # lower() и замена ё не меняют длину строки, поэтому позиции совпадают с исходным текстом
+        lowered = text.lower().replace('ё', 'е')
+        matches = []
+        for match in TOKEN_PATTERN.finditer(lowered):
+            token = match.group(0)
+            term = token if token[0].isdigit() else self.tokenizer.tokenize(token)[0]
+            if term in terms:
+                matches.append((match.start(), match.end(), term))
+        return matches
+
+    def build(self, text: str, terms: Set[str]) -> Tuple[str, List[List[int]]]:
+        text = " ".join(text.split())
+        if len(text) <= self.max_chars:
+            start, end = 0, len(text)
+        else:
+            matches = self._matches(text, terms)
+            start = 0
+            best = 0
+            for i, (match_start, _, _) in enumerate(matches):
+                window_end = match_start + self.max_chars - SNIPPET_LEAD
+                found = {term for s, e, term in matches[i:] if e <= window_end}
+                if len(found) > best:
+                    best, start = len(found), max(0, match_start - SNIPPET_LEAD)
+            start = min(start, len(text) - self.max_chars)
+            end = start + self.max_chars
+
+            # Границы фрагмента -- по пробелам, чтобы не резать слова
+            if start > 0:
+                space = text.find(" ", start)
+                start = space + 1 if 0 <= space < start + SNIPPET_LEAD else start
+            if end < len(text):
+                space = text.rfind(" ", start, end)
+                end = space if space > start else end
+
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        body = text[start:end]
+        highlights = [[s + len(prefix), e + len(prefix)] for s, e, _ in self._matches(body, terms)]
+        return prefix + body + suffix, highlights
+
+    def lean_sources(self, source_documents: List[Dict[str, Any]], question: str) -> List[Dict[str, Any]]:
+        """source_documents без полного текста и метаданных: id chunk, score и фрагмент с подсветкой
+
+        chunk_id -- позиция chunk в индексе (GET /api/chunks/{chunk_id}), а не
+        metadata["chunk_id"]: после перенумерации они могут не совпадать.
+        """
+        terms = self.query_terms(question)
+        lean = []
+        for document in source_documents:
+            snippet, highlights = self.build(document["content"], terms)
+            lean.append({
+                "chunk_id": document.get("position"),
+                "score": round(document.get("score", 0.0), 4),
+                "snippet": snippet,
+                "highlights": highlights
+            })
+        return lean
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import TRACE_SAMPLE_RATE, TRACE_EXPORT_PATH
+
+SERVICE_NAME = "transneft-qa"
+SCOPE_NAME = "transneft.qa"
+# Коды статуса и вид span по спецификации OpenTelemetry
+STATUS_UNSET, STATUS_ERROR = 0, 2
+SPAN_KIND_INTERNAL = 1
+
+
+def _random_id(n_bytes: int) -> str:
+    return random.getrandbits(8 * n_bytes).to_bytes(n_bytes, "big").hex()
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "start", "end", "attributes",
+                 "status_code", "status_message")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.end_ns: Optional[int] = None
+        self.end: Optional[float] = None
+        self.attributes = dict(attributes or {})
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+            self.end_ns = self.start_ns + int((self.end - self.start) * 1e9)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_otlp(self, trace_id: str) -> Dict[str, Any]:
+        span = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status_code, "message": self.status_message}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """Трассировка одного запроса: корневой span и дочерние span этапов
+
+    Создается на каждый запрос и передается по цепочке вызовов явно,
+    поэтому одновременные запросы не разделяют состояние. Этапы
+    выполняются последовательно, вложенность -- один уровень под корнем.
+    """
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                 sample_rate: float = TRACE_SAMPLE_RATE):
+        self.trace_id = _random_id(16)
+        self.root = Span(name, None, attributes)
+        self.spans: List[Span] = []
+        self.sampled = random.random() < sample_rate
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        span = Span(name, self.root.span_id, attributes)
+        self.spans.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            if not isinstance(e, GeneratorExit):
+                span.status_code = STATUS_ERROR
+                span.status_message = str(e)
+            raise
+        finally:
+            span.finish()
+
+    def set_attribute(self, key: str, value: Any):
+        self.root.attributes[key] = value
+
+    def set_error(self, error: Exception):
+        self.root.status_code = STATUS_ERROR
+        self.root.status_message = str(error)
+
+    def finish(self):
+        self.root.finish()
+
+    def timings(self) -> Dict[str, float]:
+        """Длительности этапов в мс (повторяющиеся этапы суммируются) и total"""
+        timings: Dict[str, float] = {}
+        for span in self.spans:
+            timings[span.name] = timings.get(span.name, 0.0) + span.duration_ms
+        timings["total"] = self.root.duration_ms
+        return timings
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Трассировка в формате OTLP/JSON (ExportTraceServiceRequest)"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": SCOPE_NAME},
+                    "spans": [span.to_otlp(self.trace_id) for span in [self.root] + self.spans]
+                }]
+            }]
+        }
+
+
+class TraceExporter:
+    """Запись выбранных трассировок в файл: одна строка OTLP/JSON на трассировку"""
+
+    def __init__(self, path: str = TRACE_EXPORT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.exported = 0
+
+    def export(self, trace: Trace):
+        if not trace.sampled:
+            return
+        line = json.dumps(trace.to_otlp(), ensure_ascii=False)
+        try:
+            with self._lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                self.exported += 1
+        except OSError as e:
+            print(f"Ошибка записи трассировки: {e}")
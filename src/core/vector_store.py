@@ -5,18 +5,93 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 import faiss
 import torch
-from typing import List, Dict, Tuple
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple, Optional, Sequence
 
 # Добавляем путь для импортов
 current_dir = os.path.dirname(os.path.abspath(__file__))
 src_root = os.path.dirname(os.path.dirname(current_dir))
 sys.path.insert(0, src_root)
 
-from utils.config import MODEL_NAME, VECTOR_STORE_DIR, EMBEDDING_DIMENSION
+from utils.config import (
+    MODEL_NAME, VECTOR_STORE_DIR, EMBEDDING_DIMENSION, SNAPSHOT_KEEP,
+    FAISS_OMP_THREADS, TORCH_INTRAOP_THREADS, SEARCH_WORKER_THREADS
+)
+from sentence_transformers.util import batch_to_device
+from config import get_model_config
+from core.metadata_filter import MetadataFilterIndex
+from core.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from core.index_snapshot import SnapshotStore, SnapshotError
+from core.section_index import SectionIndex
+from core.fact_index import FactIndex
+from core.sentence_index import SentenceIndex
+from core.metrics import STAGE_LATENCY
+from data_preparation.fact_extractor import FactExtractor
+
+
+def maximal_marginal_relevance(query_vector: np.ndarray, candidate_vectors: np.ndarray,
+                               k: int, lambda_mult: float = 0.5) -> np.ndarray:
+    """Жадный отбор MMR: возвращает позиции кандидатов в порядке выбора.
+
+    Векторы должны быть нормализованы, тогда скалярное произведение равно
+    косинусному сходству. Матрица попарных сходств считается один раз,
+    а на каждом шаге обновляется только вектор максимального сходства
+    с уже выбранными кандидатами.
+    """
+    n_candidates = candidate_vectors.shape[0]
+    k = min(k, n_candidates)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    query_similarity = candidate_vectors @ query_vector.reshape(-1)
+    pairwise_similarity = candidate_vectors @ candidate_vectors.T
+
+    selected = np.empty(k, dtype=np.int64)
+    selected[0] = int(np.argmax(query_similarity))
+    max_redundancy = pairwise_similarity[selected[0]].copy()
+    available = np.ones(n_candidates, dtype=bool)
+    available[selected[0]] = False
+
+    for step in range(1, k):
+        mmr_scores = lambda_mult * query_similarity - (1.0 - lambda_mult) * max_redundancy
+        mmr_scores[~available] = -np.inf
+        best = int(np.argmax(mmr_scores))
+        selected[step] = best
+        available[best] = False
+        np.maximum(max_redundancy, pairwise_similarity[best], out=max_redundancy)
+
+    return selected
 
 
 class VectorStore:
-    """Векторное хранилище для семантического поиска"""
+    """Векторное хранилище для семантического поиска
+
+    Потокобезопасность: после create_embeddings()/load_index() индекс, chunks,
+    метаданные и вспомогательные индексы только читаются, поэтому search_ids()
+    и search() можно вызывать из нескольких потоков одновременно. Поиск FAISS
+    и прямой проход модели выполняются без GIL; под блокировкой выполняется
+    только токенизация (быстрый токенизатор HF не допускает параллельных вызовов).
+    create_embeddings() и load_index() не должны выполняться параллельно с поиском.
+    """
+
+    # Содержимое, определяющее версию снапшота: файл целиком (None) или массивы .npz.
+    # Эмбеддинги и центроиды не входят: это функция текстов и модели
+    SNAPSHOT_CONTENT = {
+        "chunks.json": None,
+        "metadata.json": None,
+        FactIndex.FILE_NAME: None,
+        LexicalIndex.FILE_NAME: ("vocabulary", "offsets", "doc_ids", "weights", "num_docs"),
+        SectionIndex.FILE_NAME: ("section_names", "member_ids", "member_offsets", "num_chunks"),
+        SentenceIndex.FILE_NAME: ("sentences", "chunk_offsets")
+    }
+
+    # Ограничение потоков пула обслуживания и вложенные блоки bulk_threads() (общие для процесса)
+    _default_torch_threads = torch.get_num_threads()
+    _threads_lock = threading.Lock()
+    _worker_limits = False
+    _bulk_depth = 0
 
     def __init__(self, model_name: str = MODEL_NAME):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
@@ -27,6 +102,18 @@ class VectorStore:
             self.index = None
             self.chunks = []
             self.chunk_metadata = []
+            self.chunk_positions = {}
+            self.metadata_filter = None
+            self.lexical_index = None
+            self.section_index = None
+            self.fact_index = None
+            self.sentence_index = None
+            self.index_version = None
+            self.telemetry = None
+            self._tokenizer_lock = threading.Lock()
+            # Лексический поиск выполняется параллельно с кодированием запроса и FAISS
+            self._lexical_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKER_THREADS,
+                                                        thread_name_prefix="lexical")
             self.is_initialized = False
         except Exception as e:
             print(f" Ошибка инициализации модели: {e}")
@@ -39,18 +126,20 @@ class VectorStore:
         if not chunks:
             raise ValueError(" Нет chunks для обработки")
 
-        self.chunks = [chunk['text'] for chunk in chunks]
-        self.chunk_metadata = [chunk['metadata'] for chunk in chunks]
+        self.chunks = tuple(chunk['text'] for chunk in chunks)
+        self.chunk_metadata = tuple(chunk['metadata'] for chunk in chunks)
+        self.chunk_positions = self._positions_by_text(self.chunks)
 
         try:
             # Создаем эмбеддинги с прогресс-баром
-            embeddings = self.model.encode(
-                self.chunks,
-                batch_size=16,
-                show_progress_bar=True,
-                convert_to_tensor=True,
-                normalize_embeddings=True
-            )
+            with self.bulk_threads():
+                embeddings = self.model.encode(
+                    self.chunks,
+                    batch_size=16,
+                    show_progress_bar=True,
+                    convert_to_tensor=True,
+                    normalize_embeddings=True
+                )
 
             # Конвертируем в numpy
             embeddings_np = embeddings.cpu().numpy() if self.device == "cuda" else embeddings.numpy()
@@ -58,6 +147,15 @@ class VectorStore:
             # Создаем FAISS индекс для косинусного сходства
             self.index = faiss.IndexFlatIP(EMBEDDING_DIMENSION)
             self.index.add(embeddings_np)
+            self.metadata_filter = MetadataFilterIndex(self.chunk_metadata)
+            self.lexical_index = LexicalIndex.build(self.chunks)
+            self.section_index = SectionIndex.build(embeddings_np, self.chunk_metadata)
+            # Факты извлекаются chunker; для chunks без них извлекаем здесь
+            extractor = FactExtractor()
+            self.fact_index = FactIndex.build([
+                chunk['facts'] if 'facts' in chunk else extractor.extract(chunk['text']) for chunk in chunks
+            ])
+            self.sentence_index = SentenceIndex.build(self.chunks, self._encode_sentences)
 
             self.is_initialized = True
             print(f" Векторное хранилище создано: {self.index.ntotal} векторов")
@@ -66,130 +164,466 @@ class VectorStore:
             print(f" Ошибка создания эмбеддингов: {e}")
             raise
 
-    def search(self, query: str, k: int = 5, threshold: float = 0.3) -> List[Tuple[str, Dict, float]]:
-        """Поиск наиболее релевантных chunks"""
+    @classmethod
+    def limit_worker_threads(cls):
+        """Один поток OpenMP (FAISS) и torch на запрос: параллельность дает пул запросов,
+        а вложенные пулы потоков только конкурируют за ядра
+
+        Вызывается инициализатором пула обслуживания (QAExecutor) в каждом его
+        потоке или процессе. Число потоков OpenMP задается для вызывающего
+        потока, а torch.set_num_threads действует на весь процесс, поэтому
+        пакетное кодирование вне пула выполняется внутри bulk_threads().
+        """
+        faiss.omp_set_num_threads(FAISS_OMP_THREADS)
+        with cls._threads_lock:
+            cls._worker_limits = True
+            if cls._bulk_depth == 0:
+                torch.set_num_threads(TORCH_INTRAOP_THREADS)
+
+    @classmethod
+    @contextmanager
+    def bulk_threads(cls):
+        """Все потоки torch на время пакетного кодирования (индексация, оценка, reranker)
+
+        Возвращает число потоков torch, заданное при старте процесса, и по
+        выходу из последнего вложенного блока снова применяет ограничение
+        пула обслуживания, если оно было задано.
+        """
+        with cls._threads_lock:
+            cls._bulk_depth += 1
+            if cls._bulk_depth == 1:
+                torch.set_num_threads(cls._default_torch_threads)
+        try:
+            yield
+        finally:
+            with cls._threads_lock:
+                cls._bulk_depth -= 1
+                if cls._bulk_depth == 0 and cls._worker_limits:
+                    torch.set_num_threads(TORCH_INTRAOP_THREADS)
+
+    def _encode_sentences(self, sentences: List[str]) -> np.ndarray:
+        """Пакетное кодирование предложений для SentenceIndex"""
+        with self.bulk_threads():
+            return self.model.encode(
+                sentences,
+                batch_size=32,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            ).astype(np.float32)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """Кодирует запрос в нормализованный вектор формы (1, dim)"""
+        return self.encode_queries([query])
+
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Кодирует запросы в нормализованные векторы формы (n, dim)
+
+        Токенизация выполняется под блокировкой, прямой проход модели --
+        без нее (torch отпускает GIL на время вычислений).
+        """
+        with STAGE_LATENCY.labels("encode").time():
+            with self._tokenizer_lock:
+                features = self.model.tokenize(queries)
+            features = batch_to_device(features, self.device)
+
+            with torch.inference_mode():
+                embeddings = self.model(features)["sentence_embedding"]
+                embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+
+            return np.ascontiguousarray(embeddings.cpu().numpy(), dtype=np.float32)
+
+    def compile_filter(self, filters: Dict) -> Tuple[np.ndarray, Optional[faiss.SearchParameters], int]:
+        """Компилирует выражение фильтра по метаданным (ValueError при ошибке в выражении)"""
+        if self.metadata_filter is None:
+            raise ValueError(" Индекс не инициализирован. Сначала вызовите create_embeddings()")
+        return self.metadata_filter.compile(filters)
+
+    def search(self, query: str, k: int = 5, threshold: float = 0.3,
+               profile: Optional[str] = None, filters: Optional[Dict] = None,
+               query_vector: Optional[np.ndarray] = None, record: bool = True) -> List[Tuple[str, Dict, float]]:
+        """Поиск наиболее релевантных chunks
+
+        Возвращает кортежи (текст, метаданные, score); параметры как у search_ids.
+        """
+        indices, scores = self.search_ids(query, k=k, threshold=threshold, profile=profile, filters=filters,
+                                          query_vector=query_vector, record=record)
+        return self.to_results(indices, scores)
+
+    def to_results(self, indices: np.ndarray, scores: np.ndarray) -> List[Tuple[str, Dict, float]]:
+        """Результаты поиска по позициям в индексе: кортежи (текст, метаданные, score)"""
+        return [
+            (self.chunks[idx], self.chunk_metadata[idx], float(score))
+            for idx, score in zip(np.asarray(indices).tolist(), np.asarray(scores).tolist())
+        ]
+
+    @staticmethod
+    def _positions_by_text(chunks: Sequence[str]) -> Dict[str, int]:
+        positions = {}
+        for idx, text in enumerate(chunks):
+            positions.setdefault(text, idx)
+        return positions
+
+    def positions_of(self, source_documents: List[Dict]) -> np.ndarray:
+        """Позиции в индексе chunks, на которые ссылается готовый ответ (из кэша)
+
+        Источники сопоставляются по тексту chunk: metadata["chunk_id"] не
+        обязан совпадать с позицией. Источники, которых нет в текущем
+        индексе, пропускаются.
+        """
+        positions = [self.chunk_positions.get(doc.get("content")) for doc in source_documents]
+        return np.array([idx for idx in positions if idx is not None], dtype=np.int64)
+
+    def search_ids(self, query: str, k: int = 5, threshold: float = 0.3,
+                   profile: Optional[str] = None, filters: Optional[Dict] = None,
+                   query_vector: Optional[np.ndarray] = None, record: bool = True,
+                   min_k: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Поиск наиболее релевантных chunks: массивы (индексы chunks, score)
+
+        profile -- имя профиля из TransneftConfig.SEARCH_CONFIGS. Если задан,
+        параметры профиля (search_type, k, fetch_k, lambda_mult) заменяют k.
+        min_k -- нижняя граница числа результатов, которую профиль не может
+        понизить (например, бюджет кандидатов переранжирования).
+        filters -- фильтр по метаданным chunks, например
+        {"top_sections": ["Проекты", "История"], "is_structured": True}.
+        Применяется внутри поиска FAISS через IDSelector.
+
+        Профиль с search_type "hybrid" запускает BM25-поиск параллельно
+        с плотным поиском и объединяет результаты через reciprocal-rank fusion.
+        Профиль с search_type "range" возвращает все chunks со сходством
+        не ниже score_threshold (не более max_results) через range_search FAISS.
+        Профиль с search_type "hierarchical" сначала выбирает ближайшие разделы
+        верхнего уровня по центроидам (не меньше n_sections разделов и
+        min_candidates chunks), затем ищет только среди их chunks.
+
+        query_vector -- уже вычисленный вектор запроса (encode_query); если
+        задан, запрос повторно не кодируется. record -- учитывать ли выдачу
+        в телеметрии (False для служебных запросов, например оценки качества).
+        """
         if not self.is_initialized or self.index is None:
             raise ValueError(" Индекс не инициализирован. Сначала вызовите create_embeddings()")
 
         if not query or not query.strip():
-            return []
-
-        try:
-            # Создаем эмбеддинг для запроса
-            query_embedding = self.model.encode(
-                [query],
-                convert_to_tensor=True,
-                normalize_embeddings=True
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # BM25 для гибридного профиля запускаем до кодирования запроса, чтобы они шли параллельно
+        lexical_future = None
+        search_config = self._search_config(profile, k, min_k)
+        if search_config.get("search_type") == "hybrid":
+            mask = self.compile_filter(filters)[0] if filters else None
+            lexical_future = self._lexical_executor.submit(
+                self.lexical_index.search, query, search_config.get("lexical_k", k), mask
             )
 
-            query_embedding_np = query_embedding.cpu().numpy() if self.device == "cuda" else query_embedding.numpy()
-
-            # Выполняем поиск
-            scores, indices = self.index.search(query_embedding_np, k)
+        # Создаем эмбеддинг для запроса
+        query_embedding_np = query_vector if query_vector is not None else self.encode_query(query)
+
+        return self.search_vector(query_embedding_np, query, k=k, threshold=threshold, profile=profile,
+                                  filters=filters, lexical_future=lexical_future, record=record, min_k=min_k)
+
+    def search_vector(self, query_vector: np.ndarray, query: str, k: int = 5, threshold: float = 0.3,
+                      profile: Optional[str] = None, filters: Optional[Dict] = None,
+                      lexical_future=None, record: bool = True, min_k: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Поиск по уже закодированному запросу (см. search_ids)
+
+        query нужен только лексической части гибридного профиля.
+        """
+        with STAGE_LATENCY.labels("search").time():
+            indices, scores = self._search_vector(query_vector, query, k, threshold, profile, filters, lexical_future,
+                                                  min_k)
+        if self.telemetry is not None and record:
+            self.telemetry.record(indices)
+        return indices, scores
+
+    def search_batch(self, queries: List[str], query_vectors: np.ndarray, k: int = 5, threshold: float = 0.3,
+                     profile: Optional[str] = None,
+                     filters: Optional[Dict] = None) -> List[List[Tuple[str, Dict, float]]]:
+        """Поиск для пакета уже закодированных запросов (encode_queries)
+
+        Для обычного top-k поиска все запросы ищутся одним вызовом FAISS;
+        профили mmr, hybrid, range и hierarchical выполняются по одному запросу.
+        Результаты -- в порядке queries, в формате search.
+        """
+        return [
+            self.to_results(indices, scores)
+            for indices, scores in self.search_batch_ids(queries, query_vectors, k, threshold, profile, filters)
+        ]
+
+    def search_batch_ids(self, queries: List[str], query_vectors: np.ndarray, k: int = 5, threshold: float = 0.3,
+                         profile: Optional[str] = None, filters: Optional[Dict] = None,
+                         min_k: int = 0) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Как search_batch, но результаты -- массивы (индексы chunks, score) для каждого запроса"""
+        if not self.is_initialized or self.index is None:
+            raise ValueError(" Индекс не инициализирован. Сначала вызовите create_embeddings()")
 
-            results = []
-            for score, idx in zip(scores[0], indices[0]):
-                # Проверяем границы и порог схожести
-                if idx < len(self.chunks) and score >= threshold:
-                    results.append((
-                        self.chunks[idx],
-                        self.chunk_metadata[idx],
-                        float(score)
-                    ))
+        with STAGE_LATENCY.labels("search").time():
+            hits = self._search_batch_ids(queries, query_vectors, k, threshold, profile, filters, min_k)
+
+        if self.telemetry is not None:
+            for indices, _ in hits:
+                self.telemetry.record(indices)
+        return hits
+
+    def _search_config(self, profile: Optional[str], k: int, min_k: int) -> Dict:
+        """Параметры поиска: профиль или обычный top-k; размеры выдачи и кандидатов не ниже min_k"""
+        search_config = dict(get_model_config(profile)) if profile else {"search_type": "similarity", "k": k}
+        search_config["k"] = max(search_config.get("k", k), min_k)
+        for key in ("max_results", "dense_k", "lexical_k"):
+            if key in search_config:
+                search_config[key] = max(search_config[key], min_k)
+        return search_config
+
+    def _search_batch_ids(self, queries: List[str], query_vectors: np.ndarray, k: int, threshold: float,
+                          profile: Optional[str], filters: Optional[Dict],
+                          min_k: int = 0) -> List[Tuple[np.ndarray, np.ndarray]]:
+        search_config = self._search_config(profile, k, min_k)
+        if search_config.get("search_type") in ("mmr", "hybrid", "hierarchical", "range"):
+            return [
+                self._search_vector(query_vectors[row:row + 1], query, k, threshold, profile, filters, None, min_k)
+                for row, query in enumerate(queries)
+            ]
 
-            return results
+        params, max_candidates = None, self.index.ntotal
+        if filters:
+            _, params, max_candidates = self.compile_filter(filters)
+        if max_candidates == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+        return self._search_similarity_batch(
+            query_vectors, k=min(search_config.get("k", k), max_candidates), threshold=threshold, params=params
+        )
+
+    def _search_vector(self, query_vector: np.ndarray, query: str, k: int, threshold: float,
+                       profile: Optional[str], filters: Optional[Dict],
+                       lexical_future, min_k: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+
+        search_config = self._search_config(profile, k, min_k)
+        search_type = search_config.get("search_type")
+
+        mask, params, max_candidates = None, None, self.index.ntotal
+        if filters:
+            mask, params, max_candidates = self.compile_filter(filters)
+            if max_candidates == 0:
+                return empty
+
+        if search_type == "mmr":
+            return self._search_mmr(
+                query_vector,
+                k=search_config.get("k", k),
+                fetch_k=min(max(search_config.get("fetch_k", 4 * k), search_config.get("k", k)), max_candidates),
+                lambda_mult=search_config.get("lambda_mult", 0.5),
+                threshold=threshold,
+                params=params
+            )
+        elif search_type == "hybrid":
+            if lexical_future is None:
+                lexical_future = self._lexical_executor.submit(
+                    self.lexical_index.search, query, search_config.get("lexical_k", k), mask
+                )
+            return self._search_hybrid(
+                query_vector,
+                lexical_future,
+                k=search_config.get("k", k),
+                dense_k=min(search_config.get("dense_k", k), max_candidates),
+                rrf_k=search_config.get("rrf_k", 60),
+                threshold=threshold,
+                params=params
+            )
+        elif search_type == "hierarchical":
+            return self._search_hierarchical(
+                query_vector,
+                k=search_config.get("k", k),
+                n_sections=search_config.get("n_sections", 2),
+                min_candidates=search_config.get("min_candidates", 0),
+                threshold=threshold,
+                filters=filters
+            )
+        elif search_type == "range":
+            return self._search_range(
+                query_vector,
+                threshold=search_config.get("score_threshold", threshold),
+                max_results=search_config.get("max_results", k),
+                params=params
+            )
+        else:
+            return self._search_similarity(
+                query_vector,
+                k=min(search_config.get("k", k), max_candidates),
+                threshold=threshold,
+                params=params
+            )
 
-        except Exception as e:
-            print(f" Ошибка поиска: {e}")
+    def best_sentences(self, query_vector: np.ndarray, chunk_ids: List[int], max_sentences: int) -> List[str]:
+        """Предложения указанных chunks, ближайшие к запросу, в порядке chunks и текста"""
+        if self.sentence_index is None:
             return []
-
-    def save_index(self, save_path: str = VECTOR_STORE_DIR):
-        """Сохраняет индекс и метаданные"""
+        return [
+            self.sentence_index.sentences[row]
+            for _, row, _ in self.sentence_index.best_sentences(query_vector, chunk_ids, max_sentences)
+        ]
+
+    def _search_similarity(self, query_vector: np.ndarray, k: int, threshold: float,
+                           params: Optional[faiss.SearchParameters] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Обычный top-k поиск с отсечением по порогу схожести"""
+        return self._search_similarity_batch(query_vector, k, threshold, params)[0]
+
+    def _search_similarity_batch(self, query_vectors: np.ndarray, k: int, threshold: float,
+                                 params: Optional[faiss.SearchParameters] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k поиск для матрицы запросов одним вызовом FAISS"""
+        scores, indices = self.index.search(query_vectors, k, params=params)
+
+        # Проверяем границы и порог схожести
+        mask = (indices >= 0) & (indices < len(self.chunks)) & (scores >= threshold)
+        return [(indices[row][mask[row]], scores[row][mask[row]]) for row in range(len(query_vectors))]
+
+    def _search_hierarchical(self, query_vector: np.ndarray, k: int, n_sections: int, min_candidates: int,
+                             threshold: float, filters: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Двухуровневый поиск: центроиды разделов, затем chunks выбранных разделов"""
+        allowed = self.compile_filter(filters)[0] if filters else None
+        mask = self.section_index.candidates(query_vector, n_sections, max(min_candidates, k), allowed)
+        max_candidates = int(mask.sum())
+        if max_candidates == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        params = MetadataFilterIndex.selector_params(mask)
+        return self._search_similarity(query_vector, k=min(k, max_candidates), threshold=threshold, params=params)
+
+    def _search_range(self, query_vector: np.ndarray, threshold: float, max_results: int,
+                      params: Optional[faiss.SearchParameters] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Все chunks со сходством >= threshold через range_search, не более max_results лучших"""
+        # Для метрики скалярного произведения range_search возвращает score > radius
+        radius = np.nextafter(np.float32(threshold), np.float32(-np.inf))
+        lims, scores, indices = self.index.range_search(query_vector, float(radius), params=params)
+        scores, indices = scores[lims[0]:lims[1]], indices[lims[0]:lims[1]]
+
+        if indices.size > max_results:
+            top = np.argpartition(-scores, max_results - 1)[:max_results]
+            scores, indices = scores[top], indices[top]
+
+        order = np.argsort(-scores, kind="stable")
+        return indices[order].astype(np.int64), scores[order]
+
+    def _search_mmr(self, query_vector: np.ndarray, k: int, fetch_k: int, lambda_mult: float,
+                    threshold: float, params: Optional[faiss.SearchParameters] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Поиск с разнообразием (Maximal Marginal Relevance) среди fetch_k кандидатов"""
+        candidate_ids, candidate_scores = self._search_similarity(
+            query_vector, k=fetch_k, threshold=threshold, params=params
+        )
+        if candidate_ids.size == 0:
+            return candidate_ids, candidate_scores
+
+        candidate_vectors = self.index.reconstruct_batch(candidate_ids)
+        order = maximal_marginal_relevance(query_vector[0], candidate_vectors, k, lambda_mult)
+        return candidate_ids[order], candidate_scores[order]
+
+    def _search_hybrid(self, query_vector: np.ndarray, lexical_future, k: int, dense_k: int, rrf_k: int,
+                       threshold: float, params: Optional[faiss.SearchParameters] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Гибридный поиск: плотный top-k и BM25, объединенные reciprocal-rank fusion
+
+        Порог схожести применяется только к плотной выдаче: лексические
+        совпадения по точным токенам (числа, даты, названия) сохраняются.
+        В качестве score возвращается косинусное сходство с запросом.
+        """
+        dense_ids, _ = self._search_similarity(query_vector, k=dense_k, threshold=threshold, params=params)
+        lexical_ids, _ = lexical_future.result()
+
+        fused_ids, _ = reciprocal_rank_fusion([dense_ids, lexical_ids], rrf_k=rrf_k)
+        fused_ids = fused_ids[:k]
+        if fused_ids.size == 0:
+            return fused_ids, np.empty(0, dtype=np.float32)
+
+        fused_vectors = self.index.reconstruct_batch(fused_ids)
+        return fused_ids, fused_vectors @ query_vector[0]
+
+    def save_index(self, save_path: str = VECTOR_STORE_DIR) -> str:
+        """Сохраняет индекс и метаданные как снапшот
+
+        Файлы пишутся во временный каталог и публикуются атомарно (см. SnapshotStore),
+        поэтому сбой посреди сохранения не портит текущий индекс. Версия определяется
+        моделью и содержимым всех файлов, кроме векторов (они -- функция текстов и
+        модели): chunks, метаданными, фактами, BM25, составом разделов и предложениями
+        (SNAPSHOT_CONTENT). Повторное построение того же корпуса тем же кодом не создает
+        новый снапшот и не меняет index_version, а изменение любых производных данных
+        меняет. Хранятся SNAPSHOT_KEEP последних снапшотов. Возвращает версию.
+        """
         if not self.is_initialized:
             raise ValueError(" Хранилище не инициализировано")
         try:
-            # Явно создаем директорию с проверками
             os.makedirs(save_path, exist_ok=True)
 
-            # Проверяем, что директория создана и доступна для записи
-            if not os.path.exists(save_path):
-                raise OSError(f"Не удалось создать директорию: {save_path}")
-
-            # Проверяем права на запись
-            test_file = os.path.join(save_path, "test_write.tmp")
-            try:
-                with open(test_file, 'w') as f:
-                    f.write("test")
-                os.remove(test_file)
-            except Exception as e:
-                raise OSError(f"Нет прав на запись в директорию {save_path}: {e}")
-
-            # Сохраняем FAISS индекс
-            index_path = os.path.join(save_path, "faiss.index")
-            print(f" Сохранение FAISS индекса: {index_path}")
-            faiss.write_index(self.index, index_path)
-
-            # Сохраняем chunks и метаданные
-            chunks_path = os.path.join(save_path, "chunks.json")
-            metadata_path = os.path.join(save_path, "metadata.json")
-            model_info_path = os.path.join(save_path, "model_info.json")
-
-            with open(chunks_path, "w", encoding="utf-8") as f:
-                json.dump(self.chunks, f, ensure_ascii=False, indent=2)
-
-            with open(metadata_path, "w", encoding="utf-8") as f:
-                json.dump(self.chunk_metadata, f, ensure_ascii=False, indent=2)
-
-            # Сохраняем информацию о модели
-            model_info = {
+            snapshot_store = SnapshotStore(save_path)
+            version = snapshot_store.publish(self._write_index_files, {
                 "model_name": MODEL_NAME,
                 "embedding_dimension": EMBEDDING_DIMENSION,
-                "total_vectors": self.index.ntotal,
-                "device": self.device
-            }
-
-            with open(model_info_path, "w", encoding="utf-8") as f:
-                json.dump(model_info, f, ensure_ascii=False, indent=2)
+                "total_vectors": int(self.index.ntotal),
+                "total_chunks": len(self.chunks)
+            }, content_files=self.SNAPSHOT_CONTENT)
+            self.index_version = version
+            snapshot_store.prune(SNAPSHOT_KEEP)
 
-            print(f" Векторное хранилище сохранено: {save_path}")
+            print(f" Векторное хранилище сохранено: {snapshot_store.snapshot_path(version)}")
+            return version
 
         except Exception as e:
             print(f" Ошибка сохранения векторного хранилища: {e}")
+            raise
 
-            # Пробуем альтернативный путь
-            print(" Попытка сохранения в альтернативную директорию...")
-            self._save_to_alternative_location()
+    def _write_index_files(self, target_dir: str):
+        """Пишет все файлы хранилища в каталог снапшота"""
+        faiss.write_index(self.index, os.path.join(target_dir, "faiss.index"))
 
-    def _save_to_alternative_location(self):
-        """Сохраняет в альтернативную директорию при ошибках"""
-        try:
-            # Пробуем сохранить в текущую директорию
-            alt_path = "vector_store_temp"
-            os.makedirs(alt_path, exist_ok=True)
+        with open(os.path.join(target_dir, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self.chunks), f, ensure_ascii=False, indent=2)
 
-            faiss.write_index(self.index, f"{alt_path}/faiss.index")
+        with open(os.path.join(target_dir, "metadata.json"), "w", encoding="utf-8") as f:
+            json.dump(list(self.chunk_metadata), f, ensure_ascii=False, indent=2)
 
-            with open(f"{alt_path}/chunks.json", "w", encoding="utf-8") as f:
-                json.dump(self.chunks, f, ensure_ascii=False, indent=2)
+        # Лексический индекс BM25
+        self.lexical_index.save(os.path.join(target_dir, LexicalIndex.FILE_NAME))
 
-            with open(f"{alt_path}/metadata.json", "w", encoding="utf-8") as f:
-                json.dump(self.chunk_metadata, f, ensure_ascii=False, indent=2)
+        # Центроиды разделов для двухуровневого поиска
+        self.section_index.save(os.path.join(target_dir, SectionIndex.FILE_NAME))
 
-            print(f" Векторное хранилище сохранено в альтернативную директорию: {alt_path}")
-            return alt_path
+        # Индекс фактов для точных ответов
+        self.fact_index.save(os.path.join(target_dir, FactIndex.FILE_NAME))
 
-        except Exception as e:
-            print(f" Критическая ошибка: не удалось сохранить векторное хранилище: {e}")
-            raise
+        # Предложения chunks и их эмбеддинги для извлекающих ответов
+        self.sentence_index.save(os.path.join(target_dir, SentenceIndex.FILE_NAME))
+
+        # Информация о модели
+        model_info = {
+            "model_name": MODEL_NAME,
+            "embedding_dimension": EMBEDDING_DIMENSION,
+            "total_vectors": self.index.ntotal,
+            "device": self.device
+        }
+        with open(os.path.join(target_dir, "model_info.json"), "w", encoding="utf-8") as f:
+            json.dump(model_info, f, ensure_ascii=False, indent=2)
 
-    def load_index(self, load_path: str = VECTOR_STORE_DIR):
-        """Загружает индекс и метаданные"""
+    def load_index(self, load_path: str = VECTOR_STORE_DIR, verify_checksums: bool = False):
+        """Загружает индекс и метаданные из активного снапшота
+
+        Снапшот проверяется по манифесту (формат, модель, размеры файлов) до
+        чтения файлов; контрольные суммы -- только при verify_checksums=True.
+        Каталоги старого формата без снапшотов загружаются как раньше.
+        """
         try:
+            snapshot_store = SnapshotStore(load_path)
+            index_dir, manifest = snapshot_store.resolve()
+
+            if manifest is not None:
+                snapshot_store.validate(manifest["version"], verify_checksums=verify_checksums)
+                if manifest.get("model_name") != MODEL_NAME or manifest.get("embedding_dimension") != EMBEDDING_DIMENSION:
+                    raise SnapshotError(
+                        f"Снапшот {manifest['version']} создан моделью {manifest.get('model_name')} "
+                        f"({manifest.get('embedding_dimension')}), ожидается {MODEL_NAME} ({EMBEDDING_DIMENSION})"
+                    )
+
             # Проверяем существование файлов
             required_files = [
-                os.path.join(load_path, "faiss.index"),
-                os.path.join(load_path, "chunks.json"),
-                os.path.join(load_path, "metadata.json")
+                os.path.join(index_dir, "faiss.index"),
+                os.path.join(index_dir, "chunks.json"),
+                os.path.join(index_dir, "metadata.json")
             ]
 
             for file_path in required_files:
@@ -197,17 +631,52 @@ class VectorStore:
                     raise FileNotFoundError(f"Файл не найден: {file_path}")
 
             # Загружаем FAISS индекс
-            self.index = faiss.read_index(os.path.join(load_path, "faiss.index"))
+            self.index = faiss.read_index(os.path.join(index_dir, "faiss.index"))
 
             # Загружаем chunks и метаданные
-            with open(os.path.join(load_path, "chunks.json"), "r", encoding="utf-8") as f:
-                self.chunks = json.load(f)
-
-            with open(os.path.join(load_path, "metadata.json"), "r", encoding="utf-8") as f:
-                self.chunk_metadata = json.load(f)
-
+            with open(os.path.join(index_dir, "chunks.json"), "r", encoding="utf-8") as f:
+                self.chunks = tuple(json.load(f))
+
+            with open(os.path.join(index_dir, "metadata.json"), "r", encoding="utf-8") as f:
+                self.chunk_metadata = tuple(json.load(f))
+            self.chunk_positions = self._positions_by_text(self.chunks)
+
+            if manifest is not None and (self.index.ntotal != manifest["total_vectors"]
+                                         or len(self.chunks) != manifest["total_chunks"]):
+                raise SnapshotError(f"Размер снапшота {manifest['version']} не совпадает с манифестом")
+
+            self.metadata_filter = MetadataFilterIndex(self.chunk_metadata)
+
+            # Лексический индекс: старые хранилища без lexical.npz индексируются при загрузке
+            lexical_path = os.path.join(index_dir, LexicalIndex.FILE_NAME)
+            if os.path.exists(lexical_path):
+                self.lexical_index = LexicalIndex.load(lexical_path)
+            else:
+                self.lexical_index = LexicalIndex.build(self.chunks)
+
+            section_path = os.path.join(index_dir, SectionIndex.FILE_NAME)
+            self.section_index = SectionIndex.load(section_path) if os.path.exists(section_path) else None
+            if self.section_index is None:
+                self.section_index = SectionIndex.build(self.index.reconstruct_n(0, self.index.ntotal),
+                                                        self.chunk_metadata)
+
+            facts_path = os.path.join(index_dir, FactIndex.FILE_NAME)
+            if os.path.exists(facts_path):
+                self.fact_index = FactIndex.load(facts_path)
+            else:
+                extractor = FactExtractor()
+                self.fact_index = FactIndex.build([extractor.extract(chunk) for chunk in self.chunks])
+
+            sentences_path = os.path.join(index_dir, SentenceIndex.FILE_NAME)
+            if os.path.exists(sentences_path):
+                self.sentence_index = SentenceIndex.load(sentences_path)
+            else:
+                print(" Кодирование предложений chunks (хранилище без sentences.npz)...")
+                self.sentence_index = SentenceIndex.build(self.chunks, self._encode_sentences)
+
+            self.index_version = manifest["version"] if manifest is not None else "legacy"
             self.is_initialized = True
-            print(f" Векторное хранилище загружено: {load_path}")
+            print(f" Векторное хранилище загружено: {index_dir} (версия {self.index_version})")
             print(f" Размер: {len(self.chunks)} chunks, {self.index.ntotal} векторов")
 
         except Exception as e:
@@ -224,7 +693,8 @@ class VectorStore:
             "total_vectors": self.index.ntotal,
             "embedding_dimension": EMBEDDING_DIMENSION,
             "device": self.device,
-            "model": MODEL_NAME
+            "model": MODEL_NAME,
+            "index_version": self.index_version
         }
 
 
@@ -9,6 +9,7 @@ src_root = os.path.dirname(os.path.dirname(current_dir))
 sys.path.insert(0, src_root)
 
 from utils.config import MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, MAX_WORDS_PER_CHUNK, CHUNKS_PATH
+from data_preparation.fact_extractor import FactExtractor
 
 
 class SemanticChunker:
@@ -18,6 +19,7 @@ class SemanticChunker:
         self.max_chunk_size = MAX_CHUNK_SIZE
         self.min_chunk_size = MIN_CHUNK_SIZE
         self.max_words = MAX_WORDS_PER_CHUNK
+        self.fact_extractor = FactExtractor()
 
     def create_chunks(self, elements: List[Dict]) -> List[Dict]:
         """Создает семантические chunks из элементов"""
@@ -87,6 +89,7 @@ class SemanticChunker:
 
         # Собираем метаданные
         sections = list(set([elem['section'] for elem in elements]))
+        top_sections = sorted(set(elem['top_section'] for elem in elements if 'top_section' in elem))
         element_types = list(set([elem['type'] for elem in elements]))
         word_count = len(chunk_text.split())
 
@@ -96,6 +99,7 @@ class SemanticChunker:
         metadata = {
             'chunk_id': chunk_id,
             'sections': sections,
+            'top_sections': top_sections,
             'element_types': element_types,
             'num_elements': len(elements),
             'word_count': word_count,
@@ -106,7 +110,8 @@ class SemanticChunker:
         return {
             'text': chunk_text,
             'metadata': metadata,
-            'elements': [elem['element_id'] for elem in elements]
+            'elements': [elem['element_id'] for elem in elements],
+            'facts': self.fact_extractor.extract(chunk_text)
         }
 
     def _save_chunks(self, chunks: List[Dict]):
@@ -0,0 +1,153 @@
+import os
+import sys
+import re
+import json
+import zlib
+import itertools
+import numpy as np
+from typing import List, Dict, Tuple
+
+# Добавляем путь для импортов
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import (
+    CHUNKS_PATH, DUPLICATES_PATH, DEDUP_NUM_PERM, DEDUP_BANDS,
+    DEDUP_SHINGLE_SIZE, DEDUP_THRESHOLD
+)
+
+# Простое число Мерсенна 2^31 - 1. Хэши шинглов (crc32, до 2^32) сначала приводятся
+# по модулю p: при a, b, x < p значение a * x + b < 2^63 не переполняет uint64
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+
+
+class ChunkDeduplicator:
+    """Удаление почти-дубликатов chunks через MinHash и LSH
+
+    Для каждого chunk считается MinHash-сигнатура по словесным шинглам.
+    Сигнатура режется на полосы (LSH banding): chunks, совпавшие хотя бы
+    в одной полосе, становятся кандидатами и проверяются по оценке
+    сходства Жаккара. Из каждой группы дубликатов остается первый chunk,
+    остальные отображаются на него.
+    """
+
+    def __init__(self, num_perm: int = DEDUP_NUM_PERM, bands: int = DEDUP_BANDS,
+                 shingle_size: int = DEDUP_SHINGLE_SIZE, threshold: float = DEDUP_THRESHOLD, seed: int = 1):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm должно делиться на bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, int(MERSENNE_PRIME), size=(num_perm, 1)).astype(np.uint64)
+        self.b = rng.randint(0, int(MERSENNE_PRIME), size=(num_perm, 1)).astype(np.uint64)
+
+    def _shingle_hashes(self, text: str) -> np.ndarray:
+        words = re.findall(r'\w+', text.lower().replace('ё', 'е'))
+        if len(words) < self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {
+                " ".join(words[i:i + self.shingle_size])
+                for i in range(len(words) - self.shingle_size + 1)
+            }
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64)
+        return hashes % MERSENNE_PRIME
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """MinHash-сигнатуры текстов, матрица (n_texts, num_perm)"""
+        signatures = np.empty((len(texts), self.num_perm), dtype=np.uint64)
+        for i, text in enumerate(texts):
+            hashes = self._shingle_hashes(text)
+            signatures[i] = ((self.a * hashes + self.b) % MERSENNE_PRIME).min(axis=1)
+        return signatures
+
+    def find_duplicates(self, texts: List[str]) -> Dict[int, int]:
+        """Отображение индекс дубликата -> индекс канонического текста"""
+        signatures = self.signatures(texts)
+
+        # LSH: кандидаты -- тексты с совпадающей полосой сигнатуры
+        candidates = set()
+        for band in range(self.bands):
+            buckets: Dict[bytes, List[int]] = {}
+            band_values = signatures[:, band * self.rows:(band + 1) * self.rows]
+            for i in range(len(texts)):
+                buckets.setdefault(band_values[i].tobytes(), []).append(i)
+            for bucket in buckets.values():
+                # Все пары корзины: похожие друг на друга chunks могут не быть похожи на первый
+                candidates.update(itertools.combinations(bucket, 2))
+
+        # Проверка кандидатов и объединение групп (union-find с корнем в минимальном индексе)
+        parent = list(range(len(texts)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j in candidates:
+            similarity = float(np.mean(signatures[i] == signatures[j]))
+            if similarity >= self.threshold:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+
+        return {i: find(i) for i in range(len(texts)) if find(i) != i}
+
+    def deduplicate(self, chunks: List[Dict]) -> Tuple[List[Dict], Dict[int, int]]:
+        """Удаляет почти-дубликаты chunks
+
+        Возвращает (уникальные chunks с перенумерованными chunk_id,
+        отображение исходный chunk_id дубликата -> новый chunk_id канонического chunk).
+        У канонического chunk в metadata["duplicate_chunk_ids"] перечислены
+        исходные chunk_id его дубликатов.
+        """
+        print(" Поиск почти-дубликатов chunks (MinHash/LSH)...")
+        duplicates = self.find_duplicates([chunk['text'] for chunk in chunks])
+
+        new_ids: Dict[int, int] = {}
+        unique_chunks = []
+        for i, chunk in enumerate(chunks):
+            if i in duplicates:
+                continue
+            new_ids[i] = len(unique_chunks)
+            metadata = dict(chunk['metadata'])
+            metadata['chunk_id'] = new_ids[i]
+            unique_chunks.append({**chunk, 'metadata': metadata})
+
+        duplicate_map = {}
+        for duplicate, canonical in duplicates.items():
+            original_id = chunks[duplicate]['metadata'].get('chunk_id', duplicate)
+            canonical_chunk = unique_chunks[new_ids[canonical]]
+            canonical_chunk['metadata'].setdefault('duplicate_chunk_ids', []).append(original_id)
+            duplicate_map[original_id] = new_ids[canonical]
+
+        print(f" Удалено дубликатов: {len(duplicates)}, осталось chunks: {len(unique_chunks)}")
+        return unique_chunks, duplicate_map
+
+    def save(self, chunks: List[Dict], duplicate_map: Dict[int, int]):
+        """Сохраняет уникальные chunks и отображение дубликатов"""
+        try:
+            with open(CHUNKS_PATH, 'w', encoding='utf-8') as f:
+                json.dump(chunks, f, ensure_ascii=False, indent=2)
+            with open(DUPLICATES_PATH, 'w', encoding='utf-8') as f:
+                json.dump({str(k): v for k, v in duplicate_map.items()}, f, ensure_ascii=False, indent=2)
+            print(f" Дедуплицированные chunks сохранены: {CHUNKS_PATH}")
+        except Exception as e:
+            print(f" Ошибка сохранения дедуплицированных chunks: {e}")
+
+
+if __name__ == "__main__":
+    with open(CHUNKS_PATH, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+
+    deduplicator = ChunkDeduplicator()
+    unique_chunks, duplicate_map = deduplicator.deduplicate(chunks)
+    for duplicate, canonical in duplicate_map.items():
+        print(f"   chunk {duplicate} -> {canonical}")
@@ -30,6 +30,9 @@ class DocumentParser:
             doc = docx.Document(doc_path)
             elements = []
             current_section = "Основная информация"
+            # Раздел верхнего уровня -- заголовок из SECTION_HEADERS (подразделы его не меняют)
+            current_top_section = current_section
+            top_headers = {header.lower(): header for header in self.section_headers}
             element_id = 0
 
             for paragraph in doc.paragraphs:
@@ -43,6 +46,7 @@ class DocumentParser:
                 # Обновляем текущий раздел для заголовков
                 if element_type == "section_header":
                     current_section = text
+                    current_top_section = top_headers.get(text.lower(), current_top_section)
 
                 # Создаем элемент
                 element = {
@@ -50,6 +54,7 @@ class DocumentParser:
                     'type': element_type,
                     'text': text,
                     'section': current_section,
+                    'top_section': current_top_section,
                     'style': paragraph.style.name,
                     'word_count': len(text.split())
                 }
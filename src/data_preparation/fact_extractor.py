@@ -0,0 +1,169 @@
+import os
+import sys
+import re
+import json
+from typing import List, Dict, Optional
+
+# Добавляем путь для импортов
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import CHUNKS_PATH
+
+# Сущность по умолчанию: факты документа относятся к самой компании
+COMPANY_ENTITY = "транснефть"
+
+MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3, 'апреля': 4, 'мая': 5, 'июня': 6,
+    'июля': 7, 'августа': 8, 'сентября': 9, 'октября': 10, 'ноября': 11, 'декабря': 12
+}
+
+NUMBER = r'\d{1,3}(?:[ \u00a0]\d{3})+|\d+'
+# Число прописью в скобках после цифр: "724 934 300 (семьсот двадцать ...)"
+SPELLED_OUT = r'(?:\s*\([^)]*\))?'
+
+DATE_NUMERIC = re.compile(r'\b(\d{2})\.(\d{2})\.(\d{4})\b')
+DATE_TEXT = re.compile(r'\b(\d{1,2})\s+(' + '|'.join(MONTHS) + r')\s+(\d{4})\b')
+SHARE_COUNT = re.compile(r'(' + NUMBER + r')' + SPELLED_OUT + r'\s+(?:(обыкновенных|привилегированных)\s+)?акци')
+MONEY = re.compile(
+    r'(' + NUMBER + r')(?:,(\d+))?' + SPELLED_OUT + r'\s*(тыс\.|млн|млрд|трлн)?\s*(?:рубл\w*|руб\.)'
+)
+DECREE = re.compile(
+    r'(Указ\w*\s+Президента\s+РФ|постановлени\w+\s+Правительства\s+РФ|'
+    r'распоряжени\w+\s+Правительства\s+РФ|распоряжени\w+\s+Росимущества|Федеральн\w+\s+закон\w*)'
+    r'\s+от\s+(\d{2}\.\d{2}\.\d{4})\s*№\s*([\w\-]+)',
+    re.IGNORECASE
+)
+ORGANIZATION = re.compile(
+    r'(?:Публичное акционерное общество|Акционерное общество|Общество с ограниченной ответственностью|ПАО|АО|ООО)'
+    r'\s*«([^»]+)»(?:\s*\((?:ПАО|АО|ООО)\s*«[^»]+»\))?'
+)
+
+MULTIPLIERS = {'тыс.': 1e3, 'млн': 1e6, 'млрд': 1e9, 'трлн': 1e12}
+
+# Подсказки в тексте перед значением, определяющие атрибут факта
+DATE_CUES = [("государственной регистрации", "registration_date")]
+MONEY_CUES = [("номинальной стоимост", "nominal_value"), ("на сумму", "amount")]
+ORGANIZATION_CUES = [("аудитор", "auditor"), ("держатель реестра", "registrar")]
+SHARE_CLASSES = {"обыкновенных": "ordinary_share_count", "привилегированных": "preferred_share_count"}
+
+CUE_WINDOW = 120
+
+
+class FactExtractor:
+    """Извлечение типизированных фактов из текста chunks
+
+    Типы фактов: даты, количество акций, денежные суммы, нормативные акты
+    (указы, постановления, распоряжения, законы) и организации. Каждый факт --
+    словарь {type, entity, attribute, value, text}: value нормализовано
+    (даты в ISO, числа как int/float), text -- фрагмент исходного текста.
+    Атрибут определяется по подсказкам в строке перед значением.
+    """
+
+    def extract(self, text: str) -> List[Dict]:
+        facts = []
+        for line in text.split('\n'):
+            facts.extend(self._extract_dates(line))
+            facts.extend(self._extract_share_counts(line))
+            facts.extend(self._extract_money(line))
+            facts.extend(self._extract_decrees(line))
+            facts.extend(self._extract_organizations(line))
+
+        # Один и тот же факт в chunk учитываем один раз
+        unique = {}
+        for fact in facts:
+            unique.setdefault((fact['type'], fact['entity'], fact['attribute'], str(fact['value'])), fact)
+        return list(unique.values())
+
+    @staticmethod
+    def _cue(line: str, position: int, cues: List, default: Optional[str]) -> Optional[str]:
+        """Атрибут по ближайшей к значению подсказке в строке перед ним"""
+        window = line[max(0, position - CUE_WINDOW):position].lower()
+        best_position, best_attribute = -1, default
+        for cue, attribute in cues:
+            cue_position = window.rfind(cue)
+            if cue_position > best_position:
+                best_position, best_attribute = cue_position, attribute
+        return best_attribute
+
+    @staticmethod
+    def _fact(fact_type: str, attribute: str, value, text: str, entity: str = COMPANY_ENTITY) -> Dict:
+        return {"type": fact_type, "entity": entity, "attribute": attribute, "value": value, "text": text}
+
+    @staticmethod
+    def _parse_number(number: str) -> int:
+        return int(re.sub(r'[ \u00a0]', '', number))
+
+    def _extract_dates(self, line: str) -> List[Dict]:
+        facts = []
+        for match in DATE_NUMERIC.finditer(line):
+            day, month, year = match.groups()
+            attribute = self._cue(line, match.start(), DATE_CUES, "date")
+            facts.append(self._fact("date", attribute, f"{year}-{month}-{day}", match.group(0)))
+        for match in DATE_TEXT.finditer(line):
+            day, month, year = match.groups()
+            attribute = self._cue(line, match.start(), DATE_CUES, "date")
+            facts.append(self._fact("date", attribute, f"{year}-{MONTHS[month]:02d}-{int(day):02d}", match.group(0)))
+        return facts
+
+    def _extract_share_counts(self, line: str) -> List[Dict]:
+        facts = []
+        for match in SHARE_COUNT.finditer(line):
+            number, share_class = match.groups()
+            if share_class:
+                attribute = SHARE_CLASSES[share_class]
+            else:
+                # Общее число акций -- только в формулировке "разделен на N акций"
+                attribute = self._cue(line, match.start(), [("разделен на", "share_count")], None)
+            if attribute:
+                facts.append(self._fact("share_count", attribute, self._parse_number(number), number))
+        return facts
+
+    def _extract_money(self, line: str) -> List[Dict]:
+        facts = []
+        for match in MONEY.finditer(line):
+            integer, fraction, scale = match.groups()
+            value = float(f"{self._parse_number(integer)}.{fraction or 0}") * MULTIPLIERS.get(scale, 1)
+            attribute = self._cue(line, match.start(), MONEY_CUES, "amount")
+            facts.append(self._fact("money", attribute, value, match.group(0)))
+        return facts
+
+    def _extract_decrees(self, line: str) -> List[Dict]:
+        facts = []
+        for match in DECREE.finditer(line):
+            kind, date, number = match.groups()
+            kind_lower = kind.lower()
+            if kind_lower.startswith('указ'):
+                entity = "указ президента рф"
+            elif kind_lower.startswith('постановлени'):
+                entity = "постановление правительства рф"
+            elif kind_lower.startswith('распоряжени') and 'росимущества' in kind_lower:
+                entity = "распоряжение росимущества"
+            elif kind_lower.startswith('распоряжени'):
+                entity = "распоряжение правительства рф"
+            else:
+                entity = "федеральный закон"
+            day, month, year = date.split('.')
+            facts.append(self._fact("decree", number.lower(), f"{year}-{month}-{day}", match.group(0), entity=entity))
+        return facts
+
+    def _extract_organizations(self, line: str) -> List[Dict]:
+        facts = []
+        for match in ORGANIZATION.finditer(line):
+            name = match.group(1).strip().lower()
+            facts.append(self._fact("organization", "organization", match.group(0), match.group(0), entity=name))
+            role = self._cue(line, match.start(), ORGANIZATION_CUES, None)
+            if role and name != COMPANY_ENTITY:
+                facts.append(self._fact("organization", role, match.group(0), match.group(0)))
+        return facts
+
+
+if __name__ == "__main__":
+    with open(CHUNKS_PATH, 'r', encoding='utf-8') as f:
+        chunks = json.load(f)
+
+    extractor = FactExtractor()
+    for chunk in chunks:
+        for fact in extractor.extract(chunk['text']):
+            print(f"   [{chunk['metadata']['chunk_id']}] {fact['entity']} / {fact['attribute']}: {fact['value']}")
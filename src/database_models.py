@@ -5,8 +5,24 @@ from typing import List, Dict, Optional, Any
 import logging
 from dataclasses import dataclass
 
+from core.metrics import STAGE_LATENCY
+
 logger = logging.getLogger(__name__)
 
+# Состояния задачи оценки в evaluation_results
+EVALUATION_QUEUED = "queued"
+EVALUATION_RUNNING = "running"
+EVALUATION_COMPLETED = "completed"
+EVALUATION_FAILED = "failed"
+
+EVALUATION_JOB_COLUMNS = {
+    "status": f"TEXT DEFAULT '{EVALUATION_COMPLETED}'",
+    "progress": "INTEGER DEFAULT 0",
+    "total": "INTEGER DEFAULT 0",
+    "results": "TEXT",
+    "error": "TEXT"
+}
+
 
 @dataclass
 class ChatMessage:
@@ -90,6 +106,33 @@ class DatabaseManager:
                     )
                 ''')
 
+                # Поля фоновых задач оценки; в существующих базах добавляются к таблице,
+                # прежние строки считаются завершенными оценками
+                existing = {row[1] for row in cursor.execute("PRAGMA table_info(evaluation_results)")}
+                for column, definition in EVALUATION_JOB_COLUMNS.items():
+                    if column not in existing:
+                        cursor.execute(f"ALTER TABLE evaluation_results ADD COLUMN {column} {definition}")
+
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS chunk_retrieval_stats (
+                        index_version TEXT NOT NULL,
+                        chunk_id INTEGER NOT NULL,
+                        hit_count INTEGER DEFAULT 0,
+                        rank_sum INTEGER DEFAULT 0,
+                        last_access REAL DEFAULT 0,
+                        PRIMARY KEY (index_version, chunk_id)
+                    )
+                ''')
+
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS response_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        namespace TEXT NOT NULL,
+                        response TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                ''')
+
                 conn.commit()
                 logger.info("База данных инициализирована успешно")
 
@@ -99,7 +142,7 @@ class DatabaseManager:
 
     def save_chat_message(self, chat_message: ChatMessage) -> int:
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with STAGE_LATENCY.labels("db_insert").time(), sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
 
                 cursor.execute('''
@@ -126,6 +169,41 @@ class DatabaseManager:
             logger.error(f"Ошибка сохранения сообщения: {e}")
             return -1
 
+    def save_chat_messages(self, chat_messages: List[ChatMessage]) -> List[int]:
+        """Сохраняет несколько сообщений одной транзакцией, возвращает их id (-1 при ошибке)"""
+        if not chat_messages:
+            return []
+        try:
+            with STAGE_LATENCY.labels("db_insert").time(), sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+
+                message_ids = []
+                for chat_message in chat_messages:
+                    cursor.execute('''
+                        INSERT INTO chat_messages 
+                        (session_id, user_id, question, answer, sources, timestamp, response_time, model_used, rating, feedback)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        chat_message.session_id,
+                        chat_message.user_id,
+                        chat_message.question,
+                        chat_message.answer,
+                        chat_message.sources,
+                        chat_message.timestamp,
+                        chat_message.response_time,
+                        chat_message.model_used,
+                        chat_message.rating,
+                        chat_message.feedback
+                    ))
+                    message_ids.append(cursor.lastrowid)
+
+                conn.commit()
+                return message_ids
+
+        except Exception as e:
+            logger.error(f"Ошибка сохранения сообщений: {e}")
+            return [-1] * len(chat_messages)
+
     def save_evaluation_result(self, eval_result: EvaluationResult) -> int:
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -155,6 +233,83 @@ class DatabaseManager:
             logger.error(f"Ошибка сохранения результата оценки: {e}")
             return -1
 
+    def create_evaluation_job(self, sample_size: int) -> int:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO evaluation_results (evaluation_date, sample_size, status, progress, total)
+                    VALUES (?, ?, ?, 0, 0)
+                ''', (datetime.now(), sample_size, EVALUATION_QUEUED))
+                conn.commit()
+                return cursor.lastrowid
+
+        except Exception as e:
+            logger.error(f"Ошибка создания задачи оценки: {e}")
+            return -1
+
+    def update_evaluation_job(self, job_id: int, **fields) -> bool:
+        """Обновляет поля задачи оценки (status, progress, total, results, error, метрики)"""
+        allowed = set(EVALUATION_JOB_COLUMNS) | {
+            "rouge1", "rouge2", "rougeL", "bleu", "bertscore", "meteor", "overall_score", "duration_seconds"
+        }
+        unknown = set(fields) - allowed
+        if unknown:
+            raise ValueError(f"Неизвестные поля задачи оценки: {sorted(unknown)}")
+        if not fields:
+            return True
+
+        columns = list(fields)
+        values = [json.dumps(value, ensure_ascii=False, default=float) if column == "results" else value
+                  for column, value in fields.items()]
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f"UPDATE evaluation_results SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                    values + [job_id]
+                )
+                conn.commit()
+                return cursor.rowcount > 0
+
+        except Exception as e:
+            logger.error(f"Ошибка обновления задачи оценки: {e}")
+            return False
+
+    def get_evaluation_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute("SELECT * FROM evaluation_results WHERE id = ?", (job_id,))
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+
+                job = dict(row)
+                job["results"] = json.loads(job["results"]) if job.get("results") else {}
+                return job
+
+        except Exception as e:
+            logger.error(f"Ошибка получения задачи оценки: {e}")
+            return None
+
+    def fail_unfinished_evaluation_jobs(self, error: str) -> int:
+        """Помечает ошибочными задачи, оставшиеся в очереди или в работе (например, после перезапуска)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE evaluation_results SET status = ?, error = ?
+                    WHERE status IN (?, ?)
+                ''', (EVALUATION_FAILED, error, EVALUATION_QUEUED, EVALUATION_RUNNING))
+                conn.commit()
+                return cursor.rowcount
+
+        except Exception as e:
+            logger.error(f"Ошибка обновления задач оценки: {e}")
+            return 0
+
     def get_chat_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         try:
             with sqlite3.connect(self.db_path) as conn:
@@ -182,9 +337,10 @@ class DatabaseManager:
 
                 cursor.execute('''
                     SELECT * FROM evaluation_results 
+                    WHERE status = ?
                     ORDER BY evaluation_date DESC 
                     LIMIT ?
-                ''', (limit,))
+                ''', (EVALUATION_COMPLETED, limit))
 
                 rows = cursor.fetchall()
                 results = []
@@ -308,6 +464,101 @@ class DatabaseManager:
             logger.error(f"Ошибка добавления отзыва: {e}")
             return False
 
+    def save_chunk_stats(self, rows: List[tuple]) -> bool:
+        """Добавляет приращения статистики выдачи chunks:
+        строки (index_version, chunk_id, hit_count, rank_sum, last_access)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+
+                cursor.executemany('''
+                    INSERT INTO chunk_retrieval_stats (index_version, chunk_id, hit_count, rank_sum, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (index_version, chunk_id) DO UPDATE SET
+                        hit_count = hit_count + excluded.hit_count,
+                        rank_sum = rank_sum + excluded.rank_sum,
+                        last_access = MAX(last_access, excluded.last_access)
+                ''', rows)
+
+                conn.commit()
+                return True
+
+        except Exception as e:
+            logger.error(f"Ошибка сохранения статистики chunks: {e}")
+            return False
+
+    def get_chunk_stats(self, index_version: str) -> List[Dict[str, Any]]:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+
+                cursor.execute('''
+                    SELECT chunk_id, hit_count, rank_sum, last_access
+                    FROM chunk_retrieval_stats
+                    WHERE index_version = ?
+                ''', (index_version,))
+
+                return [dict(row) for row in cursor.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Ошибка получения статистики chunks: {e}")
+            return []
+
+    def load_cached_responses(self, namespace: str, now: float, limit: int) -> List[tuple]:
+        """Непросроченные записи кэша ответов пространства namespace: (ключ, JSON), новые первыми"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+
+                cursor.execute('''
+                    SELECT cache_key, response FROM response_cache
+                    WHERE namespace = ? AND expires_at > ?
+                    ORDER BY expires_at DESC
+                    LIMIT ?
+                ''', (namespace, now, limit))
+
+                return cursor.fetchall()
+
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша ответов: {e}")
+            return []
+
+    def save_cached_response(self, cache_key: str, namespace: str, response: str, expires_at: float) -> bool:
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+
+                cursor.execute('''
+                    INSERT OR REPLACE INTO response_cache (cache_key, namespace, response, expires_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (cache_key, namespace, response, expires_at))
+
+                conn.commit()
+                return True
+
+        except Exception as e:
+            logger.error(f"Ошибка записи в кэш ответов: {e}")
+            return False
+
+    def purge_response_cache(self, namespace: str, now: float) -> int:
+        """Удаляет просроченные записи и записи других версий индекса и правил"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+
+                cursor.execute('''
+                    DELETE FROM response_cache
+                    WHERE namespace != ? OR expires_at <= ?
+                ''', (namespace, now))
+
+                conn.commit()
+                return cursor.rowcount
+
+        except Exception as e:
+            logger.error(f"Ошибка очистки кэша ответов: {e}")
+            return 0
+
     def export_chat_history(self, session_id: str = None, format_type: str = "json") -> str:
         try:
             if session_id:
@@ -1,18 +1,26 @@
 from fastapi import FastAPI, HTTPException, Depends, APIRouter, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from starlette.background import BackgroundTask
 import sys
 import os
 import logging
 import traceback
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from datetime import datetime
 import json
 import asyncio
+import time
+import hashlib
 import io
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 if sys.platform == "win32":
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
@@ -22,21 +30,54 @@ logger = logging.getLogger(__name__)
 
 from scripts.evaluate_metrics import MetricsEvaluator
 from core.qa_system import TransneftQASystem
+from core.qa_executor import QAExecutor
+from core.cancellation import RequestCancelled
 from scripts.setup_system import setup_complete_system
 from scripts.evaluate_benchmark import BenchmarkEvaluator
 from config import TransneftConfig, EvaluationCriteria
 from database_models import DatabaseManager, ChatMessage, EvaluationResult, db_manager
+from core.admission_control import (
+    AdmissionController, AdmissionRejected, AdmissionLease, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+)
+from core.metrics import (
+    CONTENT_TYPE, REQUEST_LATENCY, REQUESTS, ERRORS, REJECTED, render, counter_total, function_gauge,
+    process_rss_bytes
+)
+from core.snippets import SnippetBuilder
+from core.evaluation_jobs import EvaluationJobManager, EvaluationQueueFull
+from utils.config import CHAT_BATCH_MAX_SIZE, METRICS_ENABLED
 
 qa_system = None
+qa_executor = None
 system_modules_loaded = False
+admission = AdmissionController()
+snippet_builder = SnippetBuilder()
+evaluation_jobs = EvaluationJobManager(db_manager, MetricsEvaluator)
+
+function_gauge(
+    "transneft_index_vectors",
+    "Number of vectors in the loaded FAISS index",
+    lambda: qa_system.vector_store.index.ntotal if qa_system is not None and qa_system.initialized else None
+)
+function_gauge(
+    "transneft_admission_queue_depth",
+    "Requests waiting for a QA slot",
+    lambda: admission.get_stats()["queue_depth"]
+)
+function_gauge(
+    "transneft_admission_active",
+    "Requests holding a QA slot",
+    lambda: admission.get_stats()["active"]
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global qa_system, system_modules_loaded
+    global qa_system, qa_executor, system_modules_loaded
 
     try:
         qa_system = TransneftQASystem()
+        qa_executor = QAExecutor(qa_system)
         setup_complete_system()
         system_modules_loaded = True
         logger.info("System loaded successfully")
@@ -48,16 +89,29 @@ async def lifespan(app: FastAPI):
         system_modules_loaded = False
 
     yield
+    evaluation_jobs.shutdown()
+    if qa_executor:
+        qa_executor.shutdown()
     if qa_system:
-        pass
+        qa_system.close()
     logger.info("Shutting down...")
 
 
+class FastJSONResponse(JSONResponse):
+    """JSON-ответ через orjson, если он установлен; иначе -- компактный json без экранирования кириллицы"""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
 app = FastAPI(
     title="Transneft RAG System API",
     description="API для вопросно-ответной системы Transneft",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 app.add_middleware(
@@ -81,6 +135,51 @@ async def add_cors_headers(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    if not METRICS_ENABLED:
+        return await call_next(request)
+
+    start_time = time.perf_counter()
+
+    def observe(status: int):
+        # Метка -- шаблон маршрута, а не путь: число рядов метрик не растет с session_id и id
+        route = request.scope.get("route")
+        handler = getattr(route, "path", "unmatched")
+        REQUEST_LATENCY.labels(handler, request.method).observe(time.perf_counter() - start_time)
+        REQUESTS.labels(handler, str(status)).inc()
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        observe(500)
+        raise
+
+    body_iterator = getattr(response, "body_iterator", None)
+    if body_iterator is None:
+        observe(response.status_code)
+        return response
+
+    # Задержка -- до последнего фрагмента тела: для SSE (/api/chat/stream) это время
+    # всего ответа, а не до отправки заголовков
+    async def observed_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            observe(response.status_code)
+
+    response.body_iterator = observed_body()
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=render(), media_type=CONTENT_TYPE)
+
+
 @app.options("/api/{rest:path}")
 async def options_handler():
     return JSONResponse(
@@ -96,6 +195,11 @@ async def options_handler():
 class ChatRequest(BaseModel):
     question: str
     session_id: str = "default"
+    search_profile: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+    include_timings: bool = False
+    # "lean" -- источники без полного текста: chunk_id, score, фрагмент с подсветкой (текст -- GET /api/chunks/{id})
+    response_mode: Literal["full", "lean"] = "full"
 
 
 class ChatResponse(BaseModel):
@@ -104,6 +208,32 @@ class ChatResponse(BaseModel):
     confidence: float = 0.0
     status: str = "success"
     message_id: Optional[int] = None
+    cache_hit: bool = False
+    timings: Optional[Dict[str, float]] = None
+
+
+class ChatBatchItem(BaseModel):
+    question: str
+    session_id: Optional[str] = None
+
+
+class ChatBatchRequest(BaseModel):
+    questions: List[ChatBatchItem]
+    session_id: str = "default"
+    search_profile: Optional[str] = None
+    filters: Optional[Dict[str, Any]] = None
+    response_mode: Literal["full", "lean"] = "full"
+
+
+class ChatBatchResult(ChatResponse):
+    error: Optional[str] = None
+
+
+class ChatBatchResponse(BaseModel):
+    results: List[ChatBatchResult]
+    succeeded: int
+    failed: int
+    processing_time: float = 0.0
 
 
 class HealthResponse(BaseModel):
@@ -113,7 +243,7 @@ class HealthResponse(BaseModel):
 
 
 class EvaluateRequest(BaseModel):
-    sample_size: int = 10
+    sample_size: int = Field(10, ge=1)
 
 
 class EvaluateResponse(BaseModel):
@@ -124,6 +254,19 @@ class EvaluateResponse(BaseModel):
     evaluation_id: Optional[int] = None
 
 
+class EvaluationJobResponse(BaseModel):
+    evaluation_id: int
+    status: str
+    sample_size: int = 0
+    progress: int = 0
+    total: int = 0
+    results: Dict[str, Any] = {}
+    accuracy: float = 0.0
+    duration_seconds: Optional[float] = None
+    created_at: str = ""
+    error: Optional[str] = None
+
+
 class HistoryResponse(BaseModel):
     session_id: str
     history: List[Dict[str, Any]] = []
@@ -161,13 +304,16 @@ def get_qa_system():
 
 
 def initialize_on_demand():
-    global qa_system, system_modules_loaded
+    global qa_system, qa_executor, system_modules_loaded
 
     if system_modules_loaded and qa_system and hasattr(qa_system, 'initialized'):
         return True
 
     try:
         qa_system = TransneftQASystem()
+        if qa_executor:
+            qa_executor.shutdown()
+        qa_executor = QAExecutor(qa_system)
         setup_complete_system()
         system_modules_loaded = True
         return True
@@ -228,29 +374,91 @@ async def initialize_system():
         raise HTTPException(status_code=500, detail="System initialization failed")
 
 
+async def admit(priority: int = PRIORITY_INTERACTIVE) -> AdmissionLease:
+    """Место в QA-конвейере; при перегрузке -- 429/503 с Retry-After"""
+    try:
+        return await admission.acquire(priority)
+    except AdmissionRejected as e:
+        REJECTED.labels("queue_full" if e.status_code == 429 else "queue_timeout").inc()
+        logger.warning(f"Request rejected by admission control: {e.reason}")
+        raise HTTPException(status_code=e.status_code, detail=e.reason,
+                            headers={"Retry-After": str(e.retry_after)})
+
+
+async def run_in_background(method: str, **kwargs) -> Any:
+    """Вызов QAExecutor для фоновой задачи (оценка): фоновый приоритет допуска
+
+    Фоновая задача не получает 429/503, а ждет: при отказе допуска запрос
+    повторяется через Retry-After.
+    """
+    while True:
+        try:
+            lease = await admission.acquire(PRIORITY_BACKGROUND)
+            break
+        except AdmissionRejected as e:
+            await asyncio.sleep(e.retry_after)
+    return await getattr(qa_executor, method)(lease=lease, **kwargs)
+
+
+def shape_sources(source_documents: List[Dict[str, Any]], question: str, response_mode: str) -> List[Dict[str, Any]]:
+    if response_mode == "lean":
+        return snippet_builder.lean_sources(source_documents, question)
+    return source_documents
+
+
+def validate_search_options(search_profile: Optional[str], filters: Optional[Dict[str, Any]], qa_system):
+    if search_profile and search_profile not in TransneftConfig.SEARCH_CONFIGS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown search profile: {search_profile}. "
+                   f"Available: {', '.join(TransneftConfig.SEARCH_CONFIGS)}"
+        )
+
+    if filters:
+        try:
+            qa_system.vector_store.compile_filter(filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
 @api_router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest, qa_system=Depends(get_qa_system)):
+    validate_search_options(request.search_profile, request.filters, qa_system)
+    lease = await admit(PRIORITY_INTERACTIVE)
+
     try:
         analytics_data["total_questions"] += 1
         analytics_data["total_requests"] += 1
 
-        result = qa_system.answer_question(
+        result = await qa_executor.answer_question(
+            lease=lease,
             question=request.question,
             session_id=request.session_id,
-            user_id="user"
+            user_id="user",
+            search_profile=request.search_profile,
+            filters=request.filters,
+            include_timings=request.include_timings
         )
 
         response_data = {
             "result": result.get("result", ""),
-            "source_documents": result.get("source_documents", []),
+            "source_documents": shape_sources(result.get("source_documents", []), request.question,
+                                              request.response_mode),
             "confidence": result.get("confidence", 0.0),
-            "message_id": result.get("message_id", -1)
+            "message_id": result.get("message_id", -1),
+            "cache_hit": result.get("cache_hit", False),
+            "timings": result.get("timings")
         }
 
         return ChatResponse(**response_data)
 
+    except (asyncio.TimeoutError, RequestCancelled):
+        logger.error(f"Chat request timed out after {qa_executor.timeout}s")
+        ERRORS.labels("timeout").inc()
+        raise HTTPException(status_code=504, detail="Request processing timed out")
     except Exception as e:
         logger.error(f"Error processing chat request: {e}")
+        ERRORS.labels(type(e).__name__).inc()
         logger.error(traceback.format_exc())
         analytics_data["total_requests"] += 1
 
@@ -262,6 +470,151 @@ async def chat(request: ChatRequest, qa_system=Depends(get_qa_system)):
         )
 
 
+@api_router.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(request: ChatBatchRequest, qa_system=Depends(get_qa_system)):
+    """Пакет вопросов: одно кодирование и один поиск; результаты в порядке вопросов"""
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+    if len(request.questions) > CHAT_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many questions: {len(request.questions)} (max {CHAT_BATCH_MAX_SIZE})"
+        )
+    validate_search_options(request.search_profile, request.filters, qa_system)
+
+    lease = await admit(PRIORITY_BACKGROUND)
+
+    analytics_data["total_questions"] += len(request.questions)
+    analytics_data["total_requests"] += 1
+
+    try:
+        results = await qa_executor.answer_batch(
+            lease=lease,
+            items=[
+                {"question": item.question, "session_id": item.session_id or request.session_id}
+                for item in request.questions
+            ],
+            user_id="user",
+            search_profile=request.search_profile,
+            filters=request.filters
+        )
+    except (asyncio.TimeoutError, RequestCancelled):
+        logger.error(f"Chat batch timed out after {qa_executor.timeout}s")
+        ERRORS.labels("timeout").inc()
+        raise HTTPException(status_code=504, detail="Request processing timed out")
+    except Exception as e:
+        logger.error(f"Error processing chat batch: {e}")
+        ERRORS.labels(type(e).__name__).inc()
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+    batch_results = [
+        ChatBatchResult(
+            result=result.get("result", ""),
+            source_documents=shape_sources(result.get("source_documents", []), item.question,
+                                           request.response_mode),
+            confidence=result.get("confidence", 0.0),
+            status=result.get("status", "success"),
+            message_id=result.get("message_id", -1),
+            cache_hit=result.get("cache_hit", False),
+            error=result.get("error")
+        )
+        for item, result in zip(request.questions, results)
+    ]
+    failed = sum(1 for result in batch_results if result.status == "error")
+
+    return ChatBatchResponse(
+        results=batch_results,
+        succeeded=len(batch_results) - failed,
+        failed=failed,
+        processing_time=results[0].get("processing_time", 0.0) if results else 0.0
+    )
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@api_router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, qa_system=Depends(get_qa_system)):
+    """Server-Sent Events: sources сразу после поиска, затем answer, затем saved (message_id)"""
+    validate_search_options(request.search_profile, request.filters, qa_system)
+    lease = await admit(PRIORITY_INTERACTIVE)
+
+    analytics_data["total_questions"] += 1
+    analytics_data["total_requests"] += 1
+
+    stream_started = False
+
+    async def event_stream():
+        nonlocal stream_started
+        stream_started = True
+        try:
+            async for event, data in qa_executor.stream_answer(
+                lease=lease,
+                question=request.question,
+                session_id=request.session_id,
+                user_id="user",
+                search_profile=request.search_profile,
+                filters=request.filters,
+                include_timings=request.include_timings
+            ):
+                if event == "sources":
+                    data = {"source_documents": shape_sources(data["source_documents"], request.question,
+                                                              request.response_mode)}
+                yield sse_event(event, data)
+        except (asyncio.TimeoutError, RequestCancelled):
+            logger.error(f"Chat stream timed out after {qa_executor.timeout}s")
+            ERRORS.labels("timeout").inc()
+            yield sse_event("error", {"error": "Request processing timed out"})
+        except Exception as e:
+            logger.error(f"Error processing chat stream: {e}")
+            ERRORS.labels(type(e).__name__).inc()
+            logger.error(traceback.format_exc())
+            yield sse_event("error", {
+                "result": f"Извините, произошла ошибка при обработке запроса: {str(e)}",
+                "error": str(e)
+            })
+
+    def release_unstarted():
+        # Место освобождает исполнитель по завершении ответа; здесь -- только если поток так и не начался
+        if not stream_started:
+            lease.release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release_unstarted)
+    )
+
+
+@api_router.get("/chunks/{chunk_id}")
+async def get_chunk(chunk_id: int, request: Request, qa_system=Depends(get_qa_system)):
+    """Полный текст и метаданные chunk; ETag зависит от версии индекса и содержимого"""
+    vector_store = qa_system.vector_store
+    if not 0 <= chunk_id < len(vector_store.chunks):
+        raise HTTPException(status_code=404, detail=f"Chunk {chunk_id} not found")
+
+    content = vector_store.chunks[chunk_id]
+    metadata = vector_store.chunk_metadata[chunk_id]
+    fingerprint = json.dumps([vector_store.index_version, content, metadata], ensure_ascii=False, sort_keys=True)
+    etag = '"' + hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:32] + '"'
+    # Содержимое по этому URL меняется при переиндексации: клиент всегда перепроверяет ETag (ответ 304)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in client_etags or "*" in client_etags:
+        return Response(status_code=304, headers=headers)
+
+    return FastJSONResponse(
+        {"chunk_id": chunk_id, "content": content, "metadata": metadata,
+         "index_version": vector_store.index_version},
+        headers=headers
+    )
+
+
 @api_router.get("/history/{session_id}", response_model=HistoryResponse)
 async def get_chat_history(session_id: str):
     try:
@@ -294,65 +647,69 @@ async def get_chat_history(session_id: str):
         return HistoryResponse(session_id=session_id, history=[])
 
 
-@api_router.post("/evaluate", response_model=EvaluateResponse)
+@api_router.post("/evaluate", response_model=EvaluateResponse, status_code=202)
 async def evaluate_system(request: EvaluateRequest, qa_system=Depends(get_qa_system)):
+    """Ставит оценку в очередь; прогресс и результаты -- GET /api/evaluate/{evaluation_id}"""
     try:
-        evaluator = MetricsEvaluator()
-        evaluation_results = evaluator.evaluate_all_metrics()
+        job_id = evaluation_jobs.submit(qa_system, request.sample_size, run=run_in_background)
+    except EvaluationQueueFull as e:
+        REJECTED.labels("evaluation_queue_full").inc()
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.error(f"Evaluation error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start evaluation: {str(e)}")
+
+    return EvaluateResponse(
+        status="queued",
+        message=f"Evaluation queued on {request.sample_size} questions",
+        evaluation_id=job_id
+    )
 
-        if evaluation_results:
-            generation_metrics = evaluation_results.get('generation', {})
 
-            # Получаем overall_score (уже в правильном формате 0.9 для 90%)
-            overall_score = generation_metrics.get('overall_score', 0.0)
+@api_router.get("/evaluate/{evaluation_id}", response_model=EvaluationJobResponse)
+async def get_evaluation(evaluation_id: int):
+    job = evaluation_jobs.get(evaluation_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Evaluation not found")
+
+    results = job["results"]
+    return EvaluationJobResponse(
+        evaluation_id=job["id"],
+        status=job["status"],
+        sample_size=job["sample_size"] or 0,
+        progress=job["progress"] or 0,
+        total=job["total"] or 0,
+        results=results.get("generation", {}),
+        # Для фронтенда -- в процентах
+        accuracy=results.get("accuracy", 0.0) * 100,
+        duration_seconds=job["duration_seconds"],
+        created_at=str(job["evaluation_date"]),
+        error=job["error"]
+    )
 
-            # Конвертируем в проценты для фронтенда (умножаем на 100 только один раз!)
-            overall_score_percent = overall_score * 100
 
-            return EvaluateResponse(
-                status="success",
-                results=generation_metrics,
-                accuracy=overall_score_percent,  # Теперь правильно: 90.0 для 90%
-                message=f"Evaluation completed - {overall_score_percent:.1f}% accuracy",
-                evaluation_id=1
-            )
-        else:
-            return EvaluateResponse(
-                status="error",
-                results={},
-                accuracy=0.0,
-                message="Evaluation failed",
-                evaluation_id=None
-            )
+def collect_analytics() -> AnalyticsResponse:
+    db_stats = db_manager.get_chat_statistics()
 
-    except Exception as e:
-        logger.error(f"Evaluation error: {e}")
-        return EvaluateResponse(
-            status="error",
-            results={},
-            accuracy=0.0,
-            message=f"Evaluation failed: {str(e)}",
-            evaluation_id=None
-        )
+    analyzer = BenchmarkEvaluator()
+    benchmark_stats = analyzer.results if hasattr(analyzer, 'results') else {}
+
+    sessions = db_manager.get_user_sessions("user", limit=100)  # Можно адаптировать под реальные сессии
+
+    return AnalyticsResponse(
+        total_questions=db_stats.get('total_messages', analytics_data["total_questions"]),
+        average_confidence=BenchmarkEvaluator.evaluate_system()['accuracy'],
+        system_uptime=analytics_data.get("start_time", "Unknown"),
+        active_sessions=len(sessions),
+        benchmark_stats=benchmark_stats
+    )
 
 
 @api_router.get("/analytics", response_model=AnalyticsResponse)
 async def get_analytics(qa_system=Depends(get_qa_system)):
+    lease = await admit(PRIORITY_BACKGROUND)
     try:
-        db_stats = db_manager.get_chat_statistics()
-
-        analyzer = BenchmarkEvaluator()
-        benchmark_stats = analyzer.results if hasattr(analyzer, 'results') else {}
-
-        sessions = db_manager.get_user_sessions("user", limit=100)  # Можно адаптировать под реальные сессии
-
-        return AnalyticsResponse(
-            total_questions=db_stats.get('total_messages', analytics_data["total_questions"]),
-            average_confidence=BenchmarkEvaluator.evaluate_system()['accuracy'],
-            system_uptime=analytics_data.get("start_time", "Unknown"),
-            active_sessions=len(sessions),
-            benchmark_stats=benchmark_stats
-        )
+        return await asyncio.to_thread(collect_analytics)
     except Exception as e:
         logger.error(f"Error getting analytics: {e}")
         logger.error(traceback.format_exc())
@@ -362,6 +719,8 @@ async def get_analytics(qa_system=Depends(get_qa_system)):
             active_sessions=0,
             benchmark_stats={}
         )
+    finally:
+        lease.release()
 
 
 @api_router.get("/admin/stats", response_model=AdminStatsResponse)
@@ -369,12 +728,13 @@ async def get_admin_stats(qa_system=Depends(get_qa_system)):
     try:
         db_stats = db_manager.get_chat_statistics()
         sessions = db_manager.get_user_sessions("user", limit=1000)
+        rss = process_rss_bytes()
 
         return AdminStatsResponse(
             system_status="active" if system_modules_loaded else "degraded",
             total_requests=analytics_data["total_requests"],
-            error_rate=0.0,
-            memory_usage="N/A",
+            error_rate=min(counter_total(ERRORS) / max(analytics_data["total_questions"], 1), 1.0),
+            memory_usage=f"{rss / 2 ** 20:.1f} MB" if rss is not None else "N/A",
             active_connections=len(sessions),
             database_stats=db_stats
         )
@@ -383,6 +743,27 @@ async def get_admin_stats(qa_system=Depends(get_qa_system)):
         raise HTTPException(status_code=500, detail=f"Failed to get admin stats: {str(e)}")
 
 
+@api_router.get("/admin/admission")
+async def get_admission_stats():
+    stats = admission.get_stats()
+    single_flight = qa_executor.single_flight if qa_executor else None
+    stats["single_flight"] = single_flight.get_stats() if single_flight else None
+    return stats
+
+
+@api_router.get("/admin/chunks/report")
+async def get_chunks_report(hot_limit: int = 20, qa_system=Depends(get_qa_system)):
+    """Горячие и ни разу не выданные chunks текущей версии индекса"""
+    if qa_system.telemetry is None:
+        raise HTTPException(status_code=404, detail="Retrieval telemetry is disabled")
+
+    try:
+        return qa_system.telemetry.report(hot_limit=hot_limit)
+    except Exception as e:
+        logger.error(f"Error getting chunks report: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get chunks report: {str(e)}")
+
+
 @api_router.post("/feedback")
 async def submit_feedback(request: FeedbackRequest):
     try:
@@ -456,6 +837,7 @@ async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None),
     )
 
 
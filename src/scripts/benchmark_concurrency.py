@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+
+# Добавляем путь для импортов
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from core.qa_system import TransneftQASystem
+from core.vector_store import VectorStore
+from utils.config import BENCHMARK_PATH
+
+
+class ConcurrencyBenchmark:
+    """Замер масштабирования answer_question при параллельных запросах из пула потоков"""
+
+    def __init__(self, qa_system: TransneftQASystem = None):
+        self.qa_system = qa_system or TransneftQASystem()
+
+    def _load_questions(self, benchmark_path: str) -> List[str]:
+        with open(benchmark_path, 'r', encoding='utf-8') as f:
+            return [item['question'] for item in json.load(f)]
+
+    def _run(self, questions: List[str], workers: int) -> float:
+        """Прогоняет вопросы через пул из workers потоков, возвращает время в секундах"""
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers, initializer=VectorStore.limit_worker_threads) as pool:
+            results = list(pool.map(lambda q: self.qa_system.answer_question(q, persist=False), questions))
+        elapsed = time.perf_counter() - start_time
+
+        errors = sum(1 for result in results if "error" in result)
+        if errors:
+            print(f"   Ошибок: {errors}")
+        return elapsed
+
+    def run(self, benchmark_path: str = BENCHMARK_PATH, repeats: int = 5,
+            max_workers: int = None) -> List[Dict]:
+        """Измеряет пропускную способность для 1, 2, 4, ... потоков до числа ядер"""
+        questions = self._load_questions(benchmark_path) * repeats
+        max_workers = max_workers or os.cpu_count() or 4
+
+        worker_counts = []
+        workers = 1
+        while workers < max_workers:
+            worker_counts.append(workers)
+            workers *= 2
+        worker_counts.append(max_workers)
+
+        print(" ЗАМЕР ПАРАЛЛЕЛЬНОЙ ОБРАБОТКИ ЗАПРОСОВ")
+        print("=" * 50)
+        print(f" Вопросов за прогон: {len(questions)}")
+
+        # Прогрев: первая загрузка весов и аллокации не должны попасть в замер
+        self._run(questions[:8], 1)
+
+        rows = []
+        base_throughput = None
+        for workers in worker_counts:
+            elapsed = self._run(questions, workers)
+            throughput = len(questions) / elapsed
+            base_throughput = base_throughput or throughput
+            speedup = throughput / base_throughput
+            rows.append({
+                "workers": workers,
+                "seconds": elapsed,
+                "qps": throughput,
+                "speedup": speedup,
+                "efficiency": speedup / workers
+            })
+            print(f"   потоков: {workers:3d} | {throughput:8.1f} запр/с | ускорение x{speedup:5.2f} "
+                  f"| эффективность {speedup / workers:.0%}")
+
+        return rows
+
+
+def main():
+    """Запуск замера масштабирования"""
+    try:
+        benchmark = ConcurrencyBenchmark()
+        benchmark.run()
+    except Exception as e:
+        print(f" Ошибка замера: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@ import os
 import sys
 import json
 import numpy as np
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 import evaluate
 from sklearn.metrics import ndcg_score
 import nltk
@@ -39,8 +39,9 @@ except LookupError:
 class MetricsEvaluator:
     """Система оценки метрик качества для QA-системы"""
 
-    def __init__(self):
-        self.qa_system = TransneftQASystem()
+    def __init__(self, qa_system: Optional[TransneftQASystem] = None):
+        # В API передается уже загруженная система, чтобы не загружать модель и индекс повторно
+        self.qa_system = qa_system if qa_system is not None else TransneftQASystem()
         self.vector_store = self.qa_system.vector_store
         self.stemmer = SnowballStemmer("russian")
 
@@ -50,8 +51,13 @@ class MetricsEvaluator:
             use_stemmer=True
         )
 
-    def evaluate_all_metrics(self, benchmark_path: str = BENCHMARK_PATH):
-        """Оценивает все метрики на бенчмарке"""
+    def evaluate_all_metrics(self, benchmark_path: str = BENCHMARK_PATH, sample_size: Optional[int] = None,
+                             progress_callback: Optional[Callable[[int, int], None]] = None):
+        """Оценивает все метрики на бенчмарке
+
+        sample_size -- оценить только первые sample_size вопросов (None -- все).
+        progress_callback(done, total) вызывается перед началом и после каждого вопроса.
+        """
         print(" ВЫЧИСЛЕНИЕ МЕТРИК КАЧЕСТВА")
         print("=" * 60)
 
@@ -63,6 +69,11 @@ class MetricsEvaluator:
             logger.error(f"Error loading benchmark: {e}")
             return None
 
+        if sample_size is not None:
+            benchmark = benchmark[:sample_size]
+        if progress_callback:
+            progress_callback(0, len(benchmark))
+
         print(f" Оценка на {len(benchmark)} вопросах...")
 
         # Собираем данные для метрик
@@ -78,7 +89,7 @@ class MetricsEvaluator:
 
             try:
                 # Получаем ответ системы
-                system_answer_result = self.qa_system.answer_question(question)
+                system_answer_result = self.qa_system.answer_question(question, persist=False)
                 system_answer = system_answer_result if isinstance(system_answer_result,
                                                                    str) else system_answer_result.get('result', '')
 
@@ -109,6 +120,9 @@ class MetricsEvaluator:
                 print("❌")
                 logger.warning(f"Error processing question {i + 1}: {e}")
                 continue
+            finally:
+                if progress_callback:
+                    progress_callback(i + 1, len(benchmark))
 
         # Вычисляем основную точность
         accuracy = correct_answers / len(benchmark) if benchmark else 0.0
@@ -369,8 +383,9 @@ class MetricsEvaluator:
         """Вычисляет семантическое сходство"""
         try:
             if hasattr(self.vector_store, 'model'):
-                embeddings_pred = self.vector_store.model.encode(predictions, convert_to_tensor=True)
-                embeddings_ref = self.vector_store.model.encode(references, convert_to_tensor=True)
+                with VectorStore.bulk_threads():
+                    embeddings_pred = self.vector_store.model.encode(predictions, convert_to_tensor=True)
+                    embeddings_ref = self.vector_store.model.encode(references, convert_to_tensor=True)
 
                 similarities = []
                 for i in range(len(predictions)):
@@ -0,0 +1,144 @@
+import os
+import sys
+import json
+import time
+import threading
+import argparse
+import requests
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+
+# Добавляем путь для импортов
+current_dir = os.path.dirname(os.path.abspath(__file__))
+src_root = os.path.dirname(os.path.dirname(current_dir))
+sys.path.insert(0, src_root)
+
+from utils.config import BENCHMARK_PATH
+
+
+class ApiLoadTest:
+    """Нагрузочный тест API: насыщение /api/chat и замер задержки /health
+
+    Пока пул клиентов непрерывно отправляет вопросы в /api/chat, отдельный
+    поток раз в probe_interval секунд опрашивает /health. Если QA-конвейер
+    блокирует цикл событий, задержка /health растет вместе с нагрузкой.
+    """
+
+    def __init__(self, base_url: str = "http://127.0.0.1:8001", timeout: float = 60.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _load_questions(self, benchmark_path: str) -> List[str]:
+        with open(benchmark_path, 'r', encoding='utf-8') as f:
+            return [item['question'] for item in json.load(f)]
+
+    def _probe_health(self, stop: threading.Event, interval: float) -> List[float]:
+        latencies = []
+        with requests.Session() as session:
+            while not stop.is_set():
+                start_time = time.perf_counter()
+                session.get(f"{self.base_url}/health", timeout=self.timeout)
+                latencies.append((time.perf_counter() - start_time) * 1000)
+                stop.wait(interval)
+        return latencies
+
+    def _chat_client(self, questions: List[str], deadline: float) -> Dict[str, List]:
+        latencies, statuses = [], []
+        i = 0
+        with requests.Session() as session:
+            while time.perf_counter() < deadline:
+                start_time = time.perf_counter()
+                try:
+                    response = session.post(
+                        f"{self.base_url}/api/chat",
+                        json={"question": questions[i % len(questions)], "session_id": "load_test"},
+                        timeout=self.timeout
+                    )
+                    statuses.append(response.status_code)
+                except requests.RequestException:
+                    statuses.append(0)
+                latencies.append((time.perf_counter() - start_time) * 1000)
+                i += 1
+        return {"latencies": latencies, "statuses": statuses}
+
+    @staticmethod
+    def _percentiles(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99)),
+            "max": float(np.max(values))
+        }
+
+    def _run_phase(self, questions: List[str], clients: int, duration: float, probe_interval: float) -> Dict:
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=clients + 1) as pool:
+            probe = pool.submit(self._probe_health, stop, probe_interval)
+            deadline = time.perf_counter() + duration
+            if clients:
+                results = list(pool.map(lambda _: self._chat_client(questions, deadline), range(clients)))
+            else:
+                time.sleep(duration)
+                results = []
+            stop.set()
+            health_latencies = probe.result()
+
+        chat_latencies = [latency for result in results for latency in result["latencies"]]
+        statuses = [status for result in results for status in result["statuses"]]
+        return {
+            "clients": clients,
+            "chat_requests": len(chat_latencies),
+            "chat_qps": len(chat_latencies) / duration,
+            "chat_errors": sum(1 for status in statuses if status != 200),
+            "chat_ms": self._percentiles(chat_latencies),
+            "health_ms": self._percentiles(health_latencies)
+        }
+
+    def run(self, benchmark_path: str = BENCHMARK_PATH, max_clients: int = 32,
+            duration: float = 20.0, probe_interval: float = 0.1) -> List[Dict]:
+        """Фазы с 0, 1, 2, 4, ... клиентами /api/chat; в каждой -- задержка /health"""
+        questions = self._load_questions(benchmark_path)
+
+        client_counts = [0]
+        clients = 1
+        while clients <= max_clients:
+            client_counts.append(clients)
+            clients *= 2
+
+        print(" НАГРУЗОЧНЫЙ ТЕСТ API")
+        print("=" * 50)
+
+        rows = []
+        for clients in client_counts:
+            row = self._run_phase(questions, clients, duration, probe_interval)
+            rows.append(row)
+            print(f"   клиентов: {clients:3d} | chat {row['chat_qps']:6.1f} запр/с "
+                  f"p95 {row['chat_ms']['p95']:7.1f} мс, ошибок {row['chat_errors']} "
+                  f"| health p50 {row['health_ms']['p50']:6.1f} мс p99 {row['health_ms']['p99']:6.1f} мс")
+
+        return rows
+
+
+def main():
+    """Запуск нагрузочного теста против запущенного API (python main.py)"""
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API")
+    parser.add_argument("--url", default="http://127.0.0.1:8001")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    try:
+        load_test = ApiLoadTest(args.url)
+        load_test.run(max_clients=args.clients, duration=args.duration)
+    except Exception as e:
+        print(f" Ошибка нагрузочного теста: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ sys.path.insert(0, src_root)
 
 from data_preparation.document_parser import DocumentParser
 from data_preparation.chunker import SemanticChunker
+from data_preparation.deduplicator import ChunkDeduplicator
 from data_preparation.benchmark_creator import BenchmarkCreator
 from core.vector_store import VectorStore
 from utils.config import DOCUMENT_PATH, VECTOR_STORE_DIR
@@ -36,6 +37,10 @@ def setup_complete_system():
             print("Не удалось создать chunks")
             return False
 
+        deduplicator = ChunkDeduplicator()
+        chunks, duplicate_map = deduplicator.deduplicate(chunks)
+        deduplicator.save(chunks, duplicate_map)
+
         chunker.analyze_chunks(chunks)
 
         vector_store = VectorStore()
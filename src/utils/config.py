@@ -8,21 +8,108 @@ PROCESSED_DATA_DIR = os.path.join(DATA_DIR, "processed")
 
 MODELS_DIR = os.path.join(BASE_DIR, "models")
 VECTOR_STORE_DIR = "vector_store_temp"
+# Сколько последних снапшотов индекса хранить на диске (активный хранится всегда)
+SNAPSHOT_KEEP = 3
 
 DOCUMENT_PATH = os.path.join(RAW_DATA_DIR, "Реестр данных о компании ПАО Транснефть для хакатона весна-лета 2026.docx")
 BENCHMARK_PATH = os.path.join(PROCESSED_DATA_DIR, "transneft_qa_benchmark_final_40.json")
 CHUNKS_PATH = os.path.join(PROCESSED_DATA_DIR, "document_chunks.json")
 ELEMENTS_PATH = os.path.join(PROCESSED_DATA_DIR, "document_elements.json")
+DUPLICATES_PATH = os.path.join(PROCESSED_DATA_DIR, "chunk_duplicates.json")
+ANSWER_RULES_PATH = os.path.join(DATA_DIR, "answer_rules.json")
 
 MODEL_NAME = "sentence-transformers/paraphrase-multilingual-mpnet-base-v2"
 EMBEDDING_DIMENSION = 768
 TOP_K_RESULTS = 8
 SIMILARITY_THRESHOLD = 0.3
 
+# Переранжирование cross-encoder (отключено по умолчанию)
+RERANK_ENABLED = False
+RERANKER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+RERANK_CANDIDATES = 16
+RERANK_TOP_K = 4
+RERANK_DEADLINE_MS = 150
+RERANK_BATCH_SIZE = 32
+RERANK_BATCH_WAIT_MS = 5
+RERANK_CACHE_SIZE = 10000
+
+# Параллельное обслуживание запросов: один поток OpenMP/torch на запрос в пуле
+# обслуживания (QAExecutor); пакетное кодирование вне пула использует все потоки
+FAISS_OMP_THREADS = 1
+TORCH_INTRAOP_THREADS = 1
+SEARCH_WORKER_THREADS = os.cpu_count() or 4
+
+# Исполнитель QA для API: "thread" или "process", число исполнителей и таймаут запроса (с)
+QA_EXECUTOR_KIND = "thread"
+QA_EXECUTOR_WORKERS = os.cpu_count() or 4
+QA_REQUEST_TIMEOUT = 30
+
+# Контроль допуска к QA: одновременных запросов, мест в очереди, ожидание в очереди (с)
+# и минимальный Retry-After (с) при отказе
+ADMISSION_MAX_CONCURRENCY = QA_EXECUTOR_WORKERS
+ADMISSION_MAX_QUEUE = 64
+ADMISSION_QUEUE_TIMEOUT = 5.0
+ADMISSION_RETRY_AFTER = 1
+
+# Фоновые задачи оценки (/api/evaluate): одновременно выполняемых и всего ожидающих в очереди
+EVALUATION_MAX_CONCURRENT_JOBS = 1
+EVALUATION_MAX_PENDING_JOBS = 8
+
+# Компактные ответы (response_mode="lean"): длина фрагмента chunk с подсветкой, символов
+SNIPPET_MAX_CHARS = 120
+
+# Пакетный эндпоинт /api/chat/batch: вопросов в пакете и символов в вопросе
+CHAT_BATCH_MAX_SIZE = 64
+CHAT_BATCH_MAX_QUESTION_LENGTH = 2000
+
 MAX_CHUNK_SIZE = 400
 MIN_CHUNK_SIZE = 50
 MAX_WORDS_PER_CHUNK = 300
 
+# Удаление почти-дубликатов chunks (MinHash/LSH): 16 полос по 8 строк,
+# порог срабатывания LSH около (1/16)^(1/8) ~ 0.71
+DEDUP_NUM_PERM = 128
+DEDUP_BANDS = 16
+DEDUP_SHINGLE_SIZE = 3
+DEDUP_THRESHOLD = 0.8
+
+# Телеметрия выдачи chunks (отчет о горячих и невостребованных chunks)
+TELEMETRY_ENABLED = True
+TELEMETRY_FLUSH_SECONDS = 30
+
+# Ответ по статическим правилам без векторного поиска; число chunks-источников,
+# подбираемых для каждого правила при загрузке индекса
+RULE_FAST_PATH_ENABLED = True
+RULE_SOURCE_CHUNKS = 3
+
+# Извлекающий ответ: лучшие предложения среди верхних chunks выдачи
+EXTRACTIVE_TOP_CHUNKS = 3
+EXTRACTIVE_MAX_SENTENCES = 2
+
+# Кэш ответов (LRU в памяти + SQLite); TTL в секундах, для ответов "нет информации" -- короче
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_SIZE = 2048
+RESPONSE_CACHE_TTL = 24 * 3600
+RESPONSE_CACHE_NEGATIVE_TTL = 600
+
+# Семантический кэш: ответ на вопрос с косинусным сходством не ниже порога
+# с ранее отвеченным (при той же версии индекса, профиле и фильтрах)
+SEMANTIC_CACHE_ENABLED = True
+SEMANTIC_CACHE_SIZE = 4096
+SEMANTIC_CACHE_THRESHOLD = 0.95
+
+# Объединение одинаковых вопросов, обрабатываемых одновременно (single-flight):
+# выполняется в процессе API до постановки в пул, поэтому работает с любым QA_EXECUTOR_KIND
+SINGLE_FLIGHT_ENABLED = True
+
+# Метрики Prometheus (/metrics, prometheus_client): границы корзин гистограмм задержек, с
+METRICS_ENABLED = True
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Трассировка запросов: доля трассировок, записываемых в файл (OTLP/JSON, строка на трассировку)
+TRACE_SAMPLE_RATE = 0.01
+TRACE_EXPORT_PATH = os.path.join(DATA_DIR, "traces.jsonl")
+
 SECTION_HEADERS = [
     "Основные направления деятельности",
     "Уставный капитал. Акции",
@@ -34,13 +121,6 @@ SECTION_HEADERS = [
     "Факты"
 ]
 
-KEY_FACTS = {
-    "акции": "724 934 300",
-    "дата регистрации": "26.08.1993",
-    "аудитор": "Акционерное общество «Кэпт»",
-    "держатель реестра": "Независимая регистраторская компания Р.О.С.Т."
-}
-
 
 def create_directories():
     """Создает необходимые директории"""